@@ -8,7 +8,19 @@ from functools import cached_property, lru_cache, partial
 from multiprocessing import RLock as Lock
 from pathlib import Path
 from ssl import SSLZeroReturnError
-from typing import AsyncIterator, Awaitable, Callable, ClassVar, Dict, Optional, TYPE_CHECKING, TypeVar, Union
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    ClassVar,
+    Dict,
+    Iterable,
+    Optional,
+    TYPE_CHECKING,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 from aiofiles import open as async_open
 from aiofiles.os import remove as async_remove
@@ -20,8 +32,7 @@ from typing_extensions import Self
 from core.base_service import BaseService
 from core.config import config
 from metadata.genshin import AVATAR_DATA, HONEY_DATA, MATERIAL_DATA, NAMECARD_DATA, WEAPON_DATA
-from metadata.scripts.honey import update_honey_metadata
-from metadata.scripts.metadatas import update_metadata_from_ambr, update_metadata_from_github
+from metadata.scripts.refresh import refresh_metadata
 from metadata.shortname import roleToId, weaponToId
 from modules.wiki.base import HONEY_HOST
 from utils.const import AMBR_HOST, ENKA_HOST, PROJECT_ROOT
@@ -42,6 +53,8 @@ ASSETS_PATH.mkdir(exist_ok=True, parents=True)
 
 DATA_MAP = {"avatar": AVATAR_DATA, "weapon": WEAPON_DATA, "material": MATERIAL_DATA}
 
+METADATA_FILES = ("avatar", "weapon", "material", "reliquary", "namecard", "honey")
+
 DEFAULT_EnkaAssets = EnkaAssets(lang="chs")
 
 
@@ -61,6 +74,13 @@ class _AssetsService(ABC):
     _dir: ClassVar[Path]
     icon_types: ClassVar[list[str]]
 
+    _index: ClassVar[Optional[dict[str, dict[str, Path]]]] = None
+    """本地图标的索引： id -> 图标类型 -> 路径"""
+    _inflight: ClassVar[dict[Tuple[int, str], "asyncio.Task[Path | None]"]]
+    """正在下载的图标"""
+    prefetch_concurrency: ClassVar[int] = 8
+    """批量获取图标时的最大并发数"""
+
     _client: Optional[AsyncClient] = None
     _links: dict[str, str] = {}
 
@@ -115,6 +135,24 @@ class _AssetsService(ABC):
         cls.type = cls.__name__.lstrip("_").split("Assets")[0].lower()  # 当前 assert 的类型
         cls._dir = ASSETS_PATH.joinpath(cls.type)  # 图标保存的文件夹
         cls._dir.mkdir(exist_ok=True, parents=True)
+        cls._index = None
+        cls._inflight = {}
+
+    @classmethod
+    def build_index(cls) -> dict[str, dict[str, Path]]:
+        """扫描图标文件夹，建立本地图标的索引"""
+        index = {}
+        for item_dir in cls._dir.iterdir():
+            if item_dir.is_dir():
+                index[item_dir.name] = {file.stem: file.resolve() for file in item_dir.iterdir() if file.is_file()}
+        cls._index = index
+        return index
+
+    @property
+    def local_icons(self) -> dict[str, Path]:
+        """当前资源在本地已有的图标"""
+        index = self._index if self._index is not None else self.build_index()
+        return index.setdefault(str(self.id), {})
 
     async def _request(self, url: str, interval: float = 0.2) -> "Response":
         error = None
@@ -189,21 +227,56 @@ class _AssetsService(ABC):
 
     async def _get_img(self, overwrite: bool = False, *, item: str) -> Path | None:
         """获取图标"""
-        path = next(filter(lambda x: x.stem == item, self.path.iterdir()), None)
-        if not overwrite and path:  # 如果需要下载的图标存在且不覆盖( overwrite )
-            return path.resolve()
-        if path is not None and path.exists():
-            if overwrite:  # 如果覆盖
-                await async_remove(path)  # 删除已存在的图标
-            else:
-                return path
+        path = self.local_icons.get(item)
+        if not overwrite and path is not None:  # 如果需要下载的图标存在且不覆盖( overwrite )
+            return path
+        # 同一图标同时只会下载一次，其他请求等待下载结果
+        key = (self.id, item)
+        if (task := self._inflight.get(key)) is None:
+            task = self._inflight[key] = asyncio.create_task(self._fetch_img(item, path))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch_img(self, item: str, old_path: Path | None) -> Path | None:
+        """下载图标并更新索引"""
+        icons = self.local_icons
+        if old_path is not None and old_path.exists():
+            await async_remove(old_path)  # 删除已存在的图标
+        icons.pop(item, None)
         # 依次从使用当前 assets class 中的爬虫下载图标，顺序为爬虫名的字母顺序
         async for url in self._download_url_generator(item):
             if url is not None:
                 path = self.path.joinpath(f"{item}{Path(url).suffix}")
                 if (result := await self._download(url, path)) is not None:
+                    icons[item] = result
                     return result
 
+    async def prefetch(
+        self, targets: Iterable[StrOrInt], icon_types: Optional[Iterable[str]] = None
+    ) -> dict[Tuple[StrOrInt, str], Path | None]:
+        """批量获取图标，本地已有的图标不会重复下载
+        :param targets: 资源 ID 或名称
+        :param icon_types: 图标类型，默认为 icon
+        :return: (资源, 图标类型) -> 图标路径，获取失败时为 None
+        """
+        semaphore = asyncio.Semaphore(self.prefetch_concurrency)
+        icon_types = [i for i in (icon_types or ["icon"]) if i in self.icon_types]
+
+        async def fetch(_target: StrOrInt, _icon_type: str) -> Path | None:
+            try:
+                assets = self(_target)
+                if (path := assets.local_icons.get(_icon_type)) is not None:
+                    return path
+                async with semaphore:
+                    return await getattr(assets, _icon_type)()
+            except Exception as exc:  # pylint: disable=W0703
+                logger.warning("获取图标失败 %s[%s] %s: %s", self.type, _target, _icon_type, repr(exc))
+                return None
+
+        keys = [(target, icon_type) for target in targets for icon_type in icon_types]
+        results = await asyncio.gather(*(fetch(target, icon_type) for target, icon_type in keys))
+        return dict(zip(keys, results))
+
     @lru_cache
     async def get_link(self, item: str) -> str | None:
         """获取相应图标链接"""
@@ -536,6 +609,8 @@ class AssetsService(BaseService.Dependence):
     namecard: _NamecardAssets
     """名片"""
 
+    _refresh_task: Optional[asyncio.Task] = None
+
     def __init__(self):
         for attr, assets_type_name in filter(
             lambda x: (not x[0].startswith("_")) and x[1].endswith("Assets"), self.__annotations__.items()
@@ -544,12 +619,18 @@ class AssetsService(BaseService.Dependence):
 
     async def initialize(self) -> None:  # pylint: disable=R0201
         """启动 AssetsService 服务，刷新元数据"""
-        logger.info("正在刷新元数据")
-        # todo 这3个任务同时异步下载
-        await update_metadata_from_github(False)
-        await update_metadata_from_ambr(False)
-        await update_honey_metadata(False)
-        logger.info("刷新元数据成功")
+        if all(PROJECT_ROOT.joinpath(f"metadata/data/{name}.json").exists() for name in METADATA_FILES):
+            # 本地已有元数据时先使用本地数据启动，在后台检查远程数据的更新
+            logger.info("使用本地元数据启动，正在后台刷新元数据")
+            self._refresh_task = asyncio.create_task(refresh_metadata(overwrite=True, honey=False))
+        else:
+            logger.info("正在刷新元数据")
+            await refresh_metadata(overwrite=False)
+            logger.info("刷新元数据成功")
+        loop = asyncio.get_running_loop()
+        for attr in ("avatar", "weapon", "material", "artifact", "namecard"):
+            await loop.run_in_executor(None, getattr(self, attr).build_index)
+        logger.info("本地图标索引建立完成")
 
 
 AssetsServiceType = TypeVar("AssetsServiceType", bound=_AssetsService)
@@ -0,0 +1,98 @@
+import heapq
+import math
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+from core.services.search.models import BaseEntry
+
+__all__ = ("SearchIndex",)
+
+
+class SearchIndex:
+    """条目的倒排索引
+
+    以文本的单字与相邻两字作为索引项，搜索时先按索引项的命中情况筛选出候选条目，
+    只对候选条目计算模糊匹配的分数。
+    索引创建后不会被修改，更新条目时返回共享未变化部分的新索引，搜索时不需要加锁。
+    """
+
+    shortlist_size: int = 200
+    """参与模糊匹配的候选条目数量上限"""
+
+    def __init__(
+        self, entries: Optional[Dict[str, BaseEntry]] = None, postings: Optional[Dict[str, FrozenSet[str]]] = None
+    ):
+        self.entries: Dict[str, BaseEntry] = entries or {}
+        """条目的 key -> 条目"""
+        self.postings: Dict[str, FrozenSet[str]] = postings or {}
+        """索引项 -> 条目的 key"""
+
+    @staticmethod
+    def get_grams(text: str) -> Set[str]:
+        text = "".join(text.casefold().split())
+        grams = set(text)
+        grams.update(text[i : i + 2] for i in range(len(text) - 1))
+        return grams
+
+    @classmethod
+    def get_entry_grams(cls, entry: BaseEntry) -> Set[str]:
+        grams = set()
+        for text in entry.get_search_texts():
+            grams.update(cls.get_grams(text))
+        return grams
+
+    @classmethod
+    def build(cls, entries: Iterable[BaseEntry]) -> "SearchIndex":
+        data = {entry.key: entry for entry in entries}
+        postings: Dict[str, Set[str]] = defaultdict(set)
+        for key, entry in data.items():
+            for gram in cls.get_entry_grams(entry):
+                postings[gram].add(key)
+        return cls(data, {gram: frozenset(keys) for gram, keys in postings.items()})
+
+    def upsert(self, entry: BaseEntry) -> "SearchIndex":
+        """返回添加或替换了条目的新索引"""
+        entries = self.entries.copy()
+        old = entries.get(entry.key)
+        entries[entry.key] = entry
+        postings = self.postings.copy()
+        old_grams = self.get_entry_grams(old) if old is not None else set()
+        new_grams = self.get_entry_grams(entry)
+        for gram in old_grams - new_grams:
+            if keys := postings[gram] - {entry.key}:
+                postings[gram] = keys
+            else:
+                del postings[gram]
+        for gram in new_grams - old_grams:
+            postings[gram] = postings.get(gram, frozenset()) | {entry.key}
+        return SearchIndex(entries, postings)
+
+    def get_candidates(self, search_query: str) -> List[BaseEntry]:
+        """按照命中索引项的权重筛选候选条目，越少见的索引项权重越高"""
+        weights: Dict[str, float] = defaultdict(float)
+        total = len(self.entries)
+        for gram in self.get_grams(search_query):
+            keys = self.postings.get(gram)
+            if not keys:
+                continue
+            weight = len(gram) * math.log(1 + total / len(keys))
+            for key in keys:
+                weights[key] += weight
+        if len(weights) > self.shortlist_size:
+            keys = heapq.nlargest(self.shortlist_size, weights, key=weights.__getitem__)
+        else:
+            keys = weights
+        return [self.entries[key] for key in keys]
+
+    def search(self, search_query: Optional[str], amount: Optional[int] = None) -> List[BaseEntry]:
+        if not search_query:
+            return list(self.entries.values())
+        scores = {}
+        candidates = []
+        for entry in self.get_candidates(search_query):
+            if (score := entry.compare_to_query(search_query)) > 0:
+                scores[id(entry)] = score
+                candidates.append(entry)
+        if not amount:
+            return sorted(candidates, key=lambda entry: scores[id(entry)], reverse=True)
+        return heapq.nlargest(amount, candidates, key=lambda entry: scores[id(entry)])
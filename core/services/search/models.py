@@ -27,8 +27,15 @@ class BaseEntry(BaseModel):
 
         Gives a number ∈[0,100] describing how similar the search query is to this entry."""
 
+    def get_search_texts(self) -> List[str]:
+        """compare_to_query 会用到的文本，用于建立搜索索引"""
+        return [self.title, *(self.tags or [])]
+
 
 class WeaponEntry(BaseEntry):
+    def get_search_texts(self) -> List[str]:
+        return [*super().get_search_texts(), self.description]
+
     def compare_to_query(self, search_query: str) -> float:
         score = 0.0
         if search_query == self.title:
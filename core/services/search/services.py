@@ -1,6 +1,4 @@
 import asyncio
-import heapq
-import itertools
 import json
 import os
 import time
@@ -8,9 +6,9 @@ from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 import aiofiles
-from async_lru import alru_cache
 
 from core.base_service import BaseService
+from core.services.search.index import SearchIndex
 from core.services.search.models import BaseEntry, StrategyEntry, StrategyEntryList, WeaponEntry, WeaponsEntry
 from utils.const import PROJECT_ROOT
 
@@ -22,14 +20,21 @@ ENTRY_DAYA_PATH.mkdir(parents=True, exist_ok=True)
 
 class SearchServices(BaseService):
     def __init__(self):
-        self._lock = asyncio.Lock()  # 访问和修改操作成员变量必须加锁操作
-        self.weapons: List[WeaponEntry] = []
-        self.strategy: List[StrategyEntry] = []
+        self._lock = asyncio.Lock()  # 修改条目必须加锁操作，搜索使用不可变的索引快照，不需要加锁
+        self._index = SearchIndex()
         self.entry_data_path: Path = ENTRY_DAYA_PATH
         self.weapons_entry_data_path = self.entry_data_path / "weapon.json"
         self.strategy_entry_data_path = self.entry_data_path / "strategy.json"
         self.replace_time: Dict[str, float] = {}
 
+    @property
+    def weapons(self) -> List[WeaponEntry]:
+        return [entry for entry in self._index.entries.values() if isinstance(entry, WeaponEntry)]
+
+    @property
+    def strategy(self) -> List[StrategyEntry]:
+        return [entry for entry in self._index.entries.values() if isinstance(entry, StrategyEntry)]
+
     @staticmethod
     async def load_json(path):
         async with aiofiles.open(path, "r", encoding="utf-8") as f:
@@ -42,27 +47,27 @@ class SearchServices(BaseService):
 
     async def load_data(self):
         async with self._lock:
+            entries: List[BaseEntry] = list(self._index.entries.values())
             if self.weapons_entry_data_path.exists():
                 weapon_json = await self.load_json(self.weapons_entry_data_path)
                 weapons = WeaponsEntry.parse_obj(weapon_json)
-                for weapon in weapons.data:
-                    self.weapons.append(weapon.copy())
+                entries.extend(weapons.data or [])
             if self.strategy_entry_data_path.exists():
                 strategy_json = await self.load_json(self.strategy_entry_data_path)
                 strategy = StrategyEntryList.parse_obj(strategy_json)
-                for strategy in strategy.data:
-                    self.strategy.append(strategy.copy())
+                entries.extend(strategy.data or [])
+            self._index = await asyncio.get_running_loop().run_in_executor(None, SearchIndex.build, entries)
 
     async def save_entry(self) -> None:
         """保存条目
         :return: None
         """
         async with self._lock:
-            if len(self.weapons) > 0:
-                weapons = WeaponsEntry(data=self.weapons)
+            if len(weapon_list := self.weapons) > 0:
+                weapons = WeaponsEntry(data=weapon_list)
                 await self.save_json(self.weapons_entry_data_path, weapons.json())
-            if len(self.strategy) > 0:
-                strategy = StrategyEntryList(data=self.strategy)
+            if len(strategy_list := self.strategy) > 0:
+                strategy = StrategyEntryList(data=strategy_list)
                 await self.save_json(self.strategy_entry_data_path, strategy.json())
 
     async def add_entry(self, entry: BaseEntry, update: bool = False, ttl: int = 3600):
@@ -76,42 +81,25 @@ class SearchServices(BaseService):
             replace_time = self.replace_time.get(entry.key)
             if replace_time and replace_time <= time.time() + ttl:
                 return
-            if isinstance(entry, WeaponEntry):
-                for index, value in enumerate(self.weapons):
-                    if value.key == entry.key:
-                        if update:
-                            self.replace_time[entry.key] = time.time()
-                            self.weapons[index] = entry
-                        break
-                else:
-                    self.weapons.append(entry)
-            elif isinstance(entry, StrategyEntry):
-                for index, value in enumerate(self.strategy):
-                    if value.key == entry.key:
-                        if update:
-                            self.replace_time[entry.key] = time.time()
-                            self.strategy[index] = entry
-                        break
-                else:
-                    self.strategy.append(entry)
+            if not isinstance(entry, (WeaponEntry, StrategyEntry)):
+                return
+            if entry.key in self._index.entries:
+                if not update:
+                    return
+                self.replace_time[entry.key] = time.time()
+            self._index = self._index.upsert(entry)
 
     async def remove_all_entry(self):
         """移除全部条目
         :return: None
         """
         async with self._lock:
-            self.weapons = []
+            self._index = SearchIndex()
             if self.weapons_entry_data_path.exists():
                 os.remove(self.weapons_entry_data_path)
-            self.strategy = []
             if self.strategy_entry_data_path.exists():
                 os.remove(self.strategy_entry_data_path)
 
-    @staticmethod
-    def _sort_key(entry: BaseEntry, search_query: str) -> float:
-        return entry.compare_to_query(search_query)
-
-    @alru_cache(maxsize=64)
     async def multi_search_combinations(self, search_queries: Tuple[str], results_per_query: int = 3):
         """多个关键词搜索
         :param search_queries: 搜索文本
@@ -124,28 +112,10 @@ class SearchServices(BaseService):
             if res := await self.search(search_query=query, amount=results_per_query):
                 results[query] = res
 
-    @alru_cache(maxsize=64)
     async def search(self, search_query: Optional[str], amount: int = None) -> Optional[List[BaseEntry]]:
         """在所有可用条目中搜索适当的结果
         :param search_query: 搜索文本
         :param amount: 约定返回的数目
-        :return: 搜索结果
+        :return: 搜索结果，只包含与搜索文本有相同字词且分数大于 0 的条目
         """
-        # search_entries: Iterable[BaseEntry] = []
-        async with self._lock:
-            search_entries = itertools.chain(self.weapons, self.strategy)
-
-            if not search_query:
-                return search_entries if isinstance(search_entries, list) else list(search_entries)
-
-            if not amount:
-                return sorted(
-                    search_entries,
-                    key=lambda entry: self._sort_key(entry, search_query),  # type: ignore
-                    reverse=True,
-                )
-            return heapq.nlargest(
-                amount,
-                search_entries,
-                key=lambda entry: self._sort_key(entry, search_query),  # type: ignore[arg-type]
-            )
+        return self._index.search(search_query, amount)
@@ -1,3 +1,188 @@
+import dataclasses
+import datetime
+import enum
+import hashlib
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
 from gram_core.services.template.cache import HtmlToFileIdCache, TemplatePreviewCache
 
-__all__ = ["TemplatePreviewCache", "HtmlToFileIdCache"]
+try:
+    import ujson as jsonlib
+except ImportError:
+    import json as jsonlib
+
+__all__ = [
+    "TemplatePreviewCache",
+    "HtmlToFileIdCache",
+    "RenderCache",
+    "RenderCacheFileIdAdapter",
+    "UncacheableData",
+    "template_data_digest",
+]
+
+
+class UncacheableData(Exception):
+    """模板数据中存在无法稳定序列化的对象"""
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, enum.Enum):
+        return [type(value).__qualname__, value.value]
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    if isinstance(value, (bytes, Path)):
+        return str(value)
+    if isinstance(value, type) or callable(value):
+        name = getattr(value, "__qualname__", "")
+        if not name or "<" in name:  # lambda 与闭包可能捕获了外部状态
+            raise UncacheableData(value)
+        return f"{value.__module__}.{name}"
+    if hasattr(value, "__dict__"):
+        return [type(value).__qualname__, vars(value)]
+    if hasattr(value, "__slots__"):
+        return [type(value).__qualname__, {k: getattr(value, k, None) for k in value.__slots__}]
+    raise UncacheableData(value)
+
+
+def template_data_digest(*parts: Any) -> str:
+    """计算模板渲染参数的摘要
+    :raise UncacheableData: 参数中存在无法稳定序列化的对象
+    """
+    try:
+        data = jsonlib.dumps(parts, default=_encode, sort_keys=True, ensure_ascii=False)
+    except (TypeError, ValueError, OverflowError) as exc:
+        raise UncacheableData from exc
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """以模板渲染参数的摘要为键，缓存渲染出的图片与上传后的 file_id
+
+    图片按照最近使用的顺序淘汰，缓存的条目数与图片的总大小均有上限。
+    每个条目的大小记录在 sizes 中，过期时间记录在 expires 中，过期的条目在淘汰时一并清理。
+    """
+
+    qname: str = "bot:template:render"
+    ttl: int = 24 * 60 * 60
+    """缓存的默认有效时间（秒）"""
+    max_entries: int = 2048
+    """最多缓存的条目数"""
+    max_bytes: int = 256 * 1024 * 1024
+    """缓存的图片总大小上限"""
+    max_image_size: int = 4 * 1024 * 1024
+    """单张图片的大小上限，超过时只缓存 file_id"""
+
+    def __init__(self, client):
+        self.client = client
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, digest: str) -> str:
+        return f"{self.qname}:{digest}"
+
+    @property
+    def lru_key(self) -> str:
+        return f"{self.qname}:lru"
+
+    @property
+    def sizes_key(self) -> str:
+        return f"{self.qname}:sizes"
+
+    @property
+    def expires_key(self) -> str:
+        return f"{self.qname}:expires"
+
+    async def get(self, digest: str) -> Optional[Tuple[Optional[str], Optional[bytes]]]:
+        """获取缓存的 (file_id, 图片)"""
+        key = self.get_key(digest)
+        file_id, image = await self.client.hmget(key, "file_id", "image")
+        if file_id is None and image is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        await self.client.zadd(self.lru_key, {digest: time.time()})
+        return (file_id.decode("utf-8") if file_id else None), (image or None)
+
+    async def set_image(self, digest: str, image: bytes, ttl: Optional[int] = None):
+        if len(image) > self.max_image_size:
+            return
+        await self._set(digest, {"image": image}, len(image), ttl)
+
+    async def set_file_id(self, digest: str, file_id: str, ttl: Optional[int] = None):
+        await self._set(digest, {"file_id": file_id}, None, ttl)
+
+    async def _set(self, digest: str, mapping: Dict[str, Any], size: Optional[int], ttl: Optional[int] = None):
+        """写入条目
+
+        :param size: 图片的大小，覆盖该条目原有的大小；为 None 时不修改
+        :param ttl: 有效时间，未指定时使用默认值
+        """
+        key = self.get_key(digest)
+        ttl = ttl or self.ttl
+        now = time.time()
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, ttl)
+            pipe.zadd(self.lru_key, {digest: now})
+            pipe.zadd(self.expires_key, {digest: now + ttl})
+            if size is not None:
+                pipe.hset(self.sizes_key, digest, size)
+            await pipe.execute()
+        await self.evict()
+
+    async def get_total_bytes(self) -> int:
+        return sum(int(size) for size in await self.client.hvals(self.sizes_key))
+
+    async def evict(self):
+        """清理已过期的条目，并淘汰最久未使用的条目，直至满足数量与大小的限制"""
+        if expired := await self.client.zrangebyscore(self.expires_key, 0, time.time()):
+            await self._remove(expired)
+        while True:
+            count = await self.client.zcard(self.lru_key)
+            total = await self.get_total_bytes()
+            if count <= self.max_entries and total <= self.max_bytes:
+                return
+            popped = await self.client.zpopmin(self.lru_key, max(count - self.max_entries, 1))
+            if not popped:
+                return
+            await self._remove(digest for digest, _ in popped)
+
+    async def _remove(self, digests: Iterable[Union[str, bytes]]):
+        digests = [digest.decode("utf-8") if isinstance(digest, bytes) else digest for digest in digests]
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(*(self.get_key(digest) for digest in digests))
+            pipe.hdel(self.sizes_key, *digests)
+            pipe.zrem(self.lru_key, *digests)
+            pipe.zrem(self.expires_key, *digests)
+            await pipe.execute()
+
+
+class RenderCacheFileIdAdapter:
+    """在上传图片后同时记录 file_id 到 RenderCache 与 HtmlToFileIdCache"""
+
+    def __init__(self, render_cache: RenderCache, digest: str, html_cache: Optional[HtmlToFileIdCache] = None):
+        self.render_cache = render_cache
+        self.digest = digest
+        self.html_cache = html_cache
+
+    async def get_data(self, html: str, file_type: str) -> Optional[str]:
+        if self.html_cache is None or not html:
+            return None
+        return await self.html_cache.get_data(html, file_type)
+
+    async def set_data(self, html: str, file_type: str, file_id: str, ttl: int = 24 * 60 * 60):
+        await self.render_cache.set_file_id(self.digest, file_id, ttl)
+        if self.html_cache is not None and html:
+            await self.html_cache.set_data(html, file_type, file_id, ttl)
@@ -0,0 +1,124 @@
+"""模板渲染的调度"""
+
+import asyncio
+import bisect
+import itertools
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from heapq import heappop, heappush
+from typing import AsyncIterator, Dict, List, Tuple
+
+__all__ = ("RenderPriority", "RenderScheduler", "TimingHistogram")
+
+
+class RenderPriority(IntEnum):
+    """渲染优先级，数值越小越先渲染"""
+
+    INTERACTIVE = 0
+    """用户指令"""
+    BULK = 1
+    """一次指令中的批量渲染"""
+    BACKGROUND = 2
+    """后台任务"""
+
+
+class TimingHistogram:
+    """耗时直方图"""
+
+    buckets: Tuple[float, ...] = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+    """各区间的上限（秒）"""
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def __str__(self) -> str:
+        labels = [f"≤{i}s" for i in self.buckets] + [f">{self.buckets[-1]}s"]
+        buckets = " ".join(f"{label}[{count}]" for label, count in zip(labels, self.counts) if count)
+        return f"次数[{self.count}] 平均[{self.mean:.2f}s] 最大[{self.max:.2f}s] {buckets}"
+
+
+class RenderScheduler:
+    """限制同时进行的浏览器渲染数量
+
+    超出并发数的渲染按照优先级排队，同一优先级先到先得，
+    并按模板记录排队与渲染的耗时。
+    """
+
+    max_concurrency: int = 4
+    """同时进行的渲染数量"""
+
+    def __init__(self, max_concurrency: int = None):
+        if max_concurrency is not None:
+            self.max_concurrency = max_concurrency
+        self._running = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self.wait_timings: Dict[str, TimingHistogram] = {}
+        self.render_timings: Dict[str, TimingHistogram] = {}
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, waiter in self._waiters if not waiter.done())
+
+    async def _acquire(self, priority: int):
+        if self._running < self.max_concurrency and not self.waiting:
+            self._running += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heappush(self._waiters, (priority, next(self._counter), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 已经获得了渲染名额，交给下一个等待者
+                self._release()
+            raise
+
+    def _release(self):
+        while self._waiters:
+            _, _, waiter = heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)  # 名额直接转交，运行数量不变
+                return
+        self._running -= 1
+
+    @asynccontextmanager
+    async def slot(self, name: str, priority: int = RenderPriority.INTERACTIVE) -> AsyncIterator[None]:
+        """获取一个渲染名额
+        :param name: 模板名称，用于统计耗时
+        :param priority: 渲染优先级
+        """
+        start_time = time.monotonic()
+        await self._acquire(priority)
+        acquired_time = time.monotonic()
+        self.wait_timings.setdefault(name, TimingHistogram()).observe(acquired_time - start_time)
+        try:
+            yield
+        finally:
+            self.render_timings.setdefault(name, TimingHistogram()).observe(time.monotonic() - acquired_time)
+            self._release()
+
+    def stats(self) -> Dict[str, str]:
+        """各模板的排队与渲染耗时"""
+        return {
+            name: f"排队 {self.wait_timings.get(name, TimingHistogram())} | 渲染 {histogram}"
+            for name, histogram in self.render_timings.items()
+        }
@@ -1,37 +1,128 @@
+"""WikiService"""
+import asyncio
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import aiofiles
 import ujson as json
 
 from core.base_service import BaseService
 from core.dependence.redisdb import RedisDB
-from modules.wiki.base import Model
+from modules.wiki.base import WikiModel
+from utils.const import PROJECT_ROOT
+
+__all__ = ["WikiCache", "WikiCheckpoint"]
+
+WIKI_CHECKPOINT_PATH = PROJECT_ROOT.joinpath("data", "wiki")
 
-__all__ = ["WikiCache"]
+
+class WikiCheckpoint:
+    """刷新 Wiki 时已经获取到的条目
+
+    每获取一个条目就追加一行到文件中，刷新中断后再次刷新时，列表数据摘要未变化的条目直接从文件中恢复。
+    数据写入 Redis 后删除文件。
+    """
+
+    def __init__(self, key: str, path: Path = WIKI_CHECKPOINT_PATH):
+        self.path = path / f"{key}.checkpoint.jsonl"
+        self._lock: Optional[asyncio.Lock] = None
+
+    def load(self) -> Dict[str, Tuple[str, str]]:
+        """读取 列表页中的名称 -> (摘要, 数据的 json)"""
+        result = {}
+        if not self.path.exists():
+            return result
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    source_name, digest, data = json.loads(line)
+                except ValueError:  # 中断时未写完的行
+                    continue
+                result[source_name] = (digest, data)
+        return result
+
+    async def append(self, source_name: str, digest: str, model: WikiModel):
+        line = json.dumps([source_name, digest, model.json()], ensure_ascii=False) + "\n"
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            async with aiofiles.open(self.path, "a", encoding="utf-8") as f:
+                await f.write(line)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
 
 
 class WikiCache(BaseService.Component):
+    """Wiki 数据的持久化
+
+    每类数据使用三个 hash 保存：
+    ``wiki:{key}`` 名称 -> 数据的 json，
+    ``wiki:{key}:index`` 名称 -> ID，
+    ``wiki:{key}:source`` 列表页中的名称 -> [列表数据的摘要, 名称]
+    """
+
     def __init__(self, redis: RedisDB):
         self.client = redis.client
         self.qname = "wiki"
 
-    async def set(self, key: str, value):
-        qname = f"{self.qname}:{key}"
-        if isinstance(value, Model):
-            value = value.json()
-        elif isinstance(value, (dict, list)):
-            value = json.dumps(value)
-        await self.client.set(qname, value)
+    def get_qname(self, key: str, suffix: str = "") -> str:
+        return f"{self.qname}:{key}:{suffix}" if suffix else f"{self.qname}:{key}"
 
-    async def delete(self, key: str):
-        qname = f"{self.qname}:{key}"
-        await self.client.delete(qname)
+    @staticmethod
+    def _decode(value) -> str:
+        return value.decode("utf-8") if isinstance(value, bytes) else value
 
-    async def get(self, key: str) -> dict:
-        qname = f"{self.qname}:{key}"
+    async def migrate(self, key: str):
+        """将旧版以单个字符串保存的数据转为 hash"""
+        qname = self.get_qname(key)
+        if self._decode(await self.client.type(qname)) != "string":
+            return
         # noinspection PyBroadException
         try:
-            result = json.loads(await self.client.get(qname))
+            items = [json.loads(i) for i in json.loads(await self.client.get(qname))]
         except Exception:  # pylint: disable=W0703
-            result = []
-        if isinstance(result, list) and len(result) > 0:
-            for num, item in enumerate(result):
-                result[num] = json.loads(item)
-        return result
+            items = []
+        await self.client.delete(qname)
+        if items:
+            await self._set(key, {i["name"]: (i["id"], json.dumps(i)) for i in items}, {})
+
+    async def get_index(self, key: str) -> Dict[str, str]:
+        """获取 名称 -> ID"""
+        data = await self.client.hgetall(self.get_qname(key, "index"))
+        return {self._decode(k): self._decode(v) for k, v in data.items()}
+
+    async def get_sources(self, key: str) -> Dict[str, Tuple[str, str]]:
+        """获取 列表页中的名称 -> (摘要, 名称)"""
+        data = await self.client.hgetall(self.get_qname(key, "source"))
+        return {self._decode(k): tuple(json.loads(v)) for k, v in data.items()}
+
+    async def get(self, key: str, name: str) -> Optional[bytes]:
+        return await self.client.hget(self.get_qname(key), name)
+
+    async def get_many(self, key: str, names: List[str]) -> List[Optional[bytes]]:
+        if not names:
+            return []
+        return await self.client.hmget(self.get_qname(key), names)
+
+    async def set_many(self, key: str, models: Iterable[WikiModel], sources: Dict[str, Tuple[str, str]]):
+        await self._set(key, {i.name: (i.id, i.json()) for i in models}, sources)
+
+    async def _set(self, key: str, items: Dict[str, Tuple[str, str]], sources: Dict[str, Tuple[str, str]]):
+        async with self.client.pipeline(transaction=True) as pipe:
+            if items:
+                pipe.hset(self.get_qname(key), mapping={name: data for name, (_, data) in items.items()})
+                pipe.hset(self.get_qname(key, "index"), mapping={name: id_ for name, (id_, _) in items.items()})
+            if sources:
+                pipe.hset(self.get_qname(key, "source"), mapping={k: json.dumps(v) for k, v in sources.items()})
+            await pipe.execute()
+
+    async def remove(self, key: str, names: List[str], source_names: List[str]):
+        async with self.client.pipeline(transaction=True) as pipe:
+            if names:
+                pipe.hdel(self.get_qname(key), *names)
+                pipe.hdel(self.get_qname(key, "index"), *names)
+            if source_names:
+                pipe.hdel(self.get_qname(key, "source"), *source_names)
+            await pipe.execute()
@@ -1,103 +1,206 @@
-from typing import List, Optional
+import asyncio
+from typing import Callable, Dict, Generic, List, Optional, Type, TypeVar
 
 from core.base_service import BaseService
-from core.services.wiki.cache import WikiCache
+from core.services.wiki.cache import WikiCache, WikiCheckpoint
+from metadata.shortname import roleToName, weaponToName
+from modules.wiki.base import WikiModel
 from modules.wiki.character import Character
 from modules.wiki.weapon import Weapon
 from utils.log import logger
 
-__all__ = ["WikiService"]
+__all__ = ["WikiService", "WikiStore"]
+
+ModelT = TypeVar("ModelT", bound=WikiModel)
+
+
+class WikiStore(Generic[ModelT]):
+    """一类 Wiki 数据的索引
+
+    启动时只读取 名称 -> ID 的索引，数据在第一次被查询时才从 Redis 读取并解析。
+    可以通过名称、别名或 ID 查询。
+    """
+
+    def __init__(self, cache: WikiCache, key: str, model: Type[ModelT], to_name: Callable[[str], str], desc: str):
+        """
+        :param cache: Wiki 缓存
+        :param key: Redis 中的键名
+        :param model: 数据的 Model
+        :param to_name: 将别名转换为正式名称的函数
+        :param desc: 用于日志的名称
+        """
+        self.cache = cache
+        self.key = key
+        self.model = model
+        self.to_name = to_name
+        self.desc = desc
+        self._ids: Dict[str, str] = {}
+        """名称 -> ID"""
+        self._names: Dict[str, str] = {}
+        """ID -> 名称"""
+        self._models: Dict[str, ModelT] = {}
+        """已经解析的数据"""
+        self.checkpoint = WikiCheckpoint(key)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._ids)
+
+    def _set_index(self, ids: Dict[str, str]):
+        self._ids = ids
+        self._names = {v: k for k, v in ids.items()}
+        self._models = {k: v for k, v in self._models.items() if k in ids}
+
+    async def load(self):
+        await self.cache.migrate(self.key)
+        self._set_index(await self.cache.get_index(self.key))
+        self._models.clear()
+
+    def resolve(self, query: str) -> Optional[str]:
+        """将名称、别名或 ID 转换为名称"""
+        if query in self._ids:
+            return query
+        if (name := self._names.get(query)) is not None:
+            return name
+        name = self.to_name(query)
+        return name if name in self._ids else None
+
+    async def get(self, query: str) -> Optional[ModelT]:
+        if (name := self.resolve(query)) is None:
+            return None
+        if (model := self._models.get(name)) is None:
+            data = await self.cache.get(self.key, name)
+            if data is None:
+                return None
+            model = self._models[name] = self.model.parse_raw(data)
+        return model
+
+    async def get_all(self) -> List[ModelT]:
+        missing = [name for name in self._ids if name not in self._models]
+        for name, data in zip(missing, await self.cache.get_many(self.key, missing)):
+            if data is not None:
+                self._models[name] = self.model.parse_raw(data)
+        return [self._models[name] for name in self._ids if name in self._models]
+
+    async def _scrape(self, name: str, url, digest: str) -> Optional[ModelT]:
+        try:
+            model = await self.model.get_by_url(url)
+        except Exception as exc:  # pylint: disable=W0703
+            logger.error("获取%s %s 出现异常 %s", self.desc, name, str(exc))
+            logger.debug("异常信息", exc_info=exc)
+            return None
+        await self.checkpoint.append(name, digest, model)
+        return model
+
+    async def refresh(self, force: bool = False):
+        """只重新获取列表数据发生变化、新增的条目，并删除已经不存在的条目
+        :param force: 是否重新获取全部条目
+        """
+        page_index = await self.model.get_page_index()
+        sources = await self.cache.get_sources(self.key)
+        changed = {
+            source_name: (url, digest)
+            for source_name, (url, digest) in page_index.items()
+            if force
+            or source_name not in sources
+            or sources[source_name][0] != digest
+            or sources[source_name][1] not in self._ids
+        }
+        scraped: Dict[str, Optional[ModelT]] = {
+            source_name: self.model.parse_raw(data)
+            for source_name, (digest, data) in self.checkpoint.load().items()
+            if source_name in changed and changed[source_name][1] == digest
+        }
+        pending = {k: v for k, v in changed.items() if k not in scraped}
+        logger.info(
+            "一共找到 %s 个%s信息，需要更新 %s 个，从上次中断处恢复 %s 个",
+            len(page_index),
+            self.desc,
+            len(changed),
+            len(scraped),
+        )
+        results = await asyncio.gather(*(self._scrape(k, url, digest) for k, (url, digest) in pending.items()))
+        scraped.update(zip(pending, results))
+        models = {}
+        new_sources = {}
+        for source_name, (_, digest) in changed.items():
+            if (model := scraped[source_name]) is not None:
+                models[model.name] = model
+                new_sources[source_name] = (digest, model.name)
+        removed_sources = [i for i in sources if i not in page_index]
+        # 获取失败的条目保留原有数据
+        alive = {name for i, (_, name) in sources.items() if i in page_index and i not in new_sources}
+        # 条目名称以保存的数据为准，列表中的名称可能与之不同
+        alive.update(sources[i][1] if i in sources else i for i in changed if i not in new_sources)
+        alive.update(models)
+        known = {name for _, name in sources.values()}
+        known.update(self._ids)
+        removed = [name for name in known if name not in alive]
+        logger.info("写入%s信息到Redis，更新 %s 个，删除 %s 个", self.desc, len(models), len(removed))
+        await self.cache.set_many(self.key, models.values(), new_sources)
+        await self.cache.remove(self.key, removed, removed_sources)
+        self.checkpoint.clear()
+        ids = {k: v for k, v in self._ids.items() if k not in removed}
+        ids.update({name: model.id for name, model in models.items()})
+        self._set_index(ids)
+        self._models.update(models)
 
 
 class WikiService(BaseService):
     def __init__(self, cache: WikiCache):
         self._cache = cache
         """Redis 在这里的作用是作为持久化"""
-        self._character_list = []
-        self._character_name_list = []
-        self._weapon_name_list = []
-        self._weapon_list = []
+        self.weapons: WikiStore[Weapon] = WikiStore(cache, "weapon", Weapon, weaponToName, "武器")
+        self.characters: WikiStore[Character] = WikiStore(cache, "characters", Character, roleToName, "角色")
         self.first_run = True
 
-    async def refresh_weapon(self):
-        weapon_name_list = await Weapon.get_name_list()
-        logger.info("一共找到 %s 把武器信息", len(weapon_name_list))
-
-        weapon_list = []
-        num = 0
-        async for weapon in Weapon.full_data_generator():
-            weapon_list.append(weapon)
-            num += 1
-            if num % 10 == 0:
-                logger.info("现在已经获取到 %s 把武器信息", num)
-
-        logger.info("写入武器信息到Redis")
-        self._weapon_list = weapon_list
-        await self._cache.delete("weapon")
-        await self._cache.set("weapon", [i.json() for i in weapon_list])
-
-    async def refresh_characters(self):
-        character_name_list = await Character.get_name_list()
-        logger.info("一共找到 %s 个角色信息", len(character_name_list))
-
-        character_list = []
-        num = 0
-        async for character in Character.full_data_generator():
-            character_list.append(character)
-            num += 1
-            if num % 10 == 0:
-                logger.info("现在已经获取到 %s 个角色信息", num)
-
-        logger.info("写入角色信息到Redis")
-        self._character_list = character_list
-        await self._cache.delete("characters")
-        await self._cache.set("characters", [i.json() for i in character_list])
-
-    async def refresh_wiki(self):
+    async def refresh_weapon(self, force: bool = False):
+        await self.weapons.refresh(force)
+
+    async def refresh_characters(self, force: bool = False):
+        await self.characters.refresh(force)
+
+    async def refresh_wiki(self, force: bool = False):
         """
-        用于把Redis的缓存全部加载进Python
+        从 Wiki 更新发生变化的数据
+        :param force: 是否重新获取全部数据
         :return:
         """
+        await self.init()
         logger.info("正在重新获取Wiki")
-        logger.info("正在重新获取武器信息")
-        await self.refresh_weapon()
-        logger.info("正在重新获取角色信息")
-        await self.refresh_characters()
+        # 请求的并发数量与速率由 WikiModel 统一限制
+        await asyncio.gather(self.refresh_weapon(force), self.refresh_characters(force))
         logger.info("刷新成功")
 
     async def init(self):
         """
-        用于把Redis的缓存全部加载进Python
+        从 Redis 读取索引，数据在使用时才会读取
         :return:
         """
         if self.first_run:
-            weapon_dict = await self._cache.get("weapon")
-            self._weapon_list = [Weapon.parse_obj(obj) for obj in weapon_dict]
-            self._weapon_name_list = [weapon.name for weapon in self._weapon_list]
-            characters_dict = await self._cache.get("characters")
-            self._character_list = [Character.parse_obj(obj) for obj in characters_dict]
-            self._character_name_list = [character.name for character in self._character_list]
-
+            await asyncio.gather(self.weapons.load(), self.characters.load())
             self.first_run = False
 
     async def get_weapons(self, name: str) -> Optional[Weapon]:
         await self.init()
-        if len(self._weapon_list) == 0:
-            return None
-        return next((weapon for weapon in self._weapon_list if weapon.name == name), None)
+        return await self.weapons.get(name)
 
     async def get_weapons_name_list(self) -> List[str]:
         await self.init()
-        return self._weapon_name_list
+        return self.weapons.names
 
     async def get_weapons_list(self) -> List[Weapon]:
         await self.init()
-        return self._weapon_list
+        return await self.weapons.get_all()
+
+    async def get_characters(self, name: str) -> Optional[Character]:
+        await self.init()
+        return await self.characters.get(name)
 
     async def get_characters_list(self) -> List[Character]:
         await self.init()
-        return self._character_list
+        return await self.characters.get_all()
 
     async def get_characters_name_list(self) -> List[str]:
         await self.init()
-        return self._character_name_list
+        return self.characters.names
@@ -2,7 +2,6 @@
 
 from __future__ import annotations
 
-import functools
 from typing import Any, Generic, ItemsView, Iterator, KeysView, Optional, TypeVar, ValuesView
 
 import ujson as json
@@ -23,6 +22,8 @@ __all__ = (
     "Data",
     "weapon_to_game_id",
     "avatar_to_game_id",
+    "clear_cache",
+    "reload_cache",
 )
 
 K = TypeVar("K")
@@ -101,23 +102,45 @@ ARTIFACT_DATA: dict[str, dict[str, int | str | list[int] | dict[str, str]]] = Da
 NAMECARD_DATA: dict[str, dict[str, int | str]] = Data("namecard")
 
 
-@functools.lru_cache()
+def clear_cache() -> None:
+    """清除已读取的元数据，下次访问时会重新读取文件"""
+    _cache.clear()
+
+
+def reload_cache() -> None:
+    """重新读取所有元数据文件，读取完成后再整体替换旧的缓存"""
+    global _cache  # pylint: disable=W0603
+    cache = {}
+    for data in (HONEY_DATA, AVATAR_DATA, WEAPON_DATA, MATERIAL_DATA, ARTIFACT_DATA, NAMECARD_DATA):
+        path = data_dir.joinpath(data._file_name).with_suffix(".json")  # pylint: disable=W0212
+        if path.exists():
+            with open(path, encoding="utf-8") as file:
+                cache[data._file_name] = json.load(file)  # pylint: disable=W0212
+    _cache = cache
+
+
 def honey_id_to_game_id(honey_id: str, item_type: str) -> str | None:
-    return next((key for key, value in HONEY_DATA[item_type].items() if value[0] == honey_id), None)
+    from metadata.index import get_metadata_index  # pylint: disable=C0415
+
+    return get_metadata_index().honey_id.get(item_type, {}).get(honey_id)
 
 
-@functools.lru_cache
 def game_id_to_role_id(gid: str) -> int | None:
-    return next(
-        (int(key.split("-")[0]) for key, value in AVATAR_DATA.items() if value["icon"].split("_")[-1] == gid), None
-    )
+    from metadata.index import get_metadata_index  # pylint: disable=C0415
+
+    key = get_metadata_index().avatar_icon.get(gid)
+    return int(key.split("-")[0]) if key is not None else None
 
 
-@functools.lru_cache()
 def weapon_to_game_id(name: str) -> Optional[int]:
-    return next((int(key) for key, value in WEAPON_DATA.items() if value["name"] == name), None)
+    from metadata.index import get_metadata_index  # pylint: disable=C0415
+
+    key = get_metadata_index().weapon_name.get(name)
+    return int(key) if key is not None else None
 
 
-@functools.lru_cache()
 def avatar_to_game_id(name: str) -> Optional[int]:
-    return next((int(key) for key, value in AVATAR_DATA.items() if value["name"] == name), None)
+    from metadata.index import get_metadata_index  # pylint: disable=C0415
+
+    key = get_metadata_index().avatar_name.get(name)
+    return int(key) if key is not None else None
@@ -0,0 +1,113 @@
+"""元数据的反向索引
+
+``metadata.shortname`` 与 ``metadata.genshin`` 中的查询函数都通过这里的哈希表完成查找。
+索引在第一次使用时按需构建，刷新元数据后调用 :func:`refresh_metadata_index` 会在新的索引构建完成后再替换旧的索引。
+"""
+
+from __future__ import annotations
+
+from functools import cached_property
+from typing import Dict, List, Optional, Tuple
+
+from metadata import genshin
+
+__all__ = ("MetadataIndex", "get_metadata_index", "refresh_metadata_index")
+
+
+class MetadataIndex:
+    """一次元数据加载对应的全部反向索引"""
+
+    @cached_property
+    def role_alias(self) -> Dict[str, Tuple[int, str]]:
+        """角色昵称（小写） -> (角色ID, 正式名)"""
+        from metadata.shortname import roles  # pylint: disable=C0415
+
+        result = {}
+        for key, value in roles.items():
+            for name in value:
+                result.setdefault(name, (key, value[0]))
+        return result
+
+    @cached_property
+    def role_tag(self) -> Dict[str, List[str]]:
+        """角色正式名 -> 角色昵称列表"""
+        from metadata.shortname import roles  # pylint: disable=C0415
+
+        result = {}
+        for value in roles.values():
+            result.setdefault(value[0], value)
+        return result
+
+    @cached_property
+    def weapon_alias(self) -> Dict[str, str]:
+        """武器昵称 -> 正式名"""
+        from metadata.shortname import weapons  # pylint: disable=C0415
+
+        result = {}
+        for key, value in weapons.items():
+            result.setdefault(key, key)
+            for name in value:
+                result.setdefault(name, key)
+        return result
+
+    @cached_property
+    def weapon_name(self) -> Dict[str, str]:
+        """武器名 -> 武器ID"""
+        result = {}
+        for key, value in genshin.WEAPON_DATA.items():
+            result.setdefault(value["name"], key)
+        return result
+
+    @cached_property
+    def avatar_name(self) -> Dict[str, str]:
+        """角色名 -> 角色ID"""
+        result = {}
+        for key, value in genshin.AVATAR_DATA.items():
+            result.setdefault(value["name"], key)
+        return result
+
+    @cached_property
+    def avatar_icon(self) -> Dict[str, str]:
+        """角色图标名称的后缀 -> 角色ID"""
+        result = {}
+        for key, value in genshin.AVATAR_DATA.items():
+            result.setdefault(value["icon"].split("_")[-1], key)
+        return result
+
+    @cached_property
+    def honey_id(self) -> Dict[str, Dict[str, str]]:
+        """物品类型 -> honey impact ID -> 游戏内ID"""
+        result = {}
+        for item_type, items in genshin.HONEY_DATA.items():
+            ids = result[item_type] = {}
+            for key, value in items.items():
+                ids.setdefault(value[0], key)
+        return result
+
+    def build(self) -> "MetadataIndex":
+        """立即构建所有索引"""
+        for name, value in vars(type(self)).items():
+            if isinstance(value, cached_property):
+                getattr(self, name)
+        return self
+
+    def weapon_to_id(self, name: str) -> Optional[int]:
+        if (key := self.weapon_name.get(name)) is not None:
+            return int(key)
+        # 兼容部分匹配的武器名
+        return next((int(key) for key, value in genshin.WEAPON_DATA.items() if name in value["name"]), None)
+
+
+_INDEX = MetadataIndex()
+
+
+def get_metadata_index() -> MetadataIndex:
+    return _INDEX
+
+
+def refresh_metadata_index() -> MetadataIndex:
+    """重新读取元数据并构建索引，构建完成前仍然使用旧的索引"""
+    global _INDEX  # pylint: disable=W0603
+    genshin.reload_cache()
+    _INDEX = MetadataIndex().build()
+    return _INDEX
@@ -1,3 +1,7 @@
+import datetime
+from bisect import bisect_right
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
 from metadata.pool.pool_200 import POOL_200
 from metadata.pool.pool_301 import POOL_301
 from metadata.pool.pool_302 import POOL_302
@@ -11,3 +15,57 @@ def get_pool_by_id(pool_type):
     if pool_type == 302:
         return POOL_302
     return None
+
+
+class PoolIndex:
+    """卡池的时间区间索引
+
+    将所有卡池的开放时间切分为互不重叠的时间段，并记录每个时间段内开放的卡池以及 UP 的五星，
+    查询某一时间开放的卡池只需要二分查找对应的时间段。
+    """
+
+    def __init__(self, pools: List[dict]):
+        self.pools = pools
+        windows = [
+            (
+                datetime.datetime.strptime(pool["from"], "%Y-%m-%d %H:%M:%S"),
+                # 卡池的结束时间包含在卡池内
+                datetime.datetime.strptime(pool["to"], "%Y-%m-%d %H:%M:%S") + datetime.timedelta(microseconds=1),
+            )
+            for pool in pools
+        ]
+        self.boundaries: List[datetime.datetime] = sorted({time for window in windows for time in window})
+        self.active: List[Tuple[int, ...]] = []
+        self.up_five: List[FrozenSet[str]] = []
+        for start, end in zip(self.boundaries, self.boundaries[1:]):
+            active = tuple(idx for idx, (_from, _to) in enumerate(windows) if _from <= start and end <= _to)
+            self.active.append(active)
+            self.up_five.append(frozenset(name for idx in active for name in pools[idx]["five"]))
+
+    def _segment(self, time: datetime.datetime) -> int:
+        idx = bisect_right(self.boundaries, time) - 1
+        return idx if 0 <= idx < len(self.active) else -1
+
+    def find(self, time: datetime.datetime) -> Tuple[int, ...]:
+        """查询某一时间开放的卡池
+        :param time: 时间
+        :return: 卡池在 pools 中的下标
+        """
+        idx = self._segment(time)
+        return self.active[idx] if idx != -1 else ()
+
+    def get_up_five(self, time: datetime.datetime) -> FrozenSet[str]:
+        """查询某一时间开放的卡池中 UP 的五星"""
+        idx = self._segment(time)
+        return self.up_five[idx] if idx != -1 else frozenset()
+
+
+_POOL_INDEX: Dict[int, PoolIndex] = {}
+
+
+def get_pool_index(pool_type) -> Optional[PoolIndex]:
+    if (index := _POOL_INDEX.get(pool_type)) is None:
+        if (pools := get_pool_by_id(pool_type)) is None:
+            return None
+        index = _POOL_INDEX[pool_type] = PoolIndex(pools)
+    return index
@@ -2,12 +2,13 @@ from __future__ import annotations
 
 import asyncio
 import re
+import weakref
 from typing import Dict, List, Optional
 
 import ujson as json
-from aiofiles import open as async_open
 from httpx import AsyncClient, HTTPError, Response
 
+from metadata.scripts.metadatas import write_text
 from modules.wiki.base import HONEY_HOST
 from utils.const import PROJECT_ROOT
 from utils.log import logger
@@ -27,11 +28,27 @@ FULL_DATA_TYPE = Dict[str, DATA_TYPE]
 
 client = AsyncClient()
 
+REQUEST_CONCURRENCY = 8
+"""同时请求 honey 页面的最大数量"""
+
+
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def get_semaphore() -> asyncio.Semaphore:
+    """当前事件循环中限制同时请求数量的信号量"""
+    loop = asyncio.get_running_loop()
+    if (semaphore := _semaphores.get(loop)) is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(REQUEST_CONCURRENCY)
+    return semaphore
+
 
 async def request(url: str, retry: int = 5) -> Optional[Response]:
+    """请求页面，同时进行的请求不超过 REQUEST_CONCURRENCY 个"""
     for time in range(retry):
         try:
-            return await client.get(url)
+            async with get_semaphore():
+                return await client.get(url)
         except HTTPError:
             if time != retry - 1:
                 await asyncio.sleep(1)
@@ -61,8 +78,7 @@ async def get_weapon_data() -> DATA_TYPE:
 
     result = {}
     urls = [HONEY_HOST.join(f"fam_{i.lower()}/?lang=CHS") for i in WeaponType.__members__]
-    for url in urls:
-        response = await request(url)
+    for response in await asyncio.gather(*(request(url) for url in urls)):
         chaos_data = re.findall(r"sortable_data\.push\((.*?)\);\s*sortable_cur_page", response.text)[0]
         json_data = json.loads(chaos_data)  # 转为 json
         for data in json_data:
@@ -84,11 +100,12 @@ async def get_material_data() -> DATA_TYPE:
     namecard = [HONEY_HOST.join("fam_nameplate/?lang=CHS")]
     urls = weapon + talent + namecard
 
-    response = await request("https://api.ambr.top/v2/chs/material")
+    response, *responses = await asyncio.gather(
+        request("https://api.ambr.top/v2/chs/material"), *(request(url) for url in urls)
+    )
     ambr_data = json.loads(response.text)["data"]["items"]
 
-    for url in urls:
-        response = await request(url)
+    for response in responses:
         chaos_data = re.findall(r"sortable_data\.push\((.*?)\);\s*sortable_cur_page", response.text)[0]
         json_data = json.loads(chaos_data)  # 转为 json
         for data in json_data:
@@ -120,11 +137,12 @@ async def get_artifact_data() -> DATA_TYPE:
     response = await request(url)
     chaos_data = re.findall(r"sortable_data\.push\((.*?)\);\s*sortable_cur_page", response.text)[0]
     json_data = json.loads(chaos_data)  # 转为 json
-    for data in json_data:
+    first_ids = await asyncio.gather(
+        *(get_first_id(HONEY_HOST.join(re.findall(r'href="(.*?)"', data[0])[0])) for data in json_data)
+    )
+    for data, first_id in zip(json_data, first_ids):
         honey_id = re.findall(r"/(.*?)/", data[1])[0]
         name = re.findall(r"alt=\"(.*?)\"", data[0])[0]
-        link = HONEY_HOST.join(re.findall(r'href="(.*?)"', data[0])[0])
-        first_id = await get_first_id(link)
         aid = None
         for aid, item in ambr_data.items():
             if name == item["name"]:
@@ -169,16 +187,10 @@ async def update_honey_metadata(overwrite: bool = True) -> FULL_DATA_TYPE | None
     path = PROJECT_ROOT.joinpath("metadata/data/honey.json")
     if not overwrite and path.exists():
         return
-    avatar_data = await get_avatar_data()
-    logger.success("Avatar data is done.")
-    weapon_data = await get_weapon_data()
-    logger.success("Weapon data is done.")
-    material_data = await get_material_data()
-    logger.success("Material data is done.")
-    artifact_data = await get_artifact_data()
-    logger.success("Artifact data is done.")
-    namecard_data = await get_namecard_data()
-    logger.success("Namecard data is done.")
+    avatar_data, weapon_data, material_data, artifact_data, namecard_data = await asyncio.gather(
+        get_avatar_data(), get_weapon_data(), get_material_data(), get_artifact_data(), get_namecard_data()
+    )
+    logger.success("Honey data is done.")
 
     result = {
         "avatar": avatar_data,
@@ -187,7 +199,5 @@ async def update_honey_metadata(overwrite: bool = True) -> FULL_DATA_TYPE | None
         "artifact": artifact_data,
         "namecard": namecard_data,
     }
-    path.parent.mkdir(parents=True, exist_ok=True)
-    async with async_open(path, mode="w", encoding="utf-8") as file:
-        await file.write(json.dumps(result, ensure_ascii=False, indent=4))
+    await write_text(path, json.dumps(result, ensure_ascii=False, indent=4))
     return result
@@ -1,16 +1,25 @@
+import asyncio
+import os
 from contextlib import contextmanager
-from typing import Iterator, Dict
+from pathlib import Path
+from typing import Iterator, Dict, Optional
 
 import ujson as json
 from aiofiles import open as async_open
-from httpx import URL, AsyncClient, RemoteProtocolError, Response
+from httpx import URL, AsyncClient, HTTPError, RemoteProtocolError, Response
 
+from metadata.scripts.textmap import JsonArrayStream, TextMapExtractor
 from utils.const import AMBR_HOST, PROJECT_ROOT
 from utils.log import logger
+from utils.typedefs import StrOrURL
 
 __all__ = [
     "update_metadata_from_ambr",
     "update_metadata_from_github",
+    "Manifest",
+    "manifest",
+    "conditional_get",
+    "write_text",
     "RESOURCE_DEFAULT_PATH",
     "RESOURCE_FAST_URL",
     "RESOURCE_FightPropRule_URL",
@@ -22,8 +31,95 @@ RESOURCE_DEFAULT_PATH = f"{RESOURCE_REPO}/{RESOURCE_BRANCH}/{RESOURCE_ROOT}/"
 RESOURCE_FAST_URL = f"https://genshin-res.paimon.vip/{RESOURCE_ROOT}/"
 RESOURCE_FightPropRule_URL = "https://fightproprule.paimon.vip/"
 
+STREAM_CHUNK_SIZE = 64 * 1024
+"""流式读取大型数据文件时每块的大小"""
+
 client = AsyncClient()
 
+MANIFEST_PATH = PROJECT_ROOT.joinpath("metadata/data/manifest.json")
+
+
+async def write_text(path: Path, text: str) -> None:
+    """先写入临时文件再替换，避免写入过程中被中断时留下不完整的元数据文件"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f"{path.name}.tmp")
+    async with async_open(temp_path, mode="w", encoding="utf-8") as file:
+        await file.write(text)
+    os.replace(temp_path, path)
+
+
+class Manifest:
+    """记录已下载的远程文件的 ETag 与 Last-Modified，用于条件请求"""
+
+    def __init__(self, path: Path = MANIFEST_PATH):
+        self.path = path
+        self._data: Optional[Dict[str, Dict[str, str]]] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def data(self) -> Dict[str, Dict[str, str]]:
+        if self._data is None:
+            try:
+                with open(self.path, encoding="utf-8") as file:
+                    self._data = json.load(file)
+            except (FileNotFoundError, ValueError):
+                self._data = {}
+        return self._data
+
+    def headers(self, url: str) -> Dict[str, str]:
+        """条件请求所需的请求头"""
+        headers = {}
+        if (entry := self.data.get(str(url))) is not None:
+            if etag := entry.get("etag"):
+                headers["If-None-Match"] = etag
+            if last_modified := entry.get("last_modified"):
+                headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def update(self, url: str, response: Response) -> None:
+        """记录响应的 ETag 与 Last-Modified，需要在文件保存后调用"""
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if etag or last_modified:
+            self.data[str(url)] = {"etag": etag or "", "last_modified": last_modified or ""}
+        else:
+            self.data.pop(str(url), None)
+
+    async def save(self) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            await write_text(self.path, json.dumps(self.data, ensure_ascii=False, indent=4))
+
+
+manifest = Manifest()
+
+
+async def conditional_get(url: StrOrURL, path: Path) -> Optional[Response]:
+    """在本地文件存在时使用条件请求获取远程文件
+    :param url: 远程文件地址
+    :param path: 对应的本地文件
+    :return: 远程文件未发生变化时返回 None
+    """
+    headers = manifest.headers(str(url)) if path.exists() else {}
+    response = await client.get(url, headers=headers)
+    if response.status_code == 304:
+        logger.debug("远程文件 %s 未发生变化", url)
+        return None
+    response.raise_for_status()
+    return response
+
+
+async def is_modified(url: StrOrURL, path: Path) -> bool:
+    """使用 HEAD 条件请求检查远程文件是否发生了变化，无法确定时视为已变化"""
+    if not path.exists() or not (headers := manifest.headers(str(url))):
+        return True
+    try:
+        response = await client.head(url, headers=headers)
+    except HTTPError:
+        return True
+    return response.status_code != 304
+
 
 async def fix_metadata_from_ambr(json_data: Dict[str, Dict], data_type: str):
     if data_type == "weapon":
@@ -37,22 +133,30 @@ async def fix_metadata_from_ambr(json_data: Dict[str, Dict], data_type: str):
 
 
 async def update_metadata_from_ambr(overwrite: bool = True):
-    result = []
-    targets = ["material", "weapon", "avatar", "reliquary"]
-    for target in targets:
+    """从 ambr 并发获取元数据，远程数据未发生变化的文件会被跳过"""
+
+    async def update(target: str):
         path = PROJECT_ROOT.joinpath(f"metadata/data/{target}.json")
         if not overwrite and path.exists():
-            continue
+            return None
         url = AMBR_HOST.join(f"v2/chs/{target}")
         path.parent.mkdir(parents=True, exist_ok=True)
-        response = await client.get(url)
+        if (response := await conditional_get(url, path)) is None:
+            return None
         json_data = json.loads(response.text)["data"]["items"]
         await fix_metadata_from_ambr(json_data, target)
-        async with async_open(path, mode="w", encoding="utf-8") as file:
-            data = json.dumps(json_data, ensure_ascii=False, indent=4)
-            await file.write(data)
-        result.append(json_data)
-    return result
+        await write_text(path, json.dumps(json_data, ensure_ascii=False, indent=4))
+        manifest.update(str(url), response)
+        return json_data
+
+    targets = ["material", "weapon", "avatar", "reliquary"]
+    results = await asyncio.gather(*(update(target) for target in targets))
+    await manifest.save()
+    return [result for result in results if result is not None]
+
+
+def is_namecard(material: Dict) -> bool:
+    return material.get("materialType") == "MATERIAL_NAMECARD"
 
 
 @contextmanager
@@ -76,43 +180,39 @@ async def update_metadata_from_github(overwrite: bool = True):
         try:
             text_map_url = host.join("TextMap/TextMapCHS.json")
             material_url = host.join("ExcelBinOutput/MaterialExcelConfigData.json")
+            if not (await is_modified(material_url, path) or await is_modified(text_map_url, path)):
+                logger.info("名片元数据未发生变化")
+                return None
 
             material_json_data = []
             async with client.stream("GET", material_url) as response:
-                started = False
-                cell = []
-                async for line in response.aiter_lines():
-                    if line == "  {":
-                        started = True
-                        continue
-                    if line in ["  },", "  }"]:
-                        started = False
-                        if any("MATERIAL_NAMECARD" in x for x in cell):
-                            material_json_data.append(json.loads("{" + "".join(cell) + "}"))
-                        cell = []
-                        continue
-                    if started:
-                        if "materialType" in line and "MATERIAL_NAMECARD" not in line:
-                            cell = []
-                            started = False
-                            continue
-                        cell.append(line.strip(" "))
-
-            string_ids = []
-            for namecard_data in material_json_data:
-                string_ids.append(str(namecard_data["nameTextMapHash"]))
-                string_ids.append(str(namecard_data["descTextMapHash"]))
-
-            text_map_json_data = {}
+                material_response = response
+                response.raise_for_status()
+                materials = JsonArrayStream()
+                async for chunk in response.aiter_text(STREAM_CHUNK_SIZE):
+                    material_json_data.extend(i for i in materials.feed(chunk) if is_namecard(i))
+                material_json_data.extend(i for i in materials.feed("", final=True) if is_namecard(i))
+
+            extractor = TextMapExtractor(
+                {
+                    "namecard": (
+                        text_hash
+                        for namecard_data in material_json_data
+                        for text_hash in (namecard_data["nameTextMapHash"], namecard_data["descTextMapHash"])
+                    )
+                }
+            )
             async with client.stream("GET", text_map_url) as response:
-                async for line in response.aiter_lines():
-                    splits = line.split(":")
-                    string_id = splits[0].strip(' "')
-                    if string_id in string_ids:
-                        text_map_json_data[string_id] = splits[1].strip('\n ,"')
-                        string_ids.remove(string_id)
-                    if not string_ids:
+                text_map_response = response
+                response.raise_for_status()
+                async for chunk in response.aiter_text(STREAM_CHUNK_SIZE):
+                    if extractor.feed(chunk):
                         break
+                else:
+                    extractor.feed("", final=True)
+            if not extractor.done:
+                raise ValueError(f"TextMap 中缺少 {len(extractor.missing)} 个名片文本")
+            text_map_json_data = extractor.result["namecard"]
 
             data = {}
             for namecard_data in material_json_data:
@@ -121,7 +221,7 @@ async def update_metadata_from_github(overwrite: bool = True):
                 navbar = namecard_data["picPath"][0]
                 banner = namecard_data["picPath"][1]
                 rank = namecard_data["rankLevel"]
-                description = text_map_json_data[str(namecard_data["descTextMapHash"])].replace("\\n", "\n")
+                description = text_map_json_data[str(namecard_data["descTextMapHash"])]
                 data.update(
                     {
                         str(namecard_data["id"]): {
@@ -135,9 +235,10 @@ async def update_metadata_from_github(overwrite: bool = True):
                         }
                     }
                 )
-            async with async_open(path, mode="w", encoding="utf-8") as file:
-                data = json.dumps(data, ensure_ascii=False, indent=4)
-                await file.write(data)
+            await write_text(path, json.dumps(data, ensure_ascii=False, indent=4))
+            manifest.update(str(material_url), material_response)
+            manifest.update(str(text_map_url), text_map_response)
+            await manifest.save()
             return data
         except RemoteProtocolError as exc:
             logger.warning("在从 %s 下载元数据的过程中遇到了错误: %s", host, str(exc))
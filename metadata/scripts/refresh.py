@@ -0,0 +1,41 @@
+"""并发刷新所有来源的元数据"""
+
+import asyncio
+from metadata.index import refresh_metadata_index
+from metadata.scripts.honey import update_honey_metadata
+from metadata.scripts.metadatas import update_metadata_from_ambr, update_metadata_from_github
+from metadata.scripts.paimon_moe import update_paimon_moe_zh
+from utils.log import logger
+
+__all__ = ("refresh_metadata",)
+
+
+async def refresh_metadata(overwrite: bool = True, honey: bool = True) -> bool:
+    """并发刷新元数据，完成后重新构建元数据索引
+    :param overwrite: 是否覆盖已存在的元数据文件
+    :param honey: 是否刷新 honey 元数据
+    :return: 所有来源是否都刷新成功
+    """
+    # honey 的名片数据依赖 github 上的名片元数据，需要等待其完成
+    github = asyncio.create_task(update_metadata_from_github(overwrite))
+
+    async def update_honey():
+        await github
+        if honey:
+            await update_honey_metadata(overwrite)
+
+    sources = ("github", "paimon_moe", "ambr", "honey")
+    results = await asyncio.gather(
+        github,
+        update_paimon_moe_zh(overwrite),
+        update_metadata_from_ambr(overwrite),
+        update_honey(),
+        return_exceptions=True,
+    )
+    success = True
+    for source, result in zip(sources, results):
+        if isinstance(result, BaseException):
+            logger.error("从 %s 刷新元数据时出现错误", source, exc_info=result)
+            success = False
+    await asyncio.get_running_loop().run_in_executor(None, refresh_metadata_index)
+    return success
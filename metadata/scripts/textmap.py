@@ -0,0 +1,125 @@
+"""增量解析游戏数据中的大型 JSON 文件"""
+
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Union
+
+__all__ = ("TextMapExtractor", "JsonArrayStream")
+
+_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+_WHITESPACE = re.compile(r"[\s,]*")
+
+
+class TextMapExtractor:
+    """从分块到达的 TextMap 中提取指定 Hash 的文本
+
+    TextMap 是一个 Hash -> 文本 的 JSON 对象，每次匹配一个完整的键值对，不依赖换行与缩进，
+    未匹配完的部分留到下一块数据再处理，内存占用只与单个分块的大小有关。
+    需要的 Hash 保存在集合中，全部找到后即可停止读取。
+    """
+
+    max_buffer: int = 1024 * 1024
+    """未能解析的数据的最大长度，超过时认为文件格式错误"""
+
+    _PAIR = re.compile(rf"[\s{{,]*({_STRING})\s*:\s*({_STRING}|[^\s,{{}}\[\]\"]+)")
+
+    def __init__(self, groups: Dict[str, Iterable[Union[int, str]]]):
+        """
+        :param groups: 分组名 -> 该组需要的 Hash，例如 {"namecard": [...], "avatar": [...]}
+        """
+        self.result: Dict[str, Dict[str, str]] = {group: {} for group in groups}
+        """分组名 -> (Hash -> 文本)"""
+        self._wanted: Dict[str, List[str]] = {}
+        """Hash -> 需要该 Hash 的分组"""
+        for group, hashes in groups.items():
+            for text_hash in hashes:
+                self._wanted.setdefault(str(text_hash), []).append(group)
+        self._buffer = ""
+
+    @property
+    def done(self) -> bool:
+        return not self._wanted
+
+    @property
+    def missing(self) -> Dict[str, List[str]]:
+        """未找到的 Hash -> 分组"""
+        return self._wanted
+
+    def feed(self, chunk: str, final: bool = False) -> bool:
+        """处理一块数据
+        :param chunk: 数据
+        :param final: 是否为最后一块数据
+        :return: 是否已经找到全部需要的 Hash
+        """
+        buffer = self._buffer + chunk if self._buffer else chunk
+        size = len(buffer)
+        wanted = self._wanted
+        match = self._PAIR.match
+        pos = 0
+        while wanted and (pair := match(buffer, pos)) is not None:
+            # 位于末尾的值可能还没有接收完整
+            if pair.end() == size and not final:
+                break
+            pos = pair.end()
+            key = pair.group(1)[1:-1]
+            if "\\" in key:
+                key = json.loads(pair.group(1))
+            if (groups := wanted.pop(key, None)) is not None:
+                value = json.loads(pair.group(2))
+                for group in groups:
+                    self.result[group][key] = value
+        self._buffer = buffer[pos:] if wanted else ""
+        if len(self._buffer) > self.max_buffer:
+            raise ValueError(f"无法解析 TextMap 数据: {self._buffer[:50]!r}")
+        return self.done
+
+    def extract(self, chunks: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        for chunk in chunks:
+            if self.feed(chunk):
+                break
+        else:
+            self.feed("", final=True)
+        return self.result
+
+
+class JsonArrayStream:
+    """逐个解析分块到达的 JSON 数组中的元素，不依赖换行与缩进"""
+
+    max_buffer: int = 16 * 1024 * 1024
+    """单个元素的最大长度"""
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._started = False
+
+    def feed(self, chunk: str, final: bool = False) -> Iterator[Any]:
+        buffer = self._buffer + chunk if self._buffer else chunk
+        pos = _WHITESPACE.match(buffer).end()
+        if not self._started:
+            if pos == len(buffer):
+                self._buffer = ""
+                return
+            if buffer[pos] != "[":
+                raise ValueError("数据不是 JSON 数组")
+            self._started = True
+            pos = _WHITESPACE.match(buffer, pos + 1).end()
+        while pos < len(buffer) and buffer[pos] != "]":
+            try:
+                item, end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # 元素还没有接收完整
+                break
+            # 位于末尾的数字可能还没有接收完整
+            if end == len(buffer) and not final:
+                break
+            yield item
+            pos = _WHITESPACE.match(buffer, end).end()
+        self._buffer = buffer[pos:]
+        if len(self._buffer) > self.max_buffer:
+            raise ValueError(f"无法解析 JSON 数组: {self._buffer[:50]!r}")
+
+    def iter(self, chunks: Iterable[str]) -> Iterator[Any]:
+        for chunk in chunks:
+            yield from self.feed(chunk)
+        yield from self.feed("", final=True)
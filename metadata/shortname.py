@@ -1,9 +1,8 @@
 from __future__ import annotations
 
-import functools
 from typing import List
 
-from metadata.genshin import WEAPON_DATA
+from metadata.index import get_metadata_index
 
 __all__ = [
     "roles",
@@ -744,45 +743,38 @@ weapons = {
 
 
 # noinspection PyPep8Naming
-@functools.lru_cache()
 def roleToName(shortname: str) -> str:
     """将角色昵称转为正式名"""
     shortname = str.casefold(shortname)  # 忽略大小写
-    return next((value[0] for value in roles.values() for name in value if name == shortname), shortname)
+    return value[1] if (value := get_metadata_index().role_alias.get(shortname)) else shortname
 
 
 # noinspection PyPep8Naming
-@functools.lru_cache()
 def roleToId(name: str) -> int | None:
     """获取角色ID"""
-    name = str.casefold(name)
-    return next((key for key, value in roles.items() for n in value if n == name), None)
+    return value[0] if (value := get_metadata_index().role_alias.get(str.casefold(name))) else None
 
 
 # noinspection PyPep8Naming
-@functools.lru_cache()
 def idToName(cid: int) -> str | None:
     """从角色ID获取正式名"""
     return roles[cid][0] if cid in roles else None
 
 
 # noinspection PyPep8Naming
-@functools.lru_cache()
 def weaponToName(shortname: str) -> str:
     """将武器昵称转为正式名"""
-    return next((key for key, value in weapons.items() if shortname == key or shortname in value), shortname)
+    return get_metadata_index().weapon_alias.get(shortname, shortname)
 
 
 # noinspection PyPep8Naming
-@functools.lru_cache()
 def weaponToId(name: str) -> int | None:
     """获取武器ID"""
-    return next((int(key) for key, value in WEAPON_DATA.items() if weaponToName(name) in value["name"]), None)
+    return get_metadata_index().weapon_to_id(weaponToName(name))
 
 
 # noinspection PyPep8Naming
-@functools.lru_cache()
 def roleToTag(role_name: str) -> List[str]:
     """通过角色名获取TAG"""
     role_name = str.casefold(role_name)
-    return next((value for value in roles.values() if value[0] == role_name), [role_name])
+    return get_metadata_index().role_tag.get(role_name, [role_name])
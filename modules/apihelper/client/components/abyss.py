@@ -1,9 +1,101 @@
+import heapq
+import re
 import time
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
 import httpx
 
-__all__ = ("AbyssTeam",)
+__all__ = ("AbyssTeam", "AbyssTeamIndex", "Team")
+
+
+class Team(NamedTuple):
+    """单个半场的配队"""
+
+    mask: int
+    """角色的位掩码"""
+    characters: Tuple[int, ...]
+    rate: float
+
+
+class AbyssTeamIndex:
+    """一层深渊上下半场的配队索引
+
+    角色 ID 转为位掩码，配队按照使用率从高到低排列，
+    查询时只需要位运算判断角色是否拥有、上下半场是否冲突。
+    """
+
+    def __init__(self, data: Dict[str, List[Dict]]):
+        self.bits: Dict[int, int] = {}
+        """角色 ID -> 位"""
+        self.up = self._parse(data.get("Up", []))
+        self.down = self._parse(data.get("Down", []))
+
+    def _parse(self, teams: List[Dict]) -> List[Team]:
+        result = []
+        for team in teams:
+            characters = tuple(int(i) for i in re.findall(r"\d+", team["Item"]))
+            mask = 0
+            for character in characters:
+                mask |= self.bits.setdefault(character, 1 << len(self.bits))
+            result.append(Team(mask, characters, team["Rate"]))
+        result.sort(key=lambda x: x.rate, reverse=True)
+        return result
+
+    def get_mask(self, characters: Iterable[int]) -> int:
+        mask = 0
+        for character in characters:
+            mask |= self.bits.get(character, 0)
+        return mask
+
+    @staticmethod
+    def available(teams: List[Team], owned: int) -> Iterator[Team]:
+        """拥有全部角色的配队，保持使用率的顺序"""
+        return (team for team in teams if not team.mask & ~owned)
+
+    def top_pairs(self, characters: Iterable[int], k: int, allow_overlap: bool = False) -> List[Tuple[Team, Team]]:
+        """使用率乘积最高的 k 个上下半场配队组合
+
+        上下半场的配队均已按使用率排序，从 (0, 0) 开始用堆按乘积从大到小展开组合，
+        堆顶的乘积即为剩余组合的上界，得到 k 个组合后即可停止，不需要枚举全部组合。
+
+        :param characters: 拥有的角色 ID
+        :param k: 组合的数量
+        :param allow_overlap: 是否允许上下半场使用相同的角色
+        """
+        owned = self.get_mask(characters)
+        # 可用的配队只在需要时才筛选
+        up, down = _LazyTeams(self.available(self.up, owned)), _LazyTeams(self.available(self.down, owned))
+        result: List[Tuple[Team, Team]] = []
+        if not up.has(0) or not down.has(0) or k <= 0:
+            return result
+        heap = [(-up[0].rate * down[0].rate, 0, 0)]
+        seen = {(0, 0)}
+        while heap and len(result) < k:
+            _, i, j = heapq.heappop(heap)
+            if allow_overlap or not up[i].mask & down[j].mask:
+                result.append((up[i], down[j]))
+            for x, y in ((i + 1, j), (i, j + 1)):
+                if (x, y) not in seen and up.has(x) and down.has(y):
+                    seen.add((x, y))
+                    heapq.heappush(heap, (-up[x].rate * down[y].rate, x, y))
+        return result
+
+
+class _LazyTeams:
+    def __init__(self, teams: Iterator[Team]):
+        self._teams = teams
+        self._items: List[Team] = []
+
+    def has(self, index: int) -> bool:
+        while len(self._items) <= index:
+            team = next(self._teams, None)
+            if team is None:
+                return False
+            self._items.append(team)
+        return True
+
+    def __getitem__(self, index: int) -> Team:
+        return self._items[index]
 
 
 class AbyssTeam:
@@ -23,6 +115,7 @@ class AbyssTeam:
         self.client = httpx.AsyncClient(headers=self.HEADERS)
         self.time = 0
         self.data = None
+        self.index: Optional[List[AbyssTeamIndex]] = None
         self.ttl = 10 * 60
 
     async def get_data(self) -> List[Dict[str, Dict]]:
@@ -30,8 +123,14 @@ class AbyssTeam:
             data = await self.client.get(self.TEAM_RATE_API)
             data_json = data.json()["data"]
             self.data = data_json
+            self.index = [AbyssTeamIndex(floor) for floor in data_json]
             self.time = time.time()
         return self.data.copy()
 
+    async def get_index(self, floor: int = 12) -> AbyssTeamIndex:
+        """获取某层的配队索引，数据更新时重新建立"""
+        await self.get_data()
+        return self.index[floor - 9]
+
     async def close(self):
         await self.client.aclose()
@@ -1,7 +1,12 @@
+from typing import Optional, TYPE_CHECKING
+
 from pydantic import BaseModel
 
 from modules.gacha.error import GachaIllegalArgument
 
+if TYPE_CHECKING:
+    from modules.gacha_log.models import PoolSummary
+
 
 class PlayerGachaBannerInfo(BaseModel):
     """玩家当前抽卡统计信息"""
@@ -18,6 +23,35 @@ class PlayerGachaBannerInfo(BaseModel):
     failed_featured_item_pulls: int = 0
     total_pulls: int = 0
 
+    @classmethod
+    def from_pool_summary(
+        cls,
+        summary: "PoolSummary",
+        guaranteed: Optional[bool] = None,
+        wish_item_id: int = 0,
+        pool_name: str = "角色祈愿",
+    ) -> "PlayerGachaBannerInfo":
+        """根据抽卡记录的统计结果得到当前的保底状态
+        :param summary: 卡池统计结果
+        :param guaranteed: 下一个五星是否为大保底，角色祈愿默认根据最近一次五星角色是否为 UP 判断；
+            统计结果不记录武器是否为 UP，武器祈愿必须显式给出
+        :param wish_item_id: 定轨的武器
+        :param pool_name: 统计结果所属的卡池
+        :raise GachaIllegalArgument: 武器祈愿未给出 guaranteed
+        """
+        if guaranteed is None:
+            if pool_name == "武器祈愿":
+                raise GachaIllegalArgument("武器祈愿无法从统计结果推断是否为大保底")
+            last = summary.five[-1] if summary.five else None
+            guaranteed = pool_name == "角色祈愿" and last is not None and not last.isUp
+        return cls(
+            pity5=summary.no_five_star,
+            pity4=summary.no_four_star,
+            failed_featured_item_pulls=int(guaranteed),
+            wish_item_id=wish_item_id,
+            total_pulls=summary.total,
+        )
+
     def inc_pity_all(self):
         self.pity5 += 1
         self.pity4 += 1
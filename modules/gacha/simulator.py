@@ -0,0 +1,207 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from modules.gacha.banner import GachaBanner
+from modules.gacha.error import GachaIllegalArgument
+from modules.gacha.player.banner import PlayerGachaBannerInfo
+from modules.gacha.pool import BannerPool
+from modules.gacha.system import BannerSystem
+
+__all__ = ("BannerSimulator", "GachaForecast")
+
+
+class GachaForecast(BaseModel):
+    """抽到指定数量物品所需抽数的分布"""
+
+    item_id: int
+    copies: int
+    rounds: int
+    max_pulls: int
+    success_rate: float
+    """在 max_pulls 抽内达成的概率"""
+    mean: Optional[float] = None
+    """平均抽数，存在未达成的模拟时为 None"""
+    percentiles: Dict[int, Optional[int]] = {}
+    """百分位对应的抽数，超过 max_pulls 时为 None"""
+
+
+class BannerSimulator:
+    """向量化的五星抽卡模拟
+
+    与 BannerSystem 使用相同的保底权重、UP 概率、定轨与常驻池平衡规则，
+    但所有模拟轮次以 NumPy 数组同时推进。五星是否出现只与五星保底计数有关，
+    因此两次五星之间的抽数直接从权重推出的分布中采样，每次迭代处理一次五星，
+    不需要逐抽模拟。
+    """
+
+    rounds: int = 100000
+    """默认的模拟轮数"""
+    percentiles: Tuple[int, ...] = (10, 25, 50, 75, 90, 99)
+    """结果中给出的百分位"""
+    max_pity: int = 100
+    """保底计数分布表的长度，超出部分的概率可以忽略"""
+    roll_cutoff: int = 10000
+    """与 BannerSystem.draw_roulette 的 cutoff 一致"""
+
+    def __init__(self, banner: GachaBanner, seed: Optional[int] = None):
+        self.banner = banner
+        self.pools = BannerPool(banner)
+        self.rng = np.random.default_rng(seed)
+        pity = range(self.max_pity + 1)
+        weights = np.array([banner.get_weight(5, i) for i in pity], dtype=np.float64)
+        # 每抽的随机数在 [0, cutoff] 中均匀分布，小于五星权重时出五星
+        hazard = np.minimum(weights, self.roll_cutoff + 1) / (self.roll_cutoff + 1)
+        hazard[0] = 0
+        self._neg_survival = -np.cumprod(1 - hazard)
+        balance_size = max(banner.pool_balance_weights5[-1][0], 1) + 1
+        self._pool_balance = np.array([banner.get_pool_balance_weight(5, i) for i in range(balance_size)])
+        self._featured = np.array(self.pools.rate_up_items5, dtype=np.int64)
+        self._fallback1 = np.array(self.pools.fallback_items5_pool1, dtype=np.int64)
+        self._fallback2 = np.array(self.pools.fallback_items5_pool2, dtype=np.int64)
+        self._fallback_default = np.array(BannerSystem.fallback_items5_pool2_default, dtype=np.int64)
+
+    def sample_next_pity(self, pity: np.ndarray) -> np.ndarray:
+        """按照当前保底计数采样出下一个五星时的保底计数"""
+        threshold = self._neg_survival[pity] * (1 - self.rng.random(pity.size))
+        return np.minimum(np.searchsorted(self._neg_survival, threshold, side="right"), self.max_pity)
+
+    def choice(self, items: np.ndarray, size: int) -> np.ndarray:
+        return items[self.rng.integers(0, items.size, size)]
+
+    def roulette(self, first: np.ndarray, second: np.ndarray) -> np.ndarray:
+        """与 BannerSystem.draw_roulette 相同的二选一，返回是否选中第二项"""
+        total = first + second
+        roll = self.rng.integers(0, np.minimum(total, self.roll_cutoff) + 1)
+        return (roll >= first) & (roll < total)
+
+    def fallback_pull(self, pity_pool1: np.ndarray, pity_pool2: np.ndarray) -> np.ndarray:
+        """非 UP 五星，会重置被选中的常驻池计数"""
+        size = pity_pool1.size
+        if not self._fallback1.size:
+            return self.choice(self._fallback2 if self._fallback2.size else self._fallback_default, size)
+        if not self._fallback2.size:
+            return self.choice(self._fallback1, size)
+        last = self._pool_balance.size - 1
+        weight1 = self._pool_balance[np.minimum(pity_pool1, last)]
+        weight2 = self._pool_balance[np.minimum(pity_pool2, last)]
+        pool1_first = weight1 >= weight2
+        second = self.roulette(np.where(pool1_first, weight1, weight2), np.where(pool1_first, weight2, weight1))
+        chosen_pool1 = pool1_first != second
+        pity_pool1[chosen_pool1] = 0
+        pity_pool2[~chosen_pool1] = 0
+        return np.where(chosen_pool1, self.choice(self._fallback1, size), self.choice(self._fallback2, size))
+
+    def rare_pull(
+        self,
+        failed_featured: np.ndarray,
+        failed_chosen: np.ndarray,
+        pity_pool1: np.ndarray,
+        pity_pool2: np.ndarray,
+        wish_item_id: int,
+    ) -> np.ndarray:
+        """向量化的 BannerSystem.do_rare_pull，原地更新各计数"""
+        size = failed_featured.size
+        epitomized = self.banner.has_epitomized() and wish_item_id != 0
+        items = np.empty(size, dtype=np.int64)
+        if epitomized:
+            pity_epitomized = failed_chosen >= self.banner.wish_max_progress
+        else:
+            pity_epitomized = np.zeros(size, dtype=bool)
+        items[pity_epitomized] = wish_item_id
+        if self._featured.size:
+            roll_featured = self.rng.integers(1, 101, size) <= self.banner.get_event_chance(5)
+            featured = ~pity_epitomized & ((failed_featured >= 1) | roll_featured)
+            items[featured] = self.choice(self._featured, np.count_nonzero(featured))
+        else:
+            featured = np.zeros(size, dtype=bool)
+        fallback = ~(pity_epitomized | featured)
+        failed_featured[fallback] += 1
+        failed_featured[~fallback] = 0
+        if fallback.any():
+            pool1, pool2 = pity_pool1[fallback], pity_pool2[fallback]
+            items[fallback] = self.fallback_pull(pool1, pool2)
+            pity_pool1[fallback], pity_pool2[fallback] = pool1, pool2
+        if epitomized:
+            chosen = items == wish_item_id
+            failed_chosen[chosen] = 0
+            failed_chosen[~chosen] += 1
+        return items
+
+    def check_item(self, item_id: int, wish_item_id: int):
+        items = {wish_item_id} if self.banner.has_epitomized() and wish_item_id else set()
+        items.update(self._featured.tolist(), self._fallback1.tolist(), self._fallback2.tolist())
+        if not self._fallback1.size and not self._fallback2.size:
+            items.update(self._fallback_default.tolist())
+        if item_id not in items:
+            raise GachaIllegalArgument(f"item_id[{item_id}] is not a five star item of this banner")
+
+    def simulate(
+        self,
+        gacha_info: PlayerGachaBannerInfo,
+        item_id: int,
+        copies: int = 1,
+        max_pulls: int = 1000,
+        rounds: Optional[int] = None,
+    ) -> np.ndarray:
+        """模拟抽到 copies 个 item_id 所需的抽数
+        :param gacha_info: 当前的保底与定轨状态
+        :param item_id: 目标五星物品
+        :param copies: 需要的数量
+        :param max_pulls: 最多模拟的抽数
+        :param rounds: 模拟轮数
+        :return: 每轮所需的抽数，未能在 max_pulls 抽内达成的记为 max_pulls + 1
+        """
+        if copies < 1 or max_pulls < 1:
+            raise GachaIllegalArgument
+        self.check_item(item_id, gacha_info.wish_item_id)
+        rounds = rounds or self.rounds
+        result = np.full(rounds, max_pulls + 1, dtype=np.int64)
+        index = np.arange(rounds)
+        start_pity = min(max(gacha_info.pity5, 0), self.max_pity - 1)
+        pity = np.full(rounds, start_pity, dtype=np.int64)
+        pulls = np.zeros(rounds, dtype=np.int64)
+        got = np.zeros(rounds, dtype=np.int64)
+        failed_featured = np.full(rounds, gacha_info.failed_featured_item_pulls, dtype=np.int64)
+        failed_chosen = np.full(rounds, gacha_info.failed_chosen_item_pulls, dtype=np.int64)
+        pity_pool1 = np.full(rounds, gacha_info.pity5_pool1, dtype=np.int64)
+        pity_pool2 = np.full(rounds, gacha_info.pity5_pool2, dtype=np.int64)
+        while index.size:
+            gap = self.sample_next_pity(pity) - pity
+            pulls += gap
+            pity_pool1 += gap
+            pity_pool2 += gap
+            items = self.rare_pull(failed_featured, failed_chosen, pity_pool1, pity_pool2, gacha_info.wish_item_id)
+            got += items == item_id
+            finished = got >= copies
+            reached = finished & (pulls <= max_pulls)
+            result[index[reached]] = pulls[reached]
+            keep = ~finished & (pulls < max_pulls)
+            index, pulls, got = index[keep], pulls[keep], got[keep]
+            failed_featured, failed_chosen = failed_featured[keep], failed_chosen[keep]
+            pity_pool1, pity_pool2 = pity_pool1[keep], pity_pool2[keep]
+            pity = np.zeros(index.size, dtype=np.int64)
+        return result
+
+    def forecast(
+        self,
+        gacha_info: PlayerGachaBannerInfo,
+        item_id: int,
+        copies: int = 1,
+        max_pulls: int = 1000,
+        rounds: Optional[int] = None,
+    ) -> GachaForecast:
+        """预测抽到 copies 个 item_id 所需抽数的分布"""
+        pulls = self.simulate(gacha_info, item_id, copies, max_pulls, rounds)
+        reached = pulls <= max_pulls
+        values = np.percentile(pulls, self.percentiles, method="higher")
+        return GachaForecast(
+            item_id=item_id,
+            copies=copies,
+            rounds=pulls.size,
+            max_pulls=max_pulls,
+            success_rate=float(np.count_nonzero(reached) / pulls.size),
+            mean=float(pulls.mean()) if reached.all() else None,
+            percentiles={p: (int(v) if v <= max_pulls else None) for p, v in zip(self.percentiles, values)},
+        )
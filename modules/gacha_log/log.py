@@ -1,11 +1,15 @@
 import asyncio
 import contextlib
 import datetime
+import heapq
+import itertools
 import json
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from os import PathLike
 from pathlib import Path
-from typing import Dict, IO, List, Optional, Tuple, Union, TYPE_CHECKING
+from typing import Any, Dict, IO, Iterable, List, Optional, Set, Tuple, Union, TYPE_CHECKING
 
 import aiofiles
 from openpyxl import load_workbook
@@ -14,7 +18,7 @@ from simnet.errors import AuthkeyTimeout, InvalidAuthkey
 from simnet.models.genshin.wish import BannerType
 from simnet.utils.player import recognize_genshin_server
 
-from metadata.pool.pool import get_pool_by_id
+from metadata.pool.pool import get_pool_index
 from metadata.shortname import roleToId, weaponToId
 from modules.gacha_log.const import GACHA_TYPE_LIST, PAIMONMOE_VERSION
 from modules.gacha_log.error import (
@@ -32,14 +36,18 @@ from modules.gacha_log.models import (
     FourStarItem,
     GachaItem,
     GachaLogInfo,
+    GachaLogSummary,
     ImportType,
     ItemType,
     Pool,
+    PoolSummary,
+    SummaryItem,
     UIGFGachaType,
     UIGFInfo,
     UIGFItem,
     UIGFModel,
 )
+from modules.gacha_log.storage import BinaryGachaLogStorage, GachaLogStorage
 from utils.const import PROJECT_ROOT
 from utils.uid import mask_number
 
@@ -52,8 +60,28 @@ GACHA_LOG_PATH.mkdir(parents=True, exist_ok=True)
 
 
 class GachaLog:
-    def __init__(self, gacha_log_path: Path = GACHA_LOG_PATH):
+    cache_size: int = 256
+    """内存中缓存的统计与分析结果数量"""
+
+    _icon_uris: Dict[Tuple[str, str], str] = {}
+    """(物品类型, 物品名称) -> 图标 URI"""
+
+    def __init__(self, gacha_log_path: Path = GACHA_LOG_PATH, storage: Optional[GachaLogStorage] = None):
         self.gacha_log_path = gacha_log_path
+        self.storage = storage or BinaryGachaLogStorage(gacha_log_path)
+        self._cache: "OrderedDict[Tuple, Tuple[str, Any]]" = OrderedDict()
+
+    def _get_cache(self, key: Tuple, version: str) -> Optional[Any]:
+        if (value := self._cache.get(key)) is None or value[0] != version:
+            return None
+        self._cache.move_to_end(key)
+        return value[1]
+
+    def _set_cache(self, key: Tuple, version: str, value: Any):
+        self._cache[key] = (version, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
 
     @staticmethod
     async def load_json(path):
@@ -76,15 +104,12 @@ class GachaLog:
         :param only_status: 是否只读取状态
         :return: 抽卡记录数据
         """
-        file_path = self.gacha_log_path / f"{user_id}-{uid}.json"
         if only_status:
-            return None, file_path.exists()
-        if not file_path.exists():
-            return GachaLogInfo(user_id=user_id, uid=uid, update_time=datetime.datetime.now()), False
-        try:
-            return GachaLogInfo.parse_obj(await self.load_json(file_path)), True
-        except json.decoder.JSONDecodeError:
+            return None, self.storage.exists(user_id, uid)
+        info = await self.storage.load(user_id, uid)
+        if info is None:
             return GachaLogInfo(user_id=user_id, uid=uid, update_time=datetime.datetime.now()), False
+        return info, True
 
     async def remove_history_info(self, user_id: str, uid: str) -> bool:
         """删除历史抽卡记录数据
@@ -92,37 +117,75 @@ class GachaLog:
         :param uid: 原神uid
         :return: 是否删除成功
         """
-        file_path = self.gacha_log_path / f"{user_id}-{uid}.json"
-        file_bak_path = self.gacha_log_path / f"{user_id}-{uid}.json.bak"
         file_export_path = self.gacha_log_path / f"{user_id}-{uid}-uigf.json"
-        with contextlib.suppress(Exception):
-            file_bak_path.unlink(missing_ok=True)
         with contextlib.suppress(Exception):
             file_export_path.unlink(missing_ok=True)
-        if file_path.exists():
-            try:
-                file_path.unlink()
-            except PermissionError:
-                return False
-            return True
-        return False
+        with contextlib.suppress(Exception):
+            self.get_summary_path(user_id, uid).unlink(missing_ok=True)
+        return await self.storage.remove(user_id, uid)
 
-    async def save_gacha_log_info(self, user_id: str, uid: str, info: GachaLogInfo):
+    async def save_gacha_log_info(
+        self, user_id: str, uid: str, info: GachaLogInfo, new_items: Optional[List[GachaItem]] = None
+    ):
         """保存抽卡记录数据
         :param user_id: 用户id
         :param uid: 玩家uid
         :param info: 抽卡记录数据
+        :param new_items: 本次新增的记录，传入时只追加新增的部分
         """
-        save_path = self.gacha_log_path / f"{user_id}-{uid}.json"
-        save_path_bak = self.gacha_log_path / f"{user_id}-{uid}.json.bak"
-        # 将旧数据备份一次
-        with contextlib.suppress(PermissionError):
-            if save_path.exists():
-                if save_path_bak.exists():
-                    save_path_bak.unlink()
-                save_path.rename(save_path.parent / f"{save_path.name}.bak")
-        # 写入数据
-        await self.save_json(save_path, info.json())
+        if new_items is None:
+            await self.storage.save(user_id, uid, info)
+        else:
+            await self.storage.append(user_id, uid, info, new_items)
+
+    def get_summary_path(self, user_id: str, uid: str) -> Path:
+        return self.gacha_log_path / f"{user_id}-{uid}-analysis.json"
+
+    async def load_summary(self, user_id: str, uid: str) -> Optional[GachaLogSummary]:
+        """读取统计缓存，不检查缓存是否过期，返回的对象与内存中的缓存相互独立，可以直接修改"""
+        if (cached := self._cache.get(("summary", user_id, uid))) is not None:
+            return cached[1].copy(deep=True)
+        file_path = self.get_summary_path(user_id, uid)
+        if not file_path.exists():
+            return None
+        try:
+            return GachaLogSummary.parse_obj(await self.load_json(file_path))
+        except (json.decoder.JSONDecodeError, ValueError):
+            return None
+
+    async def update_summary(self, user_id: str, uid: str, gacha_log: GachaLogInfo) -> GachaLogSummary:
+        """根据抽卡记录更新统计缓存，只会统计上次统计后新增在末尾的记录
+        :param user_id: 用户id
+        :param uid: 原神uid
+        :param gacha_log: 已保存的抽卡记录
+        :return: 统计缓存
+        """
+        summary = await self.load_summary(user_id, uid) or GachaLogSummary()
+        summary.update(gacha_log)
+        summary.version = self.storage.version(user_id, uid) or ""
+        await self.save_json(self.get_summary_path(user_id, uid), summary.json(ensure_ascii=False))
+        self._set_cache(("summary", user_id, uid), summary.version, summary)
+        return summary
+
+    async def get_summary(self, user_id: str, uid: str) -> GachaLogSummary:
+        """获取最新的统计缓存，抽卡记录更新后会先更新缓存
+        :param user_id: 用户id
+        :param uid: 原神uid
+        :return: 统计缓存
+        """
+        version = self.storage.version(user_id, uid)
+        if version is None:
+            raise GachaLogNotFound
+        if (summary := self._get_cache(("summary", user_id, uid), version)) is not None:
+            return summary
+        summary = await self.load_summary(user_id, uid)
+        if summary is not None and summary.version == version:
+            self._set_cache(("summary", user_id, uid), version, summary)
+            return summary
+        gacha_log, status = await self.load_history_info(user_id, uid)
+        if not status:
+            raise GachaLogNotFound
+        return await self.update_summary(user_id, uid, gacha_log)
 
     async def gacha_log_to_uigf(self, user_id: str, uid: str) -> Optional[Path]:
         """抽卡日记转换为 UIGF 格式
@@ -168,18 +231,41 @@ class GachaLog:
             raise GachaLogFileError from exc
 
     @staticmethod
-    def import_data_backend(all_items: List[GachaItem], gacha_log: GachaLogInfo, temp_id_data: Dict) -> int:
-        new_num = 0
+    def get_temp_id_data(gacha_log: GachaLogInfo) -> Dict[str, Set[str]]:
+        """将每个卡池的唯一 id 放入集合中，加快查找速度"""
+        return {pool_name: {i.id for i in pool_data} for pool_name, pool_data in gacha_log.item_list.items()}
+
+    @staticmethod
+    def merge_items(items: List[GachaItem], new_items: List[GachaItem]) -> List[GachaItem]:
+        """将新的记录合并进已按 (time, id) 排序的记录中，只对新增的部分进行排序
+        :param items: 已排序的记录
+        :param new_items: 新增的记录
+        :return: 合并后的记录
+        """
+        if not new_items:
+            return items
+        new_items.sort(key=lambda x: (x.time, x.id))
+        if not items or (items[-1].time, items[-1].id) <= (new_items[0].time, new_items[0].id):
+            items.extend(new_items)
+            return items
+        return list(heapq.merge(items, new_items, key=lambda x: (x.time, x.id)))
+
+    @staticmethod
+    def import_data_backend(
+        all_items: List[GachaItem], gacha_log: GachaLogInfo, temp_id_data: Dict[str, Set[str]]
+    ) -> List[GachaItem]:
+        """将新记录合并进抽卡记录中，返回新增的记录"""
+        new_item_list: Dict[str, List[GachaItem]] = {pool_name: [] for pool_name in gacha_log.item_list}
         for item_info in all_items:
             pool_name = GACHA_TYPE_LIST[BannerType(int(item_info.gacha_type))]
             if item_info.id not in temp_id_data[pool_name]:
-                gacha_log.item_list[pool_name].append(item_info)
-                temp_id_data[pool_name].append(item_info.id)
-                new_num += 1
-        return new_num
+                new_item_list[pool_name].append(item_info)
+                temp_id_data[pool_name].add(item_info.id)
+        for pool_name, new_items in new_item_list.items():
+            gacha_log.item_list[pool_name] = GachaLog.merge_items(gacha_log.item_list[pool_name], new_items)
+        return [item for new_items in new_item_list.values() for item in new_items]
 
     async def import_gacha_log_data(self, user_id: int, player_id: int, data: dict, verify_uid: bool = True) -> int:
-        new_num = 0
         try:
             uid = data["info"]["uid"]
             if not verify_uid:
@@ -200,24 +286,22 @@ class GachaLog:
             elif status and gacha_log.get_import_type == ImportType.PAIMONMOE:
                 raise GachaLogMixedProvider
             # 将唯一 id 放入临时数据中，加快查找速度
-            temp_id_data = {
-                pool_name: [i.id for i in pool_data] for pool_name, pool_data in gacha_log.item_list.items()
-            }
+            temp_id_data = self.get_temp_id_data(gacha_log)
             # 使用新线程进行遍历，避免堵塞主线程
             loop = asyncio.get_event_loop()
             # 可以使用with语句来确保线程执行完成后及时被清理
             with ThreadPoolExecutor() as executor:
-                new_num = await loop.run_in_executor(
+                new_items = await loop.run_in_executor(
                     executor, self.import_data_backend, all_items, gacha_log, temp_id_data
                 )
             for i in gacha_log.item_list.values():
                 # 检查导入后的数据是否合法
                 await self.verify_data(i)
-                i.sort(key=lambda x: (x.time, x.id))
             gacha_log.update_time = datetime.datetime.now()
             gacha_log.import_type = import_type.value
-            await self.save_gacha_log_info(str(user_id), uid, gacha_log)
-            return new_num
+            await self.save_gacha_log_info(str(user_id), uid, gacha_log, new_items if status else None)
+            await self.update_summary(str(user_id), str(uid), gacha_log)
+            return len(new_items)
         except GachaLogAccountNotFound as e:
             raise GachaLogAccountNotFound("导入失败，文件包含的祈愿记录所属 uid 与你当前绑定的 uid 不同") from e
         except GachaLogMixedProvider as e:
@@ -239,15 +323,20 @@ class GachaLog:
         :return: 更新结果
         """
         new_num = 0
-        gacha_log, _ = await self.load_history_info(str(user_id), str(player_id))
+        gacha_log, status = await self.load_history_info(str(user_id), str(player_id))
         if gacha_log.get_import_type == ImportType.PAIMONMOE:
             raise GachaLogMixedProvider
         # 将唯一 id 放入临时数据中，加快查找速度
-        temp_id_data = {pool_name: [i.id for i in pool_data] for pool_name, pool_data in gacha_log.item_list.items()}
+        temp_id_data = self.get_temp_id_data(gacha_log)
+        new_item_list: Dict[str, List[GachaItem]] = {pool_name: [] for pool_name in gacha_log.item_list}
         client = self.get_game_client(player_id)
         try:
             for pool_id, pool_name in GACHA_TYPE_LIST.items():
-                wish_history = await client.wish_history(pool_id.value, authkey=authkey)
+                # 遇到已经记录过的最新一条记录时停止翻页
+                end_id = next(
+                    (i.id for i in reversed(gacha_log.item_list[pool_name]) if i.gacha_type == str(pool_id.value)), 0
+                )
+                wish_history = await client.wish_history(pool_id.value, authkey=authkey, end_id=end_id)
                 for data in wish_history:
                     item = GachaItem(
                         id=str(data.id),
@@ -266,8 +355,8 @@ class GachaLog:
                     )
 
                     if item.id not in temp_id_data[pool_name]:
-                        gacha_log.item_list[pool_name].append(item)
-                        temp_id_data[pool_name].append(item.id)
+                        new_item_list[pool_name].append(item)
+                        temp_id_data[pool_name].add(item.id)
                         new_num += 1
         except AuthkeyTimeout as exc:
             raise GachaLogAuthkeyTimeout from exc
@@ -275,102 +364,67 @@ class GachaLog:
             raise GachaLogInvalidAuthkey from exc
         finally:
             await client.shutdown()
-        for i in gacha_log.item_list.values():
-            i.sort(key=lambda x: (x.time, x.id))
+        for pool_name, new_items in new_item_list.items():
+            gacha_log.item_list[pool_name] = self.merge_items(gacha_log.item_list[pool_name], new_items)
         gacha_log.update_time = datetime.datetime.now()
         gacha_log.import_type = ImportType.UIGF.value
-        await self.save_gacha_log_info(str(user_id), str(player_id), gacha_log)
+        new_items = [item for new_items in new_item_list.values() for item in new_items]
+        await self.save_gacha_log_info(str(user_id), str(player_id), gacha_log, new_items if status else None)
+        await self.update_summary(str(user_id), str(player_id), gacha_log)
         return new_num
 
-    @staticmethod
-    def check_avatar_up(name: str, gacha_time: datetime.datetime) -> bool:
-        if name in {"莫娜", "七七", "迪卢克", "琴", "迪希雅"}:
-            return False
-        if name == "刻晴":
-            start_time = datetime.datetime.strptime("2021-02-17 18:00:00", "%Y-%m-%d %H:%M:%S")
-            end_time = datetime.datetime.strptime("2021-03-02 15:59:59", "%Y-%m-%d %H:%M:%S")
-            if not start_time < gacha_time < end_time:
-                return False
-        elif name == "提纳里":
-            start_time = datetime.datetime.strptime("2022-08-24 06:00:00", "%Y-%m-%d %H:%M:%S")
-            end_time = datetime.datetime.strptime("2022-09-09 17:59:59", "%Y-%m-%d %H:%M:%S")
-            if not start_time < gacha_time < end_time:
-                return False
-        return True
-
-    async def get_all_5_star_items(self, data: List[GachaItem], assets: "AssetsService", pool_name: str = "角色祈愿"):
+    check_avatar_up = staticmethod(PoolSummary.check_avatar_up)
+
+    @classmethod
+    async def get_icons(cls, assets: "AssetsService", items: Iterable[SummaryItem]) -> Dict[Tuple[str, str], str]:
+        """批量获取物品图标的 URI，结果在进程内缓存
+        :param assets: 资源服务
+        :param items: 物品
+        :return: (物品类型, 物品名称) -> 图标 URI
+        """
+        icons = cls._icon_uris
+        misses = {(item.type, item.name) for item in items} - icons.keys()
+        if misses:
+            avatars = {roleToId(name): (item_type, name) for item_type, name in misses if item_type == "角色"}
+            weapons = {weaponToId(name): (item_type, name) for item_type, name in misses if item_type != "角色"}
+            avatar_paths, weapon_paths = await asyncio.gather(
+                assets.avatar.prefetch(avatars), assets.weapon.prefetch(weapons)
+            )
+            for keys, paths in ((avatars, avatar_paths), (weapons, weapon_paths)):
+                for (target, _), path in paths.items():
+                    if path is not None:
+                        icons[keys[target]] = path.as_uri()
+        return icons
+
+    async def get_all_5_star_items(self, pool_summary: PoolSummary, assets: "AssetsService") -> List[FiveStarItem]:
         """
         获取所有5星角色
-        :param data: 抽卡记录
+        :param pool_summary: 卡池统计结果
         :param assets: 资源服务
-        :param pool_name: 池子名称
-        :return: 5星角色列表
+        :return: 5星角色列表，最新的在前
         """
-        count = 0
+        icons = await self.get_icons(assets, pool_summary.five)
         result = []
-        for item in data:
-            count += 1
-            if item.rank_type == "5":
-                if item.item_type == "角色" and pool_name in {"角色祈愿", "常驻祈愿"}:
-                    data = {
-                        "name": item.name,
-                        "icon": (await assets.avatar(roleToId(item.name)).icon()).as_uri(),
-                        "count": count,
-                        "type": "角色",
-                        "isUp": self.check_avatar_up(item.name, item.time) if pool_name == "角色祈愿" else False,
-                        "isBig": (not result[-1].isUp) if result and pool_name == "角色祈愿" else False,
-                        "time": item.time,
-                    }
-                    result.append(FiveStarItem.construct(**data))
-                elif item.item_type == "武器" and pool_name in {"武器祈愿", "常驻祈愿"}:
-                    data = {
-                        "name": item.name,
-                        "icon": (await assets.weapon(weaponToId(item.name)).icon()).as_uri(),
-                        "count": count,
-                        "type": "武器",
-                        "isUp": False,
-                        "isBig": False,
-                        "time": item.time,
-                    }
-                    result.append(FiveStarItem.construct(**data))
-                count = 0
-        result.reverse()
-        return result, count
+        for item in reversed(pool_summary.five):
+            data = item.__dict__.copy()
+            data["icon"] = icons.get((item.type, item.name), "")
+            result.append(FiveStarItem.construct(**data))
+        return result
 
-    @staticmethod
-    async def get_all_4_star_items(data: List[GachaItem], assets: "AssetsService"):
+    async def get_all_4_star_items(self, pool_summary: PoolSummary, assets: "AssetsService") -> List[FourStarItem]:
         """
-        获取 no_fout_star
-        :param data: 抽卡记录
+        获取所有4星角色与武器
+        :param pool_summary: 卡池统计结果
         :param assets: 资源服务
-        :return: no_fout_star
+        :return: 4星列表，最新的在前
         """
-        count = 0
+        icons = await self.get_icons(assets, pool_summary.four)
         result = []
-        for item in data:
-            count += 1
-            if item.rank_type == "4":
-                if item.item_type == "角色":
-                    data = {
-                        "name": item.name,
-                        "icon": (await assets.avatar(roleToId(item.name)).icon()).as_uri(),
-                        "count": count,
-                        "type": "角色",
-                        "time": item.time,
-                    }
-                    result.append(FourStarItem.construct(**data))
-                elif item.item_type == "武器":
-                    data = {
-                        "name": item.name,
-                        "icon": (await assets.weapon(weaponToId(item.name)).icon()).as_uri(),
-                        "count": count,
-                        "type": "武器",
-                        "time": item.time,
-                    }
-                    result.append(FourStarItem.construct(**data))
-                count = 0
-        result.reverse()
-        return result, count
+        for item in reversed(pool_summary.four):
+            data = {k: v for k, v in item.__dict__.items() if k not in ("isUp", "isBig")}
+            data["icon"] = icons.get((item.type, item.name), "")
+            result.append(FourStarItem.construct(**data))
+        return result
 
     @staticmethod
     def get_301_pool_data(total: int, all_five: List[FiveStarItem], no_five_star: int, no_four_star: int):
@@ -497,6 +551,13 @@ class GachaLog:
                     return f"{pool_name} · 非"
         return pool_name
 
+    async def get_pool_summary(self, user_id: int, player_id: int, pool_name: str) -> Tuple[str, PoolSummary]:
+        summary = await self.get_summary(str(user_id), str(player_id))
+        pool_summary = summary.pools.get(pool_name)
+        if pool_summary is None or pool_summary.total == 0:
+            raise GachaLogNotFound
+        return summary.version, pool_summary
+
     async def get_analysis(self, user_id: int, player_id: int, pool: BannerType, assets: "AssetsService"):
         """
         获取抽卡记录分析数据
@@ -506,16 +567,15 @@ class GachaLog:
         :param assets: 资源服务
         :return: 分析数据
         """
-        gacha_log, status = await self.load_history_info(str(user_id), str(player_id))
-        if not status:
-            raise GachaLogNotFound
         pool_name = GACHA_TYPE_LIST[pool]
-        data = gacha_log.item_list[pool_name]
-        total = len(data)
-        if total == 0:
-            raise GachaLogNotFound
-        all_five, no_five_star = await self.get_all_5_star_items(data, assets, pool_name)
-        all_four, no_four_star = await self.get_all_4_star_items(data, assets)
+        version, pool_summary = await self.get_pool_summary(user_id, player_id, pool_name)
+        cache_key = ("analysis", user_id, player_id, pool)
+        if (result := self._get_cache(cache_key, version)) is not None:
+            return deepcopy(result)
+        total = pool_summary.total
+        no_five_star, no_four_star = pool_summary.no_five_star, pool_summary.no_four_star
+        all_five = await self.get_all_5_star_items(pool_summary, assets)
+        all_four = await self.get_all_4_star_items(pool_summary, assets)
         summon_data = None
         if pool == BannerType.CHARACTER1:
             summon_data = self.get_301_pool_data(total, all_five, no_five_star, no_four_star)
@@ -526,9 +586,9 @@ class GachaLog:
         elif pool == BannerType.PERMANENT:
             summon_data = self.get_200_pool_data(total, all_five, all_four, no_five_star, no_four_star)
             pool_name = self.count_fortune(pool_name, summon_data)
-        last_time = data[0].time.strftime("%Y-%m-%d %H:%M")
-        first_time = data[-1].time.strftime("%Y-%m-%d %H:%M")
-        return {
+        last_time = pool_summary.first_time.strftime("%Y-%m-%d %H:%M")
+        first_time = pool_summary.last_time.strftime("%Y-%m-%d %H:%M")
+        result = {
             "uid": mask_number(player_id),
             "allNum": total,
             "type": pool.value,
@@ -539,6 +599,8 @@ class GachaLog:
             "fiveLog": all_five,
             "fourLog": all_four[:36],
         }
+        self._set_cache(cache_key, version, result)
+        return deepcopy(result)
 
     async def get_pool_analysis(
         self, user_id: int, player_id: int, pool: BannerType, assets: "AssetsService", group: bool
@@ -551,24 +613,26 @@ class GachaLog:
         :param group: 是否群组
         :return: 分析数据
         """
+        pool_name = GACHA_TYPE_LIST[pool]
+        version, pool_summary = await self.get_pool_summary(user_id, player_id, pool_name)
+        cache_key = ("pool_analysis", user_id, player_id, pool, group)
+        if (result := self._get_cache(cache_key, version)) is not None:
+            return deepcopy(result)
         gacha_log, status = await self.load_history_info(str(user_id), str(player_id))
         if not status:
             raise GachaLogNotFound
-        pool_name = GACHA_TYPE_LIST[pool]
         data = gacha_log.item_list[pool_name]
-        total = len(data)
-        if total == 0:
-            raise GachaLogNotFound
-        all_five, _ = await self.get_all_5_star_items(data, assets, pool_name)
-        all_four, _ = await self.get_all_4_star_items(data, assets)
+        all_five = await self.get_all_5_star_items(pool_summary, assets)
+        all_four = await self.get_all_4_star_items(pool_summary, assets)
         pool_data = []
-        up_pool_data = [Pool(**i) for i in get_pool_by_id(pool.value)]
-        for up_pool in up_pool_data:
-            for item in all_five:
-                up_pool.parse(item)
-            for item in all_four:
-                up_pool.parse(item)
-            up_pool.count_item(data)
+        pool_index = get_pool_index(pool.value)
+        up_pool_data = [Pool(**i) for i in pool_index.pools]
+        for item in itertools.chain(all_five, all_four):
+            for idx in pool_index.find(item.time):
+                up_pool_data[idx].parse(item)
+        for item in data:
+            for idx in pool_index.find(item.time):
+                up_pool_data[idx].count_time(item.time)
         for up_pool in up_pool_data:
             pool_data.append(
                 {
@@ -580,12 +644,14 @@ class GachaLog:
                 }
             )
         pool_data = [i for i in pool_data if i["count"] > 0]
-        return {
+        result = {
             "uid": player_id,
             "typeName": pool_name,
             "pool": pool_data[:6] if group else pool_data,
             "hasMore": len(pool_data) > 6,
         }
+        self._set_cache(cache_key, version, result)
+        return deepcopy(result)
 
     async def get_all_five_analysis(self, user_id: int, player_id: int, assets: "AssetsService") -> dict:
         """获取五星抽卡记录分析数据
@@ -594,11 +660,12 @@ class GachaLog:
         :param assets: 资源服务
         :return: 分析数据
         """
-        gacha_log, status = await self.load_history_info(str(user_id), str(player_id))
-        if not status:
-            raise GachaLogNotFound
+        summary = await self.get_summary(str(user_id), str(player_id))
+        cache_key = ("all_five_analysis", user_id, player_id)
+        if (result := self._get_cache(cache_key, summary.version)) is not None:
+            return deepcopy(result)
         pools = []
-        for pool_name, items in gacha_log.item_list.items():
+        for pool_name, pool_summary in summary.pools.items():
             pool = Pool(
                 five=[pool_name],
                 four=[],
@@ -606,10 +673,12 @@ class GachaLog:
                 to=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 **{"from": "2020-09-28 00:00:00"},
             )
-            all_five, _ = await self.get_all_5_star_items(items, assets, pool_name)
-            for item in all_five:
+            for item in await self.get_all_5_star_items(pool_summary, assets):
                 pool.parse(item)
-            pool.count_item(items)
+            # 统计范围包含了所有记录，直接使用统计结果
+            if pool_summary.total:
+                pool.count = pool_summary.total
+                pool.start, pool.end = pool_summary.first_time, pool_summary.last_time
             pools.append(pool)
         pool_data = [
             {
@@ -621,12 +690,14 @@ class GachaLog:
             }
             for up_pool in pools
         ]
-        return {
+        result = {
             "uid": player_id,
             "typeName": "五星列表",
             "pool": pool_data,
             "hasMore": False,
         }
+        self._set_cache(cache_key, summary.version, result)
+        return deepcopy(result)
 
     @staticmethod
     def convert_xlsx_to_uigf(file: Union[str, PathLike, IO[bytes]], zh_dict: Dict) -> Dict:
@@ -1,12 +1,16 @@
 import datetime
 from enum import Enum
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Optional, Union
 
 from pydantic import BaseModel, validator
 
+from metadata.pool.pool import get_pool_index
 from metadata.shortname import not_real_roles, roleToId, weaponToId
 from modules.gacha_log.const import UIGF_VERSION
 
+STANDARD_AVATARS = {"莫娜", "七七", "迪卢克", "琴", "刻晴", "提纳里", "迪希雅"}
+"""常驻五星角色，在 UP 卡池之外出现时不计为 UP"""
+
 
 class ImportType(Enum):
     PaiGram = "PaiGram"
@@ -88,6 +92,94 @@ class GachaLogInfo(BaseModel):
             return ImportType.UNKNOWN
 
 
+class SummaryItem(BaseModel):
+    name: str
+    type: str
+    count: int
+    isUp: bool = False
+    isBig: bool = False
+    time: datetime.datetime
+
+
+class PoolSummary(BaseModel):
+    """单个卡池的统计结果，按时间顺序保存五星与四星记录以及保底计数"""
+
+    total: int = 0
+    first_time: Optional[datetime.datetime] = None
+    last_time: Optional[datetime.datetime] = None
+    last_id: str = ""
+    five: List[SummaryItem] = []
+    four: List[SummaryItem] = []
+    no_five_star: int = 0
+    no_four_star: int = 0
+
+    @staticmethod
+    def check_avatar_up(name: str, gacha_time: datetime.datetime) -> bool:
+        if name in get_pool_index(301).get_up_five(gacha_time):
+            return True
+        # 限定角色只会在 UP 卡池中出现，查询不到时通常是国际服与卡池数据的时区差异导致的
+        return name not in STANDARD_AVATARS
+
+    def is_prefix_of(self, items: List[GachaItem]) -> bool:
+        """已统计的记录是否仍为卡池记录的前缀，即新增的记录都在末尾"""
+        return self.total == 0 or (len(items) >= self.total and items[self.total - 1].id == self.last_id)
+
+    def add(self, pool_name: str, item: GachaItem):
+        """统计一条新记录，记录需要按时间顺序加入"""
+        self.no_five_star += 1
+        self.no_four_star += 1
+        if item.rank_type == "5":
+            if item.item_type == "角色" and pool_name in {"角色祈愿", "常驻祈愿"}:
+                self.five.append(
+                    SummaryItem(
+                        name=item.name,
+                        type="角色",
+                        count=self.no_five_star,
+                        isUp=self.check_avatar_up(item.name, item.time) if pool_name == "角色祈愿" else False,
+                        isBig=(not self.five[-1].isUp) if self.five and pool_name == "角色祈愿" else False,
+                        time=item.time,
+                    )
+                )
+            elif item.item_type == "武器" and pool_name in {"武器祈愿", "常驻祈愿"}:
+                self.five.append(SummaryItem(name=item.name, type="武器", count=self.no_five_star, time=item.time))
+            self.no_five_star = 0
+        elif item.rank_type == "4":
+            if item.item_type in {"角色", "武器"}:
+                self.four.append(
+                    SummaryItem(name=item.name, type=item.item_type, count=self.no_four_star, time=item.time)
+                )
+            self.no_four_star = 0
+        if self.first_time is None:
+            self.first_time = item.time
+        self.last_time = item.time
+        self.last_id = item.id
+        self.total += 1
+
+
+class GachaLogSummary(BaseModel):
+    """抽卡记录的统计缓存
+
+    ``version`` 为统计时抽卡记录文件的版本，记录文件发生变化后统计结果需要更新
+    """
+
+    version: str = ""
+    pools: Dict[str, PoolSummary] = {}
+
+    def update(self, gacha_log: GachaLogInfo) -> List[str]:
+        """更新所有卡池的统计结果，只统计新增在末尾的记录
+        :return: 需要重新统计的卡池名称
+        """
+        rebuild = []
+        for pool_name, items in gacha_log.item_list.items():
+            pool = self.pools.get(pool_name)
+            if pool is None or not pool.is_prefix_of(items):
+                pool = self.pools[pool_name] = PoolSummary()
+                rebuild.append(pool_name)
+            for item in items[pool.total :]:
+                pool.add(pool_name, item)
+        return rebuild
+
+
 class Pool:
     def __init__(self, five: List[str], four: List[str], name: str, to: str, **kwargs):
         self.five = five
@@ -119,11 +211,15 @@ class Pool:
     def count_item(self, item: List[GachaItem]):
         for i in item:
             if self.from_time <= i.time <= self.to_time:
-                self.count += 1
-                if not self.start_init:
-                    self.start = i.time
-                    self.start_init = True
-                self.end = i.time
+                self.count_time(i.time)
+
+    def count_time(self, time: datetime.datetime):
+        """统计一条卡池开放时间内的记录，记录需要按时间顺序加入"""
+        self.count += 1
+        if not self.start_init:
+            self.start = time
+            self.start_init = True
+        self.end = time
 
     def to_list(self):
         return list(self.dict.values())
@@ -0,0 +1,272 @@
+"""抽卡记录的存储后端"""
+
+import asyncio
+import contextlib
+import datetime
+import json
+import struct
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import aiofiles
+
+from modules.gacha_log.const import GACHA_TYPE_LIST
+from modules.gacha_log.models import GachaItem, GachaLogInfo
+from utils.record_file import RecordFile, RecordFileError, StringTable
+
+__all__ = ("GachaLogStorage", "JsonGachaLogStorage", "BinaryGachaLogStorage", "migrate")
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_ITEM_TYPES = ("角色", "武器")
+_ITEM_TYPE_INDEX = {name: idx for idx, name in enumerate(_ITEM_TYPES)}
+_GACHA_ITEM_FIELDS = frozenset(GachaItem.__fields__)
+
+
+def _new_gacha_item(values: dict) -> GachaItem:
+    """与 ``GachaItem.construct`` 相同，但省去了默认值的处理，所有字段都必须给出"""
+    item = GachaItem.__new__(GachaItem)
+    object.__setattr__(item, "__dict__", values)
+    object.__setattr__(item, "__fields_set__", set(_GACHA_ITEM_FIELDS))
+    return item
+
+
+class GachaLogStorage(ABC):
+    """抽卡记录存储后端"""
+
+    suffix: str = ""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def get_file_path(self, user_id: str, uid: str) -> Path:
+        return self.path / f"{user_id}-{uid}{self.suffix}"
+
+    def exists(self, user_id: str, uid: str) -> bool:
+        return self.get_file_path(user_id, uid).exists()
+
+    def version(self, user_id: str, uid: str) -> Optional[str]:
+        """抽卡记录文件的版本，每次写入后都会变化，文件不存在时返回 None"""
+        try:
+            stat = self.get_file_path(user_id, uid).stat()
+        except FileNotFoundError:
+            return None
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+    @abstractmethod
+    async def load(self, user_id: str, uid: str) -> Optional[GachaLogInfo]:
+        """读取抽卡记录，文件不存在时返回 None，文件损坏时的处理由具体的后端决定"""
+
+    @abstractmethod
+    async def save(self, user_id: str, uid: str, info: GachaLogInfo) -> None:
+        """保存完整的抽卡记录"""
+
+    async def append(self, user_id: str, uid: str, info: GachaLogInfo, new_items: List[GachaItem]) -> None:
+        """保存新增的抽卡记录，默认重写整个文件
+        :param user_id: 用户id
+        :param uid: 原神uid
+        :param info: 合并后的完整抽卡记录
+        :param new_items: 本次新增的记录
+        """
+        await self.save(user_id, uid, info)
+
+    async def remove(self, user_id: str, uid: str) -> bool:
+        file_path = self.get_file_path(user_id, uid)
+        if file_path.exists():
+            try:
+                file_path.unlink()
+            except PermissionError:
+                return False
+            return True
+        return False
+
+
+class JsonGachaLogStorage(GachaLogStorage):
+    """JSON 格式，每次保存都会重写整个文件并保留一份 .bak 备份"""
+
+    suffix = ".json"
+
+    async def load(self, user_id: str, uid: str) -> Optional[GachaLogInfo]:
+        file_path = self.get_file_path(user_id, uid)
+        if not file_path.exists():
+            return None
+        try:
+            async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
+                return GachaLogInfo.parse_obj(json.loads(await f.read()))
+        except json.decoder.JSONDecodeError:
+            return None
+
+    async def save(self, user_id: str, uid: str, info: GachaLogInfo) -> None:
+        save_path = self.get_file_path(user_id, uid)
+        save_path_bak = save_path.with_name(f"{save_path.name}.bak")
+        # 将旧数据备份一次
+        with contextlib.suppress(PermissionError):
+            if save_path.exists():
+                if save_path_bak.exists():
+                    save_path_bak.unlink()
+                save_path.rename(save_path_bak)
+        # 写入数据
+        async with aiofiles.open(save_path, "w", encoding="utf-8") as f:
+            await f.write(info.json())
+
+    async def remove(self, user_id: str, uid: str) -> bool:
+        file_path = self.get_file_path(user_id, uid)
+        with contextlib.suppress(Exception):
+            file_path.with_name(f"{file_path.name}.bak").unlink(missing_ok=True)
+        return await super().remove(user_id, uid)
+
+
+class BinaryGachaLogStorage(GachaLogStorage):
+    """定长记录格式
+
+    每条记录占用 24 字节：id(u64) time(i64) gacha_type(u16) rank_type(u8) item_type(u8) name(u32)，
+    名称保存在共享的字符串表中。新增记录直接追加到文件末尾，读取时不经过 pydantic 校验。
+
+    旧的 JSON 文件仍可读取，并会在下一次保存时转换为该格式。
+    含有无法用 u64 表示的 id 的记录（部分第三方导出）会继续以 JSON 格式保存。
+    """
+
+    suffix = ".bin"
+    format_version = 1
+    file = RecordFile(struct.Struct("<4sB15sqqd"), struct.Struct("<QqHBBI"), b"PGGL")
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self.legacy = JsonGachaLogStorage(path)
+
+    def exists(self, user_id: str, uid: str) -> bool:
+        return super().exists(user_id, uid) or self.legacy.exists(user_id, uid)
+
+    def version(self, user_id: str, uid: str) -> Optional[str]:
+        return super().version(user_id, uid) or self.legacy.version(user_id, uid)
+
+    @staticmethod
+    def is_supported(items: Iterable[GachaItem]) -> bool:
+        return all(i.id.isdigit() and len(i.id) <= 19 and not i.id.startswith("0") for i in items)
+
+    @staticmethod
+    def _header(user_id: str, uid: str, info: GachaLogInfo) -> tuple:
+        import_type = info.import_type.encode("utf-8")[:15]
+        return BinaryGachaLogStorage.format_version, import_type, int(user_id), int(uid), info.update_time.timestamp()
+
+    @staticmethod
+    def _rows(items: Iterable[GachaItem], table: StringTable) -> Iterable[tuple]:
+        for i in items:
+            yield (
+                int(i.id),
+                int((i.time - _EPOCH).total_seconds()),
+                int(i.gacha_type),
+                int(i.rank_type),
+                _ITEM_TYPE_INDEX[i.item_type],
+                table.intern(i.name),
+            )
+
+    def _read(self, file_path: Path) -> GachaLogInfo:
+        # 避免循环导入
+        from modules.gacha_log.log import GachaLog  # pylint: disable=C0415
+
+        (_, import_type, user_id, uid, update_time), table, blocks = self.file.read(file_path)
+        item_list: Dict[str, List[GachaItem]] = {"角色祈愿": [], "武器祈愿": [], "常驻祈愿": [], "新手祈愿": []}
+        pool_names = {i.value: name for i, name in GACHA_TYPE_LIST.items()}
+        timedelta = datetime.timedelta
+        for block in blocks:
+            new_items: Dict[str, List[GachaItem]] = {pool_name: [] for pool_name in item_list}
+            for _id, _time, gacha_type, rank_type, item_type, name in block:
+                new_items[pool_names.get(gacha_type, "新手祈愿")].append(
+                    _new_gacha_item(
+                        {
+                            "id": str(_id),
+                            "name": table[name],
+                            "gacha_type": str(gacha_type),
+                            "item_type": _ITEM_TYPES[item_type],
+                            "rank_type": str(rank_type),
+                            "time": _EPOCH + timedelta(seconds=_time),
+                        }
+                    )
+                )
+            for pool_name, items in new_items.items():
+                item_list[pool_name] = GachaLog.merge_items(item_list[pool_name], items)
+        return GachaLogInfo.construct(
+            user_id=str(user_id),
+            uid=str(uid),
+            update_time=datetime.datetime.fromtimestamp(update_time),
+            import_type=import_type.rstrip(b"\x00").decode("utf-8"),
+            item_list=item_list,
+        )
+
+    def _write(self, file_path: Path, user_id: str, uid: str, info: GachaLogInfo) -> None:
+        table = StringTable()
+        rows = self._rows((item for items in info.item_list.values() for item in items), table)
+        self.file.write(file_path, self._header(user_id, uid, info), table, list(rows))
+
+    def _append(self, file_path: Path, user_id: str, uid: str, info: GachaLogInfo, new_items: List[GachaItem]):
+        table, end = self.file.read_strings(file_path)
+        rows = list(self._rows(sorted(new_items, key=lambda x: (x.time, x.id)), table))
+        self.file.append(file_path, self._header(user_id, uid, info), table, rows, end)
+
+    async def load(self, user_id: str, uid: str) -> Optional[GachaLogInfo]:
+        file_path = self.get_file_path(user_id, uid)
+        if not file_path.exists():
+            return await self.legacy.load(user_id, uid)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, self._read, file_path)
+        except (RecordFileError, UnicodeDecodeError, IndexError) as exc:
+            # 文件损坏时不能返回 None，否则调用方会以为没有记录而覆盖原有的文件
+            if not await loop.run_in_executor(None, self.file.restore, file_path):
+                raise RecordFileError(f"抽卡记录文件 {file_path.name} 已损坏且无法从备份恢复") from exc
+        return await loop.run_in_executor(None, self._read, file_path)
+
+    async def save(self, user_id: str, uid: str, info: GachaLogInfo) -> None:
+        if not self.is_supported(item for items in info.item_list.values() for item in items):
+            await self.legacy.save(user_id, uid, info)
+            with contextlib.suppress(FileNotFoundError):
+                self.get_file_path(user_id, uid).unlink()
+            return
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._write, self.get_file_path(user_id, uid), user_id, uid, info
+        )
+        legacy_path = self.legacy.get_file_path(user_id, uid)
+        if legacy_path.exists():
+            # 转换完成后将旧文件保留为备份
+            with contextlib.suppress(PermissionError):
+                legacy_path.replace(legacy_path.with_name(f"{legacy_path.name}.bak"))
+
+    async def append(self, user_id: str, uid: str, info: GachaLogInfo, new_items: List[GachaItem]) -> None:
+        file_path = self.get_file_path(user_id, uid)
+        if not file_path.exists() or not self.is_supported(new_items):
+            await self.save(user_id, uid, info)
+            return
+        await asyncio.get_running_loop().run_in_executor(None, self._append, file_path, user_id, uid, info, new_items)
+
+    async def remove(self, user_id: str, uid: str) -> bool:
+        legacy = await self.legacy.remove(user_id, uid)
+        file_path = self.get_file_path(user_id, uid)
+        with contextlib.suppress(Exception):
+            file_path.with_name(f"{file_path.name}.bak").unlink(missing_ok=True)
+        return await super().remove(user_id, uid) or legacy
+
+
+async def migrate(path: Path) -> int:
+    """将目录下所有 JSON 格式的抽卡记录转换为定长记录格式
+    :param path: 抽卡记录目录
+    :return: 转换的文件数量
+    """
+    storage = BinaryGachaLogStorage(path)
+    count = 0
+    for file_path in path.glob("*-*.json"):
+        user_id, _, uid = file_path.stem.partition("-")
+        if not (user_id.isdigit() and uid.isdigit()):
+            continue
+        info = await storage.legacy.load(user_id, uid)
+        if info is None:
+            continue
+        await storage.save(user_id, uid, info)
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    from modules.gacha_log.log import GACHA_LOG_PATH
+
+    print(f"已转换 {asyncio.run(migrate(GACHA_LOG_PATH))} 个抽卡记录文件")
@@ -10,6 +10,7 @@ from simnet.utils.player import recognize_genshin_server
 
 from modules.pay_log.error import PayLogAuthkeyTimeout, PayLogInvalidAuthkey, PayLogNotFound
 from modules.pay_log.models import PayLog as PayLogModel, BaseInfo
+from modules.pay_log.storage import BinaryPayLogStorage, PayLogStorage
 from utils.const import PROJECT_ROOT
 from utils.uid import mask_number
 
@@ -25,8 +26,9 @@ PAY_LOG_PATH.mkdir(parents=True, exist_ok=True)
 
 
 class PayLog:
-    def __init__(self, pay_log_path: Path = PAY_LOG_PATH):
+    def __init__(self, pay_log_path: Path = PAY_LOG_PATH, storage: Optional[PayLogStorage] = None):
         self.pay_log_path = pay_log_path
+        self.storage = storage or BinaryPayLogStorage(pay_log_path)
 
     @staticmethod
     async def load_json(path):
@@ -52,6 +54,14 @@ class PayLog:
         """
         return self.pay_log_path / f"{user_id}-{uid}.json{'.bak' if bak else ''}"
 
+    def get_export_file_path(self, user_id: str, uid: str) -> Path:
+        """获取导出文件路径
+        :param user_id: 用户 ID
+        :param uid: UID
+        :return: 文件路径
+        """
+        return self.pay_log_path / f"{user_id}-{uid}-export.json"
+
     async def load_history_info(
         self,
         user_id: str,
@@ -64,15 +74,12 @@ class PayLog:
         :param only_status: 是否只读取状态
         :return: 抽卡记录数据
         """
-        file_path = self.get_file_path(user_id, uid)
         if only_status:
-            return None, file_path.exists()
-        if not file_path.exists():
-            return PayLogModel(info=BaseInfo(uid=uid), list=[]), False
-        try:
-            return PayLogModel.parse_obj(await self.load_json(file_path)), True
-        except jsonlib.JSONDecodeError:
+            return None, self.storage.exists(user_id, uid)
+        info = await self.storage.load(user_id, uid)
+        if info is None:
             return PayLogModel(info=BaseInfo(uid=uid), list=[]), False
+        return info, True
 
     async def remove_history_info(
         self,
@@ -84,34 +91,36 @@ class PayLog:
         :param uid: 原神uid
         :return: 是否删除成功
         """
-        file_path = self.get_file_path(user_id, uid)
-        file_bak_path = self.get_file_path(user_id, uid, bak=True)
         with contextlib.suppress(Exception):
-            file_bak_path.unlink(missing_ok=True)
-        if file_path.exists():
-            try:
-                file_path.unlink()
-            except PermissionError:
-                return False
-            return True
-        return False
-
-    async def save_pay_log_info(self, user_id: str, uid: str, info: PayLogModel) -> None:
+            self.get_export_file_path(user_id, uid).unlink(missing_ok=True)
+        return await self.storage.remove(user_id, uid)
+
+    async def save_pay_log_info(
+        self, user_id: str, uid: str, info: PayLogModel, new_items: Optional[List[BaseTransaction]] = None
+    ) -> None:
         """保存日志记录数据
         :param user_id: 用户id
         :param uid: 原神uid
         :param info: 记录数据
+        :param new_items: 本次新增的记录，传入时只追加新增部分
         """
-        save_path = self.pay_log_path / f"{user_id}-{uid}.json"
-        save_path_bak = self.pay_log_path / f"{user_id}-{uid}.json.bak"
-        # 将旧数据备份一次
-        with contextlib.suppress(PermissionError):
-            if save_path.exists():
-                if save_path_bak.exists():
-                    save_path_bak.unlink()
-                save_path.rename(save_path.parent / f"{save_path.name}.bak")
-        # 写入数据
-        await self.save_json(save_path, info)
+        if new_items is None:
+            await self.storage.save(user_id, uid, info)
+        else:
+            await self.storage.append(user_id, uid, info, new_items)
+
+    async def export_pay_log(self, user_id: str, uid: str) -> Path:
+        """导出 JSON 格式的充值记录
+        :param user_id: 用户id
+        :param uid: 原神uid
+        :return: 导出文件路径
+        """
+        pay_log, status = await self.load_history_info(user_id, uid)
+        if not status:
+            raise PayLogNotFound
+        path = self.get_export_file_path(user_id, uid)
+        await self.save_json(path, pay_log)
+        return path
 
     @staticmethod
     def get_game_client(player_id: int) -> GenshinClient:
@@ -131,27 +140,28 @@ class PayLog:
         :param authkey: authkey
         :return: 更新结果
         """
-        new_num = 0
+        new_items: List[BaseTransaction] = []
         pay_log, have_old = await self.load_history_info(str(user_id), str(player_id))
-        history_ids = [i.id for i in pay_log.list]
+        history_ids = {i.id for i in pay_log.list}
         client = self.get_game_client(player_id)
         try:
             transaction_log = await client.transaction_log(authkey=authkey, kind=TransactionKind.CRYSTAL.value)
             for data in transaction_log:
                 if data.id not in history_ids:
-                    pay_log.list.append(data)
-                    new_num += 1
+                    history_ids.add(data.id)
+                    new_items.append(data)
         except AuthkeyTimeout as exc:
             raise PayLogAuthkeyTimeout from exc
         except InvalidAuthkey as exc:
             raise PayLogInvalidAuthkey from exc
         finally:
             await client.shutdown()
-        if new_num > 0 or have_old:
+        if new_items or have_old:
+            pay_log.list.extend(new_items)
             pay_log.list.sort(key=lambda x: (x.time, x.id), reverse=True)
             pay_log.info.update_now()
-            await self.save_pay_log_info(str(user_id), str(client.player_id), pay_log)
-        return new_num
+            await self.save_pay_log_info(str(user_id), str(client.player_id), pay_log, new_items if have_old else None)
+        return len(new_items)
 
     @staticmethod
     async def get_month_data(pay_log: PayLogModel, price_data: List[Dict]) -> Tuple[int, List[Dict]]:
@@ -0,0 +1,243 @@
+"""充值记录的存储后端"""
+
+import asyncio
+import contextlib
+import datetime
+import struct
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import aiofiles
+from simnet.models.genshin.transaction import BaseTransaction, TransactionKind
+
+from modules.pay_log.models import BaseInfo, PayLog as PayLogModel
+from utils.record_file import RecordFile, RecordFileError, StringTable
+
+try:
+    import ujson as jsonlib
+
+except ImportError:
+    import json as jsonlib
+
+__all__ = ("PayLogStorage", "JsonPayLogStorage", "BinaryPayLogStorage", "migrate")
+
+_KINDS = list(TransactionKind)
+_KIND_INDEX = {kind: idx for idx, kind in enumerate(_KINDS)}
+
+
+class PayLogStorage(ABC):
+    """充值记录存储后端"""
+
+    suffix: str = ""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def get_file_path(self, user_id: str, uid: str) -> Path:
+        return self.path / f"{user_id}-{uid}{self.suffix}"
+
+    def exists(self, user_id: str, uid: str) -> bool:
+        return self.get_file_path(user_id, uid).exists()
+
+    @abstractmethod
+    async def load(self, user_id: str, uid: str) -> Optional[PayLogModel]:
+        """读取充值记录，文件不存在时返回 None，文件损坏时的处理由具体的后端决定"""
+
+    @abstractmethod
+    async def save(self, user_id: str, uid: str, info: PayLogModel) -> None:
+        """保存完整的充值记录"""
+
+    async def append(self, user_id: str, uid: str, info: PayLogModel, new_items: List[BaseTransaction]) -> None:
+        """保存新增的充值记录，默认重写整个文件"""
+        await self.save(user_id, uid, info)
+
+    async def remove(self, user_id: str, uid: str) -> bool:
+        file_path = self.get_file_path(user_id, uid)
+        if file_path.exists():
+            try:
+                file_path.unlink()
+            except PermissionError:
+                return False
+            return True
+        return False
+
+
+class JsonPayLogStorage(PayLogStorage):
+    """JSON 格式，每次保存都会重写整个文件并保留一份 .bak 备份"""
+
+    suffix = ".json"
+
+    async def load(self, user_id: str, uid: str) -> Optional[PayLogModel]:
+        file_path = self.get_file_path(user_id, uid)
+        if not file_path.exists():
+            return None
+        try:
+            async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
+                return PayLogModel.parse_obj(jsonlib.loads(await f.read()))
+        except jsonlib.JSONDecodeError:
+            return None
+
+    async def save(self, user_id: str, uid: str, info: PayLogModel) -> None:
+        save_path = self.get_file_path(user_id, uid)
+        save_path_bak = save_path.with_name(f"{save_path.name}.bak")
+        # 将旧数据备份一次
+        with contextlib.suppress(PermissionError):
+            if save_path.exists():
+                if save_path_bak.exists():
+                    save_path_bak.unlink()
+                save_path.rename(save_path_bak)
+        # 写入数据
+        async with aiofiles.open(save_path, "w", encoding="utf-8") as f:
+            await f.write(info.json(ensure_ascii=False, indent=4, by_alias=True))
+
+    async def remove(self, user_id: str, uid: str) -> bool:
+        file_path = self.get_file_path(user_id, uid)
+        with contextlib.suppress(Exception):
+            file_path.with_name(f"{file_path.name}.bak").unlink(missing_ok=True)
+        return await super().remove(user_id, uid)
+
+
+class BinaryPayLogStorage(PayLogStorage):
+    """定长记录格式
+
+    每条记录占用 27 字节：id(i64) time(i64) utc_offset(i16) amount(i32) reason(u32) kind(u8)，
+    原因保存在共享的字符串表中。新增记录直接追加到文件末尾，读取时不经过 pydantic 校验。
+
+    旧的 JSON 文件仍可读取，并会在下一次保存时转换为该格式。
+    """
+
+    suffix = ".bin"
+    format_version = 1
+    file = RecordFile(struct.Struct("<4sBq8s16sq"), struct.Struct("<qqhiIB"), b"PGPL")
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self.legacy = JsonPayLogStorage(path)
+
+    def exists(self, user_id: str, uid: str) -> bool:
+        return super().exists(user_id, uid) or self.legacy.exists(user_id, uid)
+
+    @staticmethod
+    def _header(info: PayLogModel) -> tuple:
+        return (
+            BinaryPayLogStorage.format_version,
+            int(info.info.uid),
+            info.info.lang.encode("utf-8")[:8],
+            info.info.export_app.encode("utf-8")[:16],
+            info.info.export_timestamp,
+        )
+
+    @staticmethod
+    def _rows(items: Iterable[BaseTransaction], table: StringTable) -> Iterable[tuple]:
+        for i in items:
+            offset = i.time.utcoffset()
+            yield (
+                i.id,
+                int(i.time.timestamp()),
+                int(offset.total_seconds() // 60) if offset is not None else 0,
+                i.amount,
+                table.intern(i.reason),
+                _KIND_INDEX[i.kind],
+            )
+
+    def _read(self, file_path: Path) -> PayLogModel:
+        (_, uid, lang, export_app, export_timestamp), table, blocks = self.file.read(file_path)
+        construct = BaseTransaction.construct
+        timezones = {}
+        items = []
+        for block in blocks:
+            for _id, _time, offset, amount, reason, kind in block:
+                tz = timezones.get(offset)
+                if tz is None:
+                    tz = timezones[offset] = datetime.timezone(datetime.timedelta(minutes=offset))
+                items.append(
+                    construct(
+                        kind=_KINDS[kind],
+                        id=_id,
+                        time=datetime.datetime.fromtimestamp(_time, tz),
+                        amount=amount,
+                        reason=table[reason],
+                    )
+                )
+        if len(blocks) > 1:
+            items.sort(key=lambda x: (x.time, x.id), reverse=True)
+        info = BaseInfo(
+            uid=str(uid),
+            lang=lang.rstrip(b"\x00").decode("utf-8"),
+            export_time=datetime.datetime.fromtimestamp(export_timestamp).strftime("%Y-%m-%d %H:%M:%S"),
+            export_timestamp=export_timestamp,
+            export_app=export_app.rstrip(b"\x00").decode("utf-8"),
+        )
+        return PayLogModel.construct(info=info, list=items)
+
+    def _write(self, file_path: Path, info: PayLogModel) -> None:
+        table = StringTable()
+        rows = list(self._rows(info.list, table))
+        self.file.write(file_path, self._header(info), table, rows)
+
+    def _append(self, file_path: Path, info: PayLogModel, new_items: List[BaseTransaction]) -> None:
+        table, end = self.file.read_strings(file_path)
+        rows = list(self._rows(new_items, table))
+        self.file.append(file_path, self._header(info), table, rows, end)
+
+    async def load(self, user_id: str, uid: str) -> Optional[PayLogModel]:
+        file_path = self.get_file_path(user_id, uid)
+        if not file_path.exists():
+            return await self.legacy.load(user_id, uid)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, self._read, file_path)
+        except (RecordFileError, UnicodeDecodeError, IndexError) as exc:
+            # 文件损坏时不能返回 None，否则调用方会以为没有记录而覆盖原有的文件
+            if not await loop.run_in_executor(None, self.file.restore, file_path):
+                raise RecordFileError(f"充值记录文件 {file_path.name} 已损坏且无法从备份恢复") from exc
+        return await loop.run_in_executor(None, self._read, file_path)
+
+    async def save(self, user_id: str, uid: str, info: PayLogModel) -> None:
+        file_path = self.get_file_path(user_id, uid)
+        await asyncio.get_running_loop().run_in_executor(None, self._write, file_path, info)
+        legacy_path = self.legacy.get_file_path(user_id, uid)
+        if legacy_path.exists():
+            # 转换完成后将旧文件保留为备份
+            with contextlib.suppress(PermissionError):
+                legacy_path.replace(legacy_path.with_name(f"{legacy_path.name}.bak"))
+
+    async def append(self, user_id: str, uid: str, info: PayLogModel, new_items: List[BaseTransaction]) -> None:
+        file_path = self.get_file_path(user_id, uid)
+        if not file_path.exists():
+            await self.save(user_id, uid, info)
+            return
+        await asyncio.get_running_loop().run_in_executor(None, self._append, file_path, info, new_items)
+
+    async def remove(self, user_id: str, uid: str) -> bool:
+        legacy = await self.legacy.remove(user_id, uid)
+        file_path = self.get_file_path(user_id, uid)
+        with contextlib.suppress(Exception):
+            file_path.with_name(f"{file_path.name}.bak").unlink(missing_ok=True)
+        return await super().remove(user_id, uid) or legacy
+
+
+async def migrate(path: Path) -> int:
+    """将目录下所有 JSON 格式的充值记录转换为定长记录格式
+    :param path: 充值记录目录
+    :return: 转换的文件数量
+    """
+    storage = BinaryPayLogStorage(path)
+    count = 0
+    for file_path in path.glob("*-*.json"):
+        user_id, _, uid = file_path.stem.partition("-")
+        if not (user_id.isdigit() and uid.isdigit()):
+            continue
+        info = await storage.legacy.load(user_id, uid)
+        if info is None:
+            continue
+        await storage.save(user_id, uid, info)
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    from modules.pay_log.log import PAY_LOG_PATH
+
+    print(f"已转换 {asyncio.run(migrate(PAY_LOG_PATH))} 个充值记录文件")
@@ -1,4 +1,7 @@
 import asyncio
+import gzip
+import weakref
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional, Dict, Union
 
@@ -17,27 +20,91 @@ PLAYER_CARDS_PATH.mkdir(parents=True, exist_ok=True)
 
 
 class PlayerCardsFile:
-    _lock = asyncio.Lock()
+    """角色卡片的历史数据
 
-    def __init__(self, player_cards_path: Path = PLAYER_CARDS_PATH):
+    每个 UID 使用独立的锁，最近合并或读取过的数据以 JSON 文本的形式保存在内存中，避免每次查询都读取文件，
+    每次读取都会重新解析，调用方可以任意修改得到的数据而不影响缓存。
+    """
+
+    cache_size: int = 256
+    """内存中缓存的 UID 数量"""
+
+    _locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def __init__(self, player_cards_path: Path = PLAYER_CARDS_PATH, compress: bool = False):
+        """
+        :param player_cards_path: 数据目录
+        :param compress: 是否使用 gzip 压缩保存的数据
+        """
         self.player_cards_path = player_cards_path
+        self.compress = compress
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
 
     @staticmethod
-    async def load_json(path):
+    async def read_text(path: Path) -> str:
+        if path.suffix == ".gz":
+            async with aiofiles.open(path, "rb") as f:
+                raw = await f.read()
+            return (await asyncio.get_running_loop().run_in_executor(None, gzip.decompress, raw)).decode("utf-8")
         async with aiofiles.open(path, "r", encoding="utf-8") as f:
-            return jsonlib.loads(await f.read())
+            return await f.read()
 
     @staticmethod
-    async def save_json(path, data: Dict):
+    async def write_text(path: Path, text: str):
+        if path.suffix == ".gz":
+            raw = await asyncio.get_running_loop().run_in_executor(None, gzip.compress, text.encode("utf-8"))
+            async with aiofiles.open(path, "wb") as f:
+                return await f.write(raw)
         async with aiofiles.open(path, "w", encoding="utf-8") as f:
-            return await f.write(jsonlib.dumps(data, ensure_ascii=False, indent=4))
+            return await f.write(text)
+
+    @classmethod
+    async def load_json(cls, path: Path):
+        return jsonlib.loads(await cls.read_text(path))
 
-    def get_file_path(self, uid: Union[str, int]):
+    @classmethod
+    async def save_json(cls, path: Path, data: Dict):
+        return await cls.write_text(path, jsonlib.dumps(data, ensure_ascii=False))
+
+    def get_file_path(self, uid: Union[str, int], compress: Optional[bool] = None) -> Path:
         """获取文件路径
         :param uid: UID
+        :param compress: 是否为压缩格式，默认与当前的保存格式一致
         :return: 文件路径
         """
-        return self.player_cards_path / f"{uid}.json"
+        if compress is None:
+            compress = self.compress
+        return self.player_cards_path / (f"{uid}.json.gz" if compress else f"{uid}.json")
+
+    def get_lock(self, uid: Union[str, int]) -> asyncio.Lock:
+        uid = str(uid)
+        if (lock := self._locks.get(uid)) is None:
+            lock = self._locks[uid] = asyncio.Lock()
+        return lock
+
+    def _get_cache(self, uid: str) -> Optional[str]:
+        if (text := self._cache.get(uid)) is not None:
+            self._cache.move_to_end(uid)
+        return text
+
+    def _set_cache(self, uid: str, text: str):
+        self._cache[uid] = text
+        self._cache.move_to_end(uid)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _load(self, uid: str) -> Optional[Dict]:
+        for file_path in (self.get_file_path(uid), self.get_file_path(uid, not self.compress)):
+            if not file_path.exists():
+                continue
+            try:
+                text = await self.read_text(file_path)
+                data = jsonlib.loads(text)
+            except (jsonlib.JSONDecodeError, OSError, EOFError, UnicodeDecodeError):
+                return None
+            self._set_cache(uid, text)
+            return data
+        return None
 
     async def load_history_info(
         self,
@@ -47,28 +114,29 @@ class PlayerCardsFile:
         :param uid: uid
         :return: 角色历史记录数据
         """
-        file_path = self.get_file_path(uid)
-        if not file_path.exists():
-            return None
-        try:
-            return await self.load_json(file_path)
-        except jsonlib.JSONDecodeError:
-            return None
+        uid = str(uid)
+        if (text := self._get_cache(uid)) is not None:
+            return jsonlib.loads(text)
+        return await self._load(uid)
 
     async def merge_info(
         self,
         uid: Union[str, int],
         data: Dict,
     ) -> Dict:
-        async with self._lock:
+        uid = str(uid)
+        async with self.get_lock(uid):
             old_data = await self.load_history_info(uid)
-            if old_data is None:
-                await self.save_json(self.get_file_path(uid), data)
-                return data
-            data["avatarInfoList"] = data.get("avatarInfoList", [])
-            characters = [i.get("avatarId", 0) for i in data["avatarInfoList"]]
-            for i in old_data.get("avatarInfoList", []):
-                if i.get("avatarId", 0) not in characters:
-                    data["avatarInfoList"].append(i)
-            await self.save_json(self.get_file_path(uid), data)
+            if old_data is not None:
+                data["avatarInfoList"] = data.get("avatarInfoList", [])
+                characters = {i.get("avatarId", 0) for i in data["avatarInfoList"]}
+                for i in old_data.get("avatarInfoList", []):
+                    if i.get("avatarId", 0) not in characters:
+                        data["avatarInfoList"].append(i)
+            text = jsonlib.dumps(data, ensure_ascii=False)
+            await self.write_text(self.get_file_path(uid), text)
+            legacy_path = self.get_file_path(uid, not self.compress)
+            if legacy_path.exists():
+                legacy_path.unlink()
+            self._set_cache(uid, text)
             return data
@@ -1,18 +1,22 @@
 import asyncio
+import hashlib
+import random
 import re
 from abc import abstractmethod
 from asyncio import Queue
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import Value
 from ssl import SSLZeroReturnError
-from typing import AsyncIterator, ClassVar, List, Optional, Tuple, Union
+from typing import AsyncIterator, ClassVar, Dict, List, Optional, Tuple, Union
 
 import anyio
 from bs4 import BeautifulSoup
-from httpx import URL, AsyncClient, HTTPError, Response
+from httpx import URL, AsyncClient, HTTPError, Limits, Response
 from pydantic import BaseConfig as PydanticBaseConfig
 from pydantic import BaseModel as PydanticBaseModel
 
 from utils.log import logger
+from utils.models.rate_limit import TokenBucket
 
 try:
     import ujson as jsonlib
@@ -22,6 +26,7 @@ except ImportError:
 __all__ = ["Model", "WikiModel", "HONEY_HOST"]
 
 HONEY_HOST = URL("https://genshin.honeyhunterworld.com/")
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
 
 
 class Model(PydanticBaseModel):
@@ -47,9 +52,21 @@ class WikiModel(Model):
         name (:obj:`str`): 名称
         rarity (:obj:`int`): 星级
 
-        _client (:class:`httpx.AsyncClient`): 发起 http 请求的 client
+        _client (:class:`httpx.AsyncClient`): 发起 http 请求的 client，所有 Model 共用同一个连接池
     """
-    _client: ClassVar[AsyncClient] = AsyncClient()
+    _client: ClassVar[AsyncClient] = AsyncClient(
+        limits=Limits(max_connections=16, max_keepalive_connections=16), timeout=30
+    )
+    _rate_limiter: ClassVar[TokenBucket] = TokenBucket(rate=8)
+    """对 HONEY_HOST 的请求速率限制（每秒请求数）"""
+    _semaphore: ClassVar[Optional[asyncio.Semaphore]] = None
+    _executor: ClassVar[ThreadPoolExecutor] = ThreadPoolExecutor(max_workers=2, thread_name_prefix="wiki")
+    """解析页面所用的线程池，避免解析大页面时阻塞事件循环"""
+
+    scrape_concurrency: ClassVar[int] = 8
+    """同时进行的请求数量"""
+    max_backoff: ClassVar[float] = 30
+    """重试前等待时间的上限（秒）"""
 
     id: str
     name: str
@@ -69,30 +86,44 @@ class WikiModel(Model):
 
         """
 
+    @classmethod
+    def _get_semaphore(cls) -> asyncio.Semaphore:
+        if WikiModel._semaphore is None:
+            WikiModel._semaphore = asyncio.Semaphore(cls.scrape_concurrency)
+        return WikiModel._semaphore
+
     @classmethod
     async def _client_get(cls, url: Union[URL, str], retry_times: int = 5, sleep: float = 1) -> Response:
         """用自己的 client 发起 get 请求的快捷函数
 
+        同时进行的请求数量与请求速率均受到限制，请求出错或服务器繁忙时按照指数退避重试。
+
         Args:
             url: 发起请求的 url
             retry_times: 发生错误时的重复次数。不能小于 0 .
-            sleep: 发生错误后等待重试的时间，单位为秒。
+            sleep: 第一次重试前等待的时间，单位为秒，之后每次翻倍。
         Returns:
             返回对应的请求
         Raises:
             请求所需要的异常
         """
-        for _ in range(retry_times):
+        for attempt in range(retry_times + 1):
             try:
-                return await cls._client.get(url, follow_redirects=True)
+                async with cls._get_semaphore():
+                    await cls._rate_limiter.acquire()
+                    response = await cls._client.get(url, follow_redirects=True)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == retry_times:
+                    return response
+                logger.debug("请求 %s 返回 %s ，准备重试", url, response.status_code)
             except (HTTPError, SSLZeroReturnError):
-                await anyio.sleep(sleep)
-        return await cls._client.get(url, follow_redirects=True)  # 防止 retry_times 等于 0 的时候无法发生请求
+                if attempt == retry_times:
+                    raise
+            await anyio.sleep(min(sleep * 2**attempt, cls.max_backoff) * random.uniform(0.5, 1))  # nosec
 
     @classmethod
     @abstractmethod
-    async def _parse_soup(cls, soup: BeautifulSoup) -> "WikiModel":
-        """解析 soup 生成对应 WikiModel
+    def _parse_soup(cls, soup: BeautifulSoup) -> "WikiModel":
+        """解析 soup 生成对应 WikiModel，在线程池中执行
 
         Args:
             soup: 需要解析的 soup
@@ -110,7 +141,11 @@ class WikiModel(Model):
             返回对应的 WikiModel
         """
         response = await cls._client_get(url)
-        return await cls._parse_soup(BeautifulSoup(response.text, "lxml"))
+        return await asyncio.get_running_loop().run_in_executor(cls._executor, cls._parse_html, response.text)
+
+    @classmethod
+    def _parse_html(cls, text: str) -> "WikiModel":
+        return cls._parse_soup(BeautifulSoup(text, "lxml"))
 
     @classmethod
     async def get_by_id(cls, id_: str) -> "WikiModel":
@@ -123,6 +158,17 @@ class WikiModel(Model):
         """
         return await cls._scrape(await cls.get_url_by_id(id_))
 
+    @classmethod
+    async def get_by_url(cls, url: Union[URL, str]) -> "WikiModel":
+        """通过详情页的 url 获取Model
+
+        Args:
+            url: 目标 url
+        Returns:
+            返回对应的 WikiModel
+        """
+        return await cls._scrape(url)
+
     @classmethod
     async def get_by_name(cls, name: str) -> Optional["WikiModel"]:
         """通过名称获取Model
@@ -193,6 +239,32 @@ class WikiModel(Model):
         """
         return HONEY_HOST.join(f"{id_}/?lang=CHS")
 
+    @classmethod
+    async def _get_list_page(cls, page: URL) -> List[Tuple[str, URL, list]]:
+        """解析一个列表页
+
+        Args:
+            page: 列表页的 url
+        Returns:
+            返回页面中每个 Model 的 名称、url 与列表中的原始数据
+        """
+        response = await cls._client_get(page)
+        return await asyncio.get_running_loop().run_in_executor(cls._executor, cls._parse_list_page, response.text)
+
+    @staticmethod
+    def _parse_list_page(text: str) -> List[Tuple[str, URL, list]]:
+        # 从页面中获取对应的 chaos data (未处理的json格式字符串)
+        chaos_data = re.findall(r"sortable_data\.push\((.*?)\);\s*sortable_cur_page", text)[0]
+        json_data = jsonlib.loads(chaos_data)  # 转为 json
+        return [
+            (
+                re.findall(r">(.*)<", data[1])[0].strip(),  # 获取 Model 的名称
+                HONEY_HOST.join(re.findall(r"\"(.*?)\"", data[0])[0]),
+                data,
+            )
+            for data in json_data
+        ]
+
     @classmethod
     async def _name_list_generator(cls, *, with_url: bool = False) -> AsyncIterator[Union[str, Tuple[str, URL]]]:
         """一个 Model 的名称 和 其对应 url 的异步生成器
@@ -208,17 +280,8 @@ class WikiModel(Model):
 
         async def task(page: URL):
             """包装的爬虫任务"""
-            response = await cls._client_get(page)
-            # 从页面中获取对应的 chaos data (未处理的json格式字符串)
-            chaos_data = re.findall(r"sortable_data\.push\((.*?)\);\s*sortable_cur_page", response.text)[0]
-            json_data = jsonlib.loads(chaos_data)  # 转为 json
-            for data in json_data:  # 遍历 json
-                data_name = re.findall(r">(.*)<", data[1])[0].strip()  # 获取 Model 的名称
-                if with_url:  # 如果需要返回对应的 url
-                    data_url = HONEY_HOST.join(re.findall(r"\"(.*?)\"", data[0])[0])
-                    await queue.put((data_name, data_url))
-                else:
-                    await queue.put(data_name)
+            for data_name, data_url, _ in await cls._get_list_page(page):
+                await queue.put((data_name, data_url) if with_url else data_name)
             signal.value = signal.value - 1  # 信号量减少 1 ，说明该爬虫任务已经完成
 
         for url in urls:  # 遍历需要爬出的页面
@@ -226,6 +289,22 @@ class WikiModel(Model):
         while signal.value > 0 or not queue.empty():  # 当还有未完成的爬虫任务或存放数据的队列不为空时
             yield await queue.get()  # 取出并返回一个存放的 Model
 
+    @classmethod
+    async def get_page_index(cls) -> Dict[str, Tuple[URL, str]]:
+        """获取全部 Model 的 名称、url 与列表数据的摘要
+
+        列表页中的数据（星级、属性等）与详情页一同更新，摘要发生变化时说明详情页需要重新爬取
+
+        Returns:
+            返回 名称 到 url 与摘要 的 dict
+        """
+        pages = await asyncio.gather(*(cls._get_list_page(url) for url in cls.scrape_urls()))
+        return {
+            name: (url, hashlib.md5(jsonlib.dumps(data).encode()).hexdigest())  # nosec
+            for rows in pages
+            for name, url, data in rows
+        }
+
     @classmethod
     async def get_name_list(cls, *, with_url: bool = False) -> List[Union[str, Tuple[str, URL]]]:
         """获取全部 Model 的 名称
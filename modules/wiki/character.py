@@ -99,7 +99,7 @@ class Character(WikiModel):
         return [HONEY_HOST.join("fam_chars/?lang=CHS")]
 
     @classmethod
-    async def _parse_soup(cls, soup: BeautifulSoup) -> "Character":
+    def _parse_soup(cls, soup: BeautifulSoup) -> "Character":
         """解析角色页"""
         soup = soup.select(".wp-block-post-content")[0]
         tables = soup.find_all("table")
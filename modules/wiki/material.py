@@ -37,7 +37,7 @@ class Material(WikiModel):
         return list(sorted(set(await super(Material, cls).get_name_list(with_url=with_url)), key=lambda x: x[0]))
 
     @classmethod
-    async def _parse_soup(cls, soup: BeautifulSoup) -> "Material":
+    def _parse_soup(cls, soup: BeautifulSoup) -> "Material":
         """解析突破素材页"""
         soup = soup.select(".wp-block-post-content")[0]
         tables = soup.find_all("table")
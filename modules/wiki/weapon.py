@@ -71,7 +71,7 @@ class Weapon(WikiModel):
         return [HONEY_HOST.join(f"fam_{i.lower()}/?lang=CHS") for i in WeaponType.__members__]
 
     @classmethod
-    async def _parse_soup(cls, soup: BeautifulSoup) -> "Weapon":
+    def _parse_soup(cls, soup: BeautifulSoup) -> "Weapon":
         """解析武器页"""
         soup = soup.select(".wp-block-post-content")[0]
         tables = soup.find_all("table")
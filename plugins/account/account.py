@@ -280,6 +280,7 @@ class BindAccountPlugin(Plugin.Conversation):
                 is_chosen=is_chosen,  # todo 多账号
             )
             await self.players_service.add(player)
+            self.helper.invalidate_credentials(user.id)
             await self.update_player_info(player, nickname)
             logger.success("用户 %s[%s] 绑定UID账号成功", user.full_name, user.id)
             await message.reply_text("保存成功", reply_markup=ReplyKeyboardRemove())
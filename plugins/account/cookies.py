@@ -23,6 +23,7 @@ from core.services.players.services import PlayersService, PlayerInfoService
 from gram_core.services.devices import DevicesService
 from gram_core.services.devices.models import DevicesDataBase as Devices
 from modules.apihelper.models.genshin.cookies import CookiesModel
+from plugins.tools.genshin import GenshinHelper
 from utils.log import logger
 
 __all__ = ("AccountCookiesPlugin",)
@@ -66,11 +67,13 @@ class AccountCookiesPlugin(Plugin.Conversation):
         cookies_service: CookiesService = None,
         player_info_service: PlayerInfoService = None,
         devices_service: DevicesService = None,
+        helper: GenshinHelper = None,
     ):
         self.cookies_service = cookies_service
         self.players_service = players_service
         self.player_info_service = player_info_service
         self.devices_service = devices_service
+        self.helper = helper
 
     # noinspection SpellCheckingInspection
     @staticmethod
@@ -461,6 +464,7 @@ class AccountCookiesPlugin(Plugin.Conversation):
                 account_cookies_plugin_data.cookies,
             )
             await self.update_devices(account_cookies_plugin_data.account_id, account_cookies_plugin_data.device)
+            self.helper.invalidate_credentials(user.id)
             logger.info("用户 %s[%s] 绑定账号成功", user.full_name, user.id)
             await message.reply_text("保存成功", reply_markup=ReplyKeyboardRemove())
             return ConversationHandler.END
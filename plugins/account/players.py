@@ -14,6 +14,7 @@ from core.services.players.services import PlayerInfoService
 from gram_core.services.cookies.models import CookiesStatusEnum
 from gram_core.services.devices import DevicesService
 from modules.apihelper.models.genshin.cookies import CookiesModel
+from plugins.tools.genshin import GenshinHelper
 from utils.log import logger
 
 if TYPE_CHECKING:
@@ -31,11 +32,13 @@ class PlayersManagesPlugin(Plugin):
         cookies: CookiesService,
         player_info_service: PlayerInfoService,
         devices_service: DevicesService,
+        helper: GenshinHelper,
     ):
         self.cookies_service = cookies
         self.players_service = players
         self.player_info_service = player_info_service
         self.devices_service = devices_service
+        self.helper = helper
 
     @staticmethod
     def players_manager_callback(callback_query_data: str) -> Tuple[str, int, int]:
@@ -237,6 +240,7 @@ class PlayersManagesPlugin(Plugin):
             cookies_data.data = cookies.to_dict()
             cookies_data.status = CookiesStatusEnum.STATUS_SUCCESS
             await self.cookies_service.update(cookies_data)
+            self.helper.invalidate_credentials(user.id)
             await callback_query.edit_message_text(
                 f"玩家 {player.player_id} {player_info.nickname} cookies 刷新成功", reply_markup=InlineKeyboardMarkup(buttons)
             )
@@ -329,6 +333,7 @@ class PlayersManagesPlugin(Plugin):
 
         player.is_chosen = True
         await self.players_service.update(player)
+        self.helper.invalidate_credentials(user.id)
 
         buttons = [
             [
@@ -377,6 +382,7 @@ class PlayersManagesPlugin(Plugin):
             cookies = await self.cookies_service.get(player.user_id, player.account_id, player.region)
             if cookies:
                 await self.cookies_service.delete(cookies)
+            self.helper.invalidate_credentials(user.id)
             player_info = await self.player_info_service.get_form_sql(player)
             if player_info is not None:
                 await self.player_info_service.delete(player_info)
@@ -2,9 +2,7 @@ from telegram import Update
 from telegram.ext import CallbackContext
 
 from core.plugin import Plugin, handler
-from metadata.scripts.honey import update_honey_metadata
-from metadata.scripts.metadatas import update_metadata_from_ambr, update_metadata_from_github
-from metadata.scripts.paimon_moe import update_paimon_moe_zh
+from metadata.scripts.refresh import refresh_metadata
 from utils.log import logger
 
 __all__ = ("MetadataPlugin",)
@@ -18,11 +16,8 @@ class MetadataPlugin(Plugin):
         logger.info("用户 %s[%s] 刷新[bold]metadata[/]缓存命令", user.full_name, user.id, extra={"markup": True})
 
         msg = await message.reply_text("正在刷新元数据，请耐心等待...")
-        logger.info("正在从 github 上获取元数据")
-        await update_metadata_from_github()
-        await update_paimon_moe_zh()
-        logger.info("正在从 ambr 上获取元数据")
-        await update_metadata_from_ambr()
-        logger.info("正在从 honey 上获取元数据")
-        await update_honey_metadata()
-        await msg.edit_text("正在刷新元数据，请耐心等待...\n完成！")
+        logger.info("正在从 github、ambr 与 honey 上获取元数据")
+        if await refresh_metadata():
+            await msg.edit_text("正在刷新元数据，请耐心等待...\n完成！")
+        else:
+            await msg.edit_text("正在刷新元数据，请耐心等待...\n部分元数据刷新失败，请查看日志")
@@ -7,6 +7,9 @@ from utils.log import logger
 
 
 class SignAll(Plugin):
+    sign_window: float = 10
+    """手动全部签到时开始时间随机分散的窗口大小（秒），不使用自动签到的窗口以便尽快完成"""
+
     def __init__(self, sign_system: SignSystem):
         self.sign_system = sign_system
 
@@ -16,5 +19,5 @@ class SignAll(Plugin):
         logger.info("用户 %s[%s] sign_all 命令请求", user.full_name, user.id)
         message = update.effective_message
         reply = await message.reply_text("正在全部重新签到，请稍后...")
-        await self.sign_system.do_sign_job(context, job_type=SignJobType.START)
-        await reply.edit_text("全部账号重新签到完成")
+        stats = await self.sign_system.do_sign_job(context, job_type=SignJobType.START, window=self.sign_window)
+        await reply.edit_text(f"全部账号重新签到完成\n{stats}")
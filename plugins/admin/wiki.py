@@ -12,8 +12,9 @@ class WikiPlugin(Plugin):
         self.wiki_service = wiki_service
 
     @handler.command("refresh_wiki", block=False, admin=True)
-    async def refresh_wiki(self, update: Update, _: CallbackContext):
+    async def refresh_wiki(self, update: Update, context: CallbackContext):
         message = update.effective_message
+        force = "force" in self.get_args(context)
         await message.reply_text("正在刷新Wiki缓存，请稍等")
-        await self.wiki_service.refresh_wiki()
+        await self.wiki_service.refresh_wiki(force)
         await message.reply_text("刷新Wiki缓存成功")
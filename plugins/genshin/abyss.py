@@ -16,6 +16,7 @@ from core.dependence.assets import AssetsService
 from core.plugin import Plugin, handler
 from core.services.cookies.error import TooManyRequestPublicCookies
 from core.services.template.models import RenderGroupResult, RenderResult
+from core.services.template.scheduler import RenderPriority
 from core.services.template.services import TemplateService
 from plugins.tools.genshin import GenshinHelper
 from utils.log import logger
@@ -234,6 +235,7 @@ class AbyssPlugin(Plugin):
                         viewport={"width": 690, "height": 500},
                         full_page=True,
                         ttl=15 * 24 * 60 * 60,
+                        priority=RenderPriority.BULK,
                     ),
                 )
 
@@ -1,5 +1,6 @@
 """Recommend teams for Spiral Abyss"""
 
+import asyncio
 import re
 
 from telegram import Update
@@ -43,6 +44,7 @@ class AbyssTeamPlugin(Plugin):
                 "文本格式：\n<code>深渊配队 [n=配队数]</code> \n\n"
                 "如：\n"
                 "<code>/abyss_team</code>\n<code>/abyss_team n=5</code>\n"
+                "<code>/abyss_team fast</code>（上下半可使用相同角色）\n"
                 "<code>深渊配队</code>\n",
                 parse_mode=ParseMode.HTML,
             )
@@ -54,71 +56,39 @@ class AbyssTeamPlugin(Plugin):
         client = await self.helper.get_genshin_client(user.id)
 
         await message.reply_chat_action(ChatAction.TYPING)
-        team_data = await self.team_data.get_data()
+        team_index = await self.team_data.get_index(12)
 
         # Set of uids
         characters = {c.id for c in await client.get_genshin_characters(client.player_id)}
 
-        teams = {
-            "Up": [],
-            "Down": [],
-        }
-
-        # All of the effective and available teams
-        for lane in ["Up", "Down"]:
-            for a_team in team_data[12 - 9][lane]:
-                t_characters = [int(s) for s in re.findall(r"\d+", a_team["Item"])]
-                t_rate = a_team["Rate"]
-
-                # Check availability
-                if not all(c in characters for c in t_characters):
-                    continue
-
-                teams[lane].append(
-                    {
-                        "Characters": t_characters,
-                        "Rate": t_rate,
-                    }
-                )
-
         # If a number is specified, use it as the number of expected teams.
         match = re.search(r"(?<=n=)\d+", message.text)
         n_team = int(match.group()) if match is not None else 4
 
-        if "fast" in message.text:
-            # TODO: Give it a faster method?
-            # Maybe we can allow characters exist on both side.
-            return
-
-        # Otherwise, we'd find a team in a complexity
-        # O(len(teams[up]) * len(teams[down]))
-
-        abyss_teams_data = {"uid": client.player_id, "teams": []}
+        # fast: characters may exist on both sides
+        pairs = team_index.top_pairs(characters, n_team, allow_overlap="fast" in message.text)
 
         async def _get_render_data(id_list):
+            icons = await asyncio.gather(*(self.assets_service.avatar(cid).icon() for cid in id_list))
             return [
                 {
-                    "icon": (await self.assets_service.avatar(cid).icon()).as_uri(),
+                    "icon": icon.as_uri(),
                     "name": idToName(cid),
                     "star": AVATAR_DATA[str(cid)]["rank"] if cid not in {10000005, 10000007} else 5,
                     "hava": True,
                 }
-                for cid in id_list
+                for cid, icon in zip(id_list, icons)
             ]
 
-        for u in teams["Up"]:
-            for d in teams["Down"]:
-                if not all(c not in d["Characters"] for c in u["Characters"]):
-                    continue
-                team = {
-                    "Up": await _get_render_data(u["Characters"]),
-                    "UpRate": u["Rate"],
-                    "Down": await _get_render_data(d["Characters"]),
-                    "DownRate": d["Rate"],
-                }
-                abyss_teams_data["teams"].append(team)
-        abyss_teams_data["teams"].sort(key=lambda t: t["UpRate"] * t["DownRate"], reverse=True)
-        abyss_teams_data["teams"] = abyss_teams_data["teams"][0 : min(n_team, len(abyss_teams_data["teams"]))]
+        # Only the teams shown need icons
+        abyss_teams_data = {"uid": client.player_id, "teams": []}
+        for up, down in pairs:
+            up_data, down_data = await asyncio.gather(
+                _get_render_data(up.characters), _get_render_data(down.characters)
+            )
+            abyss_teams_data["teams"].append(
+                {"Up": up_data, "UpRate": up.rate, "Down": down_data, "DownRate": down.rate}
+            )
 
         await message.reply_chat_action(ChatAction.UPLOAD_PHOTO)
         render_result = await self.template_service.render(
@@ -78,9 +78,8 @@ class AvatarListPlugin(Plugin):
             talents = []
             for talent in detail.talents:
                 if "普通攻击" in talent.name:
-                    talent.Config.allow_mutation = True
-                    # noinspection Pydantic
-                    talent.group_id = 1131
+                    # detail 来自进程内缓存，修改前需要复制
+                    talent = talent.copy(update={"group_id": 1131})
                 if talent.type in ["attack", "skill", "burst"]:
                     talents.append(talent)
         else:
@@ -112,6 +111,13 @@ class AvatarListPlugin(Plugin):
         async def _task(c):
             return await self.get_avatar_data(c, client)
 
+        # 批量预取角色详细信息，之后的单个查询直接命中进程内缓存
+        # 预取失败时由单个查询各自处理
+        try:
+            await self.character_details.get_many_character_details(client, characters)
+        except Exception as exc:  # pylint: disable=W0703
+            logger.warning("批量预取角色详细信息失败 %s", str(exc))
+            logger.debug("批量预取角色详细信息失败", exc_info=exc)
         task_results = await asyncio.gather(*[_task(character) for character in characters])
 
         return sorted(
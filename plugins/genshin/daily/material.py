@@ -3,13 +3,13 @@ import os
 import re
 from asyncio import Lock
 from ctypes import c_double
-from datetime import datetime
+from datetime import datetime, timedelta
 from functools import partial
 from multiprocessing import Value
 from pathlib import Path
 from ssl import SSLZeroReturnError
 from time import time as time_
-from typing import Any, Dict, Iterable, Iterator, List, Literal, Optional, Tuple, TYPE_CHECKING
+from typing import Dict, Iterable, Iterator, List, Literal, NamedTuple, Optional, Tuple, TYPE_CHECKING
 
 from aiofiles import open as async_open
 from arkowrapper import ArkoWrapper
@@ -25,7 +25,7 @@ from core.dependence.assets import AssetsCouldNotFound, AssetsService, AssetsSer
 from core.plugin import Plugin, handler
 from core.services.template.models import FileType, RenderGroupResult
 from core.services.template.services import TemplateService
-from metadata.genshin import AVATAR_DATA, HONEY_DATA
+from metadata.genshin import AVATAR_DATA, HONEY_DATA, honey_id_to_game_id
 from plugins.tools.genshin import CharacterDetails, PlayerNotFoundError, CookiesNotFoundError, GenshinHelper
 from utils.log import logger
 from utils.uid import mask_number
@@ -50,6 +50,13 @@ DOMAINS = ["忘却之峡", "太山府", "菫色之庭", "昏识塔", "苍白的
 DOMAIN_AREA_MAP = dict(zip(DOMAINS, ["蒙德", "璃月", "稻妻", "须弥", "枫丹"] * 2))
 
 WEEK_MAP = ["一", "二", "三", "四", "五", "六", "日"]
+RESET_HOUR = 4
+"""每日素材在每天 4 点刷新"""
+
+
+def get_next_reset(now: datetime) -> datetime:
+    reset = now.replace(hour=RESET_HOUR, minute=0, second=0, microsecond=0)
+    return reset if now < reset else reset + timedelta(days=1)
 
 
 def sort_item(items: List["ItemData"]) -> Iterable["ItemData"]:
@@ -102,6 +109,65 @@ def get_material_serial_name(names: Iterable[str]) -> str:
     return result
 
 
+class AreaSchedule(NamedTuple):
+    """某个区域某天的培养素材"""
+
+    name: str
+    """区域名"""
+    materials: Tuple[str, ...]
+    items: Tuple[str, ...]
+    """可培养的角色或武器的 ID"""
+
+
+class MaterialSchedule:
+    """每日素材表的索引，每次读取或刷新数据后重新建立
+
+    将 秘境 -> 星期 的数据转为 星期 -> 类型 -> 区域，查询某天的素材时不需要再遍历所有秘境。
+    """
+
+    def __init__(self, data: Optional[DATA_TYPE]):
+        self.days: List[Dict[str, List[AreaSchedule]]] = [{"avatar": [], "weapon": []} for _ in range(7)]
+        """星期 -> 类型 -> 各区域的素材"""
+        for domain, sche in (data or {}).items():
+            domain = domain.strip()
+            area = DOMAIN_AREA_MAP[domain]  # 获取秘境所在的区域
+            type_ = "avatar" if DOMAINS.index(domain) < 5 else "weapon"  # 获取秘境的培养素材的类型：是天赋书还是武器突破材料
+            for weekday, (materials, items) in enumerate(sche):
+                self.days[weekday][type_].append(AreaSchedule(area, tuple(materials), tuple(items)))
+
+
+class UserPlan:
+    """用户持有的角色与武器，以及每天可以培养的部分
+
+    在每日素材刷新或用户的角色、武器发生变化前可以重复使用，避免重新获取图标与遍历全部角色。
+    """
+
+    def __init__(self, fingerprint: Tuple, items: Dict[str, Dict[str, List["ItemData"]]]):
+        """
+        :param fingerprint: 角色与武器状态的摘要，用于判断是否发生变化
+        :param items: 类型 -> ID -> 持有的角色或武器
+        """
+        self.fingerprint = fingerprint
+        self.items = items
+        self._farmable: Dict[int, Dict[str, List[List["ItemData"]]]] = {}
+
+    @classmethod
+    def empty(cls) -> "UserPlan":
+        return cls((), {"avatar": {}, "weapon": {}})
+
+    def get_farmable(self, schedule: MaterialSchedule, weekday: int) -> Dict[str, List[List["ItemData"]]]:
+        """类型 -> 各区域当天可以培养的已持有角色或武器"""
+        if (result := self._farmable.get(weekday)) is None:
+            result = self._farmable[weekday] = {
+                type_: [
+                    [i for id_ in area.items for i in self.items[type_].get(id_, ()) if i.rarity > 3]  # 跳过 3 星及以下的武器
+                    for area in areas
+                ]
+                for type_, areas in schedule.days[weekday].items()
+            }
+        return result
+
+
 class DailyMaterial(Plugin):
     """每日素材表"""
 
@@ -120,6 +186,22 @@ class DailyMaterial(Plugin):
         self.helper = helper
         self.character_details = character_details
         self.client = AsyncClient()
+        self.schedule = MaterialSchedule(None)
+        self._plans: Dict[int, UserPlan] = {}
+        """用户 ID -> 用户的培养计划，在下一次每日刷新时清空"""
+        self._plans_reset = get_next_reset(datetime.now())
+        self._items: Dict[Tuple[str, str], Optional[ItemData]] = {}
+        """未持有的角色或武器"""
+        self._materials: Dict[Tuple[str, ...], Tuple[List[ItemData], str]] = {}
+        """区域当天的素材 ID -> (素材, 素材的系列名)"""
+
+    def _set_data(self, data: Optional[DATA_TYPE]):
+        """更新每日素材表并重新建立索引"""
+        self.data = data
+        self.schedule = MaterialSchedule(data)
+        self._plans.clear()
+        self._items.clear()
+        self._materials.clear()
 
     async def initialize(self):
         """插件在初始化时，会检查一下本地是否缓存了每日素材的数据"""
@@ -128,7 +210,7 @@ class DailyMaterial(Plugin):
         async def task_daily():
             async with self.locks[0]:
                 logger.info("正在开始获取每日素材缓存")
-                self.data = await self._refresh_data()
+                self._set_data(await self._refresh_data())
 
         if (not DATA_FILE_PATH.exists()) or (  # 若缓存不存在
             (datetime.today() - datetime.fromtimestamp(os.stat(DATA_FILE_PATH).st_mtime)).days > 3  # 若缓存过期，超过了3天
@@ -137,7 +219,7 @@ class DailyMaterial(Plugin):
         if not data and DATA_FILE_PATH.exists():  # 若存在，则读取至内存中
             async with async_open(DATA_FILE_PATH) as file:
                 data = jsonlib.loads(await file.read())
-        self.data = data
+        self._set_data(data)
 
     async def _get_skills_data(self, client: "GenshinClient", character: Character) -> Optional[List[int]]:
         detail = await self.character_details.get_character_details(client, character)
@@ -146,55 +228,110 @@ class DailyMaterial(Plugin):
         talents = [t for t in detail.talents if t.type in ["attack", "skill", "burst"]]
         return [t.level for t in talents]
 
-    async def _get_data_from_user(self, user: "User") -> Tuple[Optional["GenshinClient"], Dict[str, List[Any]]]:
-        """获取已经绑定的账号的角色、武器信息"""
-        user_data = {"avatar": [], "weapon": []}
+    @staticmethod
+    def _get_fingerprint(characters: List[Character]) -> Tuple:
+        """角色与武器中影响每日素材显示的状态"""
+        return tuple(
+            sorted(
+                (
+                    i.id,
+                    i.level,
+                    i.constellation,
+                    i.weapon.id,
+                    i.weapon.level,
+                    i.weapon.refinement,
+                    i.weapon.ascension,
+                )
+                for i in characters
+            )
+        )
+
+    async def _get_user_plan(self, characters: List[Character]) -> UserPlan:
+        items = {"avatar": {}, "weapon": {}}
+        for character in characters:
+            if character.name == "旅行者":  # 跳过主角
+                continue
+            cid = AVATAR_DATA[str(character.id)]["id"]
+            weapon = character.weapon
+            avatar_icon, weapon_icon, side_icon = await asyncio.gather(
+                self.assets_service.avatar(cid).icon(),
+                # 判定武器的突破次数是否大于 2 ;若是, 则将图标替换为 awakened (觉醒) 的图标
+                getattr(self.assets_service.weapon(weapon.id), "icon" if weapon.ascension < 2 else "awaken")(),
+                self.assets_service.avatar(cid).side(),
+            )
+            items["avatar"].setdefault(str(cid), []).append(
+                ItemData(
+                    id=cid,
+                    name=character.name,
+                    rarity=int(character.rarity),
+                    level=character.level,
+                    constellation=character.constellation,
+                    gid=character.id,
+                    icon=avatar_icon.as_uri(),
+                    origin=character,
+                )
+            )
+            items["weapon"].setdefault(str(weapon.id), []).append(
+                ItemData(
+                    id=str(weapon.id),
+                    name=weapon.name,
+                    level=weapon.level,
+                    rarity=weapon.rarity,
+                    refinement=weapon.refinement,
+                    icon=weapon_icon.as_uri(),
+                    c_path=side_icon.as_uri(),
+                )
+            )
+        return UserPlan(self._get_fingerprint(characters), items)
+
+    async def _get_data_from_user(self, user: "User") -> Tuple[Optional["GenshinClient"], UserPlan]:
+        """获取已经绑定的账号的角色、武器信息，角色与武器未发生变化时使用缓存"""
         try:
             logger.debug("尝试获取已绑定的原神账号")
             client = await self.helper.get_genshin_client(user.id)
             logger.debug("获取账号数据成功: UID=%s", client.player_id)
             characters = await client.get_genshin_characters(client.player_id)
-            for character in characters:
-                if character.name == "旅行者":  # 跳过主角
-                    continue
-                cid = AVATAR_DATA[str(character.id)]["id"]
-                weapon = character.weapon
-                user_data["avatar"].append(
-                    ItemData(
-                        id=cid,
-                        name=character.name,
-                        rarity=int(character.rarity),
-                        level=character.level,
-                        constellation=character.constellation,
-                        gid=character.id,
-                        icon=(await self.assets_service.avatar(cid).icon()).as_uri(),
-                        origin=character,
-                    )
-                )
-                user_data["weapon"].append(
-                    ItemData(
-                        id=str(weapon.id),
-                        name=weapon.name,
-                        level=weapon.level,
-                        rarity=weapon.rarity,
-                        refinement=weapon.refinement,
-                        icon=(
-                            await getattr(  # 判定武器的突破次数是否大于 2 ;若是, 则将图标替换为 awakened (觉醒) 的图标
-                                self.assets_service.weapon(weapon.id), "icon" if weapon.ascension < 2 else "awaken"
-                            )()
-                        ).as_uri(),
-                        c_path=(await self.assets_service.avatar(cid).side()).as_uri(),
-                    )
-                )
         except (PlayerNotFoundError, CookiesNotFoundError):
             logger.info("未查询到用户 %s[%s] 所绑定的账号信息", user.full_name, user.id)
         except InvalidCookies:
             logger.info("用户 %s[%s] 所绑定的账号信息已失效", user.full_name, user.id)
         else:
-            # 没有异常返回数据
-            return client, user_data
+            if (now := datetime.now()) >= self._plans_reset:
+                self._plans.clear()
+                self._plans_reset = get_next_reset(now)
+            plan = self._plans.get(user.id)
+            if plan is None or plan.fingerprint != self._get_fingerprint(characters):
+                plan = self._plans[user.id] = await self._get_user_plan(characters)
+            return client, plan
         # 有上述异常的， client 会返回 None
-        return None, user_data
+        return None, UserPlan.empty()
+
+    async def _get_item(self, type_: str, id_: str) -> Optional["ItemData"]:
+        """未持有的角色或武器"""
+        key = (type_, id_)
+        if key not in self._items:
+            try:
+                item = HONEY_DATA[type_][id_]
+            except KeyError:  # 跳过不存在或者已忽略的角色、武器
+                logger.warning("未在 honey 数据中找到 %s[%s] 的信息", type_, id_)
+                item = None
+            if item is None or item[2] < 4:  # 跳过 3 星及以下的武器
+                self._items[key] = None
+            else:
+                icon = await getattr(self.assets_service, type_)(id_).icon()
+                self._items[key] = ItemData(id=id_, name=item[1], rarity=item[2], icon=icon.as_uri())
+        return self._items[key]
+
+    async def _get_materials(self, mids: Tuple[str, ...]) -> Tuple[List["ItemData"], str]:
+        """区域当天的培养素材与素材的系列名"""
+        if (result := self._materials.get(mids)) is None:
+            materials = []
+            for mid in mids:
+                path = (await self.assets_service.material(mid).icon()).as_uri()
+                material = HONEY_DATA["material"][mid]
+                materials.append(ItemData(id=mid, icon=path, name=material[1], rarity=material[2]))
+            result = self._materials[mids] = (materials, get_material_serial_name(i.name for i in materials))
+        return result
 
     @handler.command("daily_material", block=False)
     async def daily_material(self, update: "Update", context: "ContextTypes.DEFAULT_TYPE"):
@@ -234,86 +371,62 @@ class DailyMaterial(Plugin):
         notice = await message.reply_text("派蒙可能需要找找图标素材，还请耐心等待哦~")
         await message.reply_chat_action(ChatAction.TYPING)
 
-        # 获取已经缓存的秘境素材信息
-        local_data = {"avatar": [], "weapon": []}
         if not self.data:  # 若没有缓存每日素材表的数据
             logger.info("正在获取每日素材缓存")
-            self.data = await self._refresh_data()
-        for domain, sche in self.data.items():
-            domain = domain.strip()
-            area = DOMAIN_AREA_MAP[domain]  # 获取秘境所在的区域
-            type_ = "avatar" if DOMAINS.index(domain) < 5 else "weapon"  # 获取秘境的培养素材的类型：是天赋书还是武器突破材料
-            # 将读取到的数据存入 local_data 中
-            local_data[type_].append({"name": area, "materials": sche[weekday][0], "items": sche[weekday][1]})
+            self._set_data(await self._refresh_data())
 
         # 尝试获取用户已绑定的原神账号信息
-        client, user_data = await self._get_data_from_user(user)
+        client, plan = await self._get_data_from_user(user)
+        farmable = plan.get_farmable(self.schedule, weekday)
 
         await message.reply_chat_action(ChatAction.TYPING)
         render_data = RenderData(title=title, time=time, uid=mask_number(client.player_id) if client else client)
+        if client:
+            # 使用一次 MGET 预热已缓存的天赋信息，未缓存的角色仍在下方逐个请求
+            await self.character_details.get_many_character_details(
+                client, [i.origin for area in farmable["avatar"] for i in area], fetch=False
+            )
 
         calculator_sync: bool = True  # 默认养成计算器同步为开启
         for type_ in ["avatar", "weapon"]:
             areas = []
-            for area_data in local_data[type_]:  # 遍历每个区域的信息：蒙德、璃月、稻妻、须弥
+            # 遍历每个区域当天（weekday）的信息：蒙德、璃月、稻妻、须弥
+            for area, owned in zip(self.schedule.days[weekday][type_], farmable[type_]):
                 items = []
-                for id_ in area_data["items"]:  # 遍历所有该区域下，当天（weekday）可以培养的角色、武器
-                    added = False
-                    for i in user_data[type_]:  # 从已经获取的角色数据中查找对应角色、武器
-                        if id_ == str(i.id):
-                            if i.rarity > 3:  # 跳过 3 星及以下的武器
-                                if type_ == "avatar" and client and calculator_sync:  # client 不为 None 时给角色添加天赋信息
-                                    try:
-                                        skills = await self._get_skills_data(client, i.origin)
-                                        i.skills = skills
-                                    except InvalidCookies:
-                                        calculator_sync = False
-                                    except SimnetBadRequest as e:
-                                        if e.ret_code == -502002:
-                                            calculator_sync = False  # 发现角色养成计算器没启用 设置状态为 False 并防止下次继续获取
-                                            self.add_delete_message_job(notice, delay=5)
-                                            await notice.edit_text(
-                                                "获取角色天赋信息失败，如果想要显示角色天赋信息，请先在米游社/HoYoLab中使用一次<b>养成计算器</b>后再使用此功能~",
-                                                parse_mode=ParseMode.HTML,
-                                            )
-                                        else:
-                                            raise e
-                                items.append(i)
-                            added = True
-                    if added:
-                        continue
-                    try:
-                        item = HONEY_DATA[type_][id_]
-                    except KeyError:  # 跳过不存在或者已忽略的角色、武器
-                        logger.warning("未在 honey 数据中找到 %s[%s] 的信息", type_, id_)
-                        continue
-                    if item[2] < 4:  # 跳过 3 星及以下的武器
-                        continue
-                    items.append(
-                        ItemData(  # 添加角色数据中未找到的
-                            id=id_,
-                            name=item[1],
-                            rarity=item[2],
-                            icon=(await getattr(self.assets_service, type_)(id_).icon()).as_uri(),
-                        )
-                    )
-                materials = []
-                for mid in area_data["materials"]:  # 添加这个区域当天（weekday）的培养素材
-                    try:
-                        path = (await self.assets_service.material(mid).icon()).as_uri()
-                        material = HONEY_DATA["material"][mid]
-                        materials.append(ItemData(id=mid, icon=path, name=material[1], rarity=material[2]))
-                    except AssetsCouldNotFound as exc:
-                        logger.warning("AssetsCouldNotFound message[%s] target[%s]", exc.message, exc.target)
-                        await notice.edit_text("出错了呜呜呜 ~ 派蒙找不到一些素材")
-                        return
+                for i in owned:  # 已经持有的角色、武器
+                    if type_ == "avatar" and client and calculator_sync:  # client 不为 None 时给角色添加天赋信息
+                        try:
+                            # 缓存的角色数据会被多次使用，天赋信息只添加到副本中
+                            i = i.copy(update={"skills": await self._get_skills_data(client, i.origin)})
+                        except InvalidCookies:
+                            calculator_sync = False
+                        except SimnetBadRequest as e:
+                            if e.ret_code == -502002:
+                                calculator_sync = False  # 发现角色养成计算器没启用 设置状态为 False 并防止下次继续获取
+                                self.add_delete_message_job(notice, delay=5)
+                                await notice.edit_text(
+                                    "获取角色天赋信息失败，如果想要显示角色天赋信息，请先在米游社/HoYoLab中使用一次<b>养成计算器</b>后再使用此功能~",
+                                    parse_mode=ParseMode.HTML,
+                                )
+                            else:
+                                raise e
+                    items.append(i)
+                for id_ in area.items:  # 添加角色数据中未找到的
+                    if id_ not in plan.items[type_] and (item := await self._get_item(type_, id_)) is not None:
+                        items.append(item)
+                try:
+                    materials, material_name = await self._get_materials(area.materials)
+                except AssetsCouldNotFound as exc:
+                    logger.warning("AssetsCouldNotFound message[%s] target[%s]", exc.message, exc.target)
+                    await notice.edit_text("出错了呜呜呜 ~ 派蒙找不到一些素材")
+                    return
                 areas.append(
                     AreaData(
-                        name=area_data["name"],
+                        name=area.name,
                         materials=materials,
                         # template previewer pickle cannot serialize generator
                         items=list(sort_item(items)),
-                        material_name=get_material_serial_name(map(lambda x: x.name, materials)),
+                        material_name=material_name,
                     )
                 )
             setattr(render_data, {"avatar": "character"}.get(type_, type_), areas)
@@ -372,7 +485,7 @@ class DailyMaterial(Plugin):
                 "每日素材表" + ("摘抄<b>完成！</b>" if data else "坏掉了！等会它再长好了之后我再抄。。。") + "\n正搬运每日素材的图标中。。。",
                 parse_mode=ParseMode.HTML,
             )
-            self.data = data or self.data
+            self._set_data(data or self.data)
         time = await self._download_icon(notice)
 
         async def job(_, n):
@@ -404,7 +517,9 @@ class DailyMaterial(Plugin):
                             result[key][day][0] = []
                             for a in div.find_all("a"):
                                 honey_id = re.findall(r"/(.*)?/", a["href"])[0]
-                                mid: str = [i[0] for i in HONEY_DATA["material"].items() if i[1][0] == honey_id][0]
+                                if (mid := honey_id_to_game_id(honey_id, "material")) is None:
+                                    logger.warning("未在 honey 数据中找到素材 %s 的信息", honey_id)
+                                    continue
                                 result[key][day][0].append(mid)
                     else:  # 如果是角色或武器
                         id_ = re.findall(r"/(.*)?/", tag["href"])[0]
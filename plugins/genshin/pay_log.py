@@ -190,9 +190,7 @@ class PayLogPlugin(Plugin.Conversation):
         try:
             await message.reply_chat_action(ChatAction.TYPING)
             player_id = await self.get_player_id(user.id)
-            path = self.pay_log.get_file_path(str(user.id), str(player_id))
-            if not path.exists():
-                raise PayLogNotFound
+            path = await self.pay_log.export_pay_log(str(user.id), str(player_id))
             await message.reply_chat_action(ChatAction.UPLOAD_DOCUMENT)
             await message.reply_document(document=open(path, "rb+"), caption="充值记录导出文件")
         except PayLogNotFound:
@@ -47,12 +47,8 @@ class WeaponPlugin(Plugin):
             return
         weapon_name = weaponToName(weapon_name)
         logger.info("用户 %s[%s] 查询角色攻略命令请求 weapon_name[%s]", user.full_name, user.id, weapon_name)
-        weapons_list = await self.wiki_service.get_weapons_list()
-        for weapon in weapons_list:
-            if weapon.name == weapon_name:
-                weapon_data = weapon
-                break
-        else:
+        weapon_data = await self.wiki_service.get_weapons(weapon_name)
+        if weapon_data is None:
             reply_message = await message.reply_text(
                 f"没有找到 {weapon_name}", reply_markup=InlineKeyboardMarkup(self.KEYBOARD)
             )
@@ -63,7 +59,7 @@ class WeaponPlugin(Plugin):
         await message.reply_chat_action(ChatAction.TYPING)
 
         async def input_template_data(_weapon_data: Weapon):
-            if weapon.rarity > 2:
+            if _weapon_data.rarity > 2:
                 bonus = _weapon_data.stats[-1].bonus
                 if "%" in bonus:
                     bonus = str(round(float(bonus.rstrip("%")))) + "%"
@@ -1,4 +1,3 @@
-import datetime
 from typing import TYPE_CHECKING
 
 from core.plugin import Plugin, job
@@ -13,7 +12,7 @@ class NotesJob(Plugin):
     def __init__(self, daily_note_system: DailyNoteSystem):
         self.daily_note_system = daily_note_system
 
-    @job.run_repeating(interval=datetime.timedelta(minutes=20), name="NotesJob")
+    @job.run_repeating(interval=DailyNoteSystem.notes_job_interval, name="NotesJob")
     async def card(self, context: "ContextTypes.DEFAULT_TYPE"):
         logger.info("正在执行自动便签提醒")
         await self.daily_note_system.do_get_notes_job(context)
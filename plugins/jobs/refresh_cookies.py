@@ -1,5 +1,8 @@
+import asyncio
 import datetime
-from typing import TYPE_CHECKING, Dict
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
 
 from simnet import Region
 from simnet.client.components.auth import AuthClient
@@ -14,8 +17,10 @@ from sqlalchemy.orm.exc import StaleDataError
 from core.plugin import Plugin, job
 from gram_core.basemodel import RegionEnum
 from gram_core.services.cookies import CookiesService
-from gram_core.services.cookies.models import CookiesStatusEnum
+from gram_core.services.cookies.models import CookiesDataBase as Cookies, CookiesStatusEnum
+from plugins.tools.genshin import GenshinHelper
 from utils.log import logger
+from utils.models.rate_limit import TokenBucket
 
 if TYPE_CHECKING:
     from telegram.ext import ContextTypes
@@ -26,57 +31,146 @@ REGION = {
 }
 
 
+class RefreshCookiesStats:
+    """刷新 Cookies 统计"""
+
+    def __init__(self):
+        self.total = 0
+        self.success = 0
+        self.errors: Counter = Counter()
+        self.start_time = time.monotonic()
+
+    def __str__(self) -> str:
+        elapsed = time.monotonic() - self.start_time
+        errors = " ".join(f"{key}[{value}]" for key, value in self.errors.most_common())
+        return (
+            f"处理[{self.total}] 成功[{self.success}] 用时[{elapsed:.1f}s] "
+            f"速率[{self.total / elapsed if elapsed else 0:.1f}/s] {errors}".rstrip()
+        )
+
+
 class RefreshCookiesJob(Plugin):
-    def __init__(self, cookies: CookiesService):
+    """每日使用 stoken 刷新 cookie_token 与 ltoken
+
+    两个区域同时进行刷新，每个区域由有限数量的协程并发处理并受令牌桶限流，
+    每页刷新完成后再将该页的结果写回数据库，不与刷新请求交错进行。
+    """
+
+    page_size: int = 100
+    """每页处理的 Cookies 数量，每页刷新完成后写回该页的结果"""
+    concurrency: int = 8
+    """每个区域同时刷新的 Cookies 数量"""
+    region_rate: float = 5
+    """每个区域每秒最多发起的刷新请求数"""
+    requests_per_cookie: int = 2
+    """刷新单个 Cookies 发起的请求数，分别获取 cookie_token 与 ltoken"""
+
+    def __init__(self, cookies: CookiesService, helper: GenshinHelper):
         self.cookies = cookies
+        self.helper = helper
+
+    @staticmethod
+    def pages(cookies: List[Cookies], size: int) -> Iterator[List[Cookies]]:
+        for i in range(0, len(cookies), size):
+            yield cookies[i : i + size]
+
+    async def refresh_one(self, cookie_model: Cookies, client_region: Region, stats: RefreshCookiesStats) -> bool:
+        """刷新单个 Cookies，返回是否需要写回数据库"""
+        cookies = cookie_model.data
+        try:
+            async with self.helper.transports.bind(AuthClient(cookies=cookies, region=client_region)) as client:
+                new_cookies: Dict[str, str] = cookies.copy()
+                new_cookies["cookie_token"], new_cookies["ltoken"] = await asyncio.gather(
+                    client.get_cookie_token_by_stoken(), client.get_ltoken_by_stoken()
+                )
+                cookie_model.data = new_cookies
+                cookie_model.status = CookiesStatusEnum.STATUS_SUCCESS
+                stats.success += 1
+        except ValueError:
+            cookie_model.status = CookiesStatusEnum.INVALID_COOKIES
+            stats.errors["不完整"] += 1
+            logger.warning("用户 user_id[%s] Cookies 不完整", cookie_model.user_id)
+        except InvalidCookies:
+            cookie_model.status = CookiesStatusEnum.INVALID_COOKIES
+            stats.errors["过期"] += 1
+            logger.info("用户 user_id[%s] Cookies 已经过期", cookie_model.user_id)
+        except SimnetBadRequest as _exc:
+            stats.errors[f"错误{_exc.ret_code}"] += 1
+            logger.warning(
+                "用户 user_id[%s] 刷新 Cookies 时出现错误 [%s]%s",
+                cookie_model.user_id,
+                _exc.ret_code,
+                _exc.original or _exc.message,
+            )
+            return False
+        except SimnetTimedOut:
+            stats.errors["超时"] += 1
+            logger.warning("用户 user_id[%s] 刷新 Cookies 时连接超时", cookie_model.user_id)
+            return False
+        except SimnetNetworkError:
+            stats.errors["网络错误"] += 1
+            logger.warning("用户 user_id[%s] 刷新 Cookies 时网络错误", cookie_model.user_id)
+            return False
+        except Exception as _exc:
+            stats.errors["未知错误"] += 1
+            logger.error("用户 user_id[%s] 刷新 Cookies 失败", cookie_model.user_id, exc_info=_exc)
+            return False
+        return True
+
+    async def update_many(self, cookie_models: List[Cookies], stats: RefreshCookiesStats):
+        """写回一页的刷新结果
+
+        CookiesService 没有批量更新的接口，因此逐条调用 update，单条写入失败不影响其他记录
+        """
+        for cookie_model in cookie_models:
+            try:
+                await self.cookies.update(cookie_model)
+            except StaleDataError as _exc:
+                stats.errors["写回失败"] += 1
+                if "UPDATE" in str(_exc):
+                    logger.warning("用户 user_id[%s] 刷新 Cookies 失败，数据不存在", cookie_model.user_id)
+                else:
+                    logger.error("用户 user_id[%s] 更新 Cookies 时出现错误", cookie_model.user_id, exc_info=_exc)
+            except Exception as _exc:
+                stats.errors["写回失败"] += 1
+                logger.error("用户 user_id[%s] 更新 Cookies 状态失败", cookie_model.user_id, exc_info=_exc)
+            else:
+                logger.debug("用户 user_id[%s] 刷新 Cookies 成功", cookie_model.user_id)
+            self.helper.invalidate_credentials(cookie_model.user_id)
+
+    async def refresh_region(
+        self, database_region: RegionEnum, client_region: Region, stats: Optional[RefreshCookiesStats] = None
+    ) -> RefreshCookiesStats:
+        stats = stats or RefreshCookiesStats()
+        bucket = TokenBucket(self.region_rate, max(self.region_rate, self.requests_per_cookie))
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def worker(_cookie_model: Cookies) -> Optional[Cookies]:
+            async with semaphore:
+                await bucket.acquire(self.requests_per_cookie)
+                if await self.refresh_one(_cookie_model, client_region, stats):
+                    return _cookie_model
+                return None
+
+        cookie_models = [
+            cookie_model
+            for cookie_model in await self.cookies.get_all_by_region(database_region)
+            if cookie_model.data.get("stoken") is not None and cookie_model.status != CookiesStatusEnum.INVALID_COOKIES
+        ]
+        for page in self.pages(cookie_models, self.page_size):
+            stats.total += len(page)
+            results = await asyncio.gather(*(worker(cookie_model) for cookie_model in page))
+            await self.update_many([cookie_model for cookie_model in results if cookie_model is not None], stats)
+        return stats
 
     @job.run_daily(time=datetime.time(hour=0, minute=1, second=0), name="RefreshCookiesJob")
     async def daily_refresh_cookies(self, _: "ContextTypes.DEFAULT_TYPE"):
         logger.info("正在执行每日刷新 Cookies 任务")
-        for database_region, client_region in REGION.items():
-            for cookie_model in await self.cookies.get_all_by_region(database_region):
-                cookies = cookie_model.data
-                if cookies.get("stoken") is not None and cookie_model.status != CookiesStatusEnum.INVALID_COOKIES:
-                    try:
-                        async with AuthClient(cookies=cookies, region=client_region) as client:
-                            new_cookies: Dict[str, str] = cookies.copy()
-                            new_cookies["cookie_token"] = await client.get_cookie_token_by_stoken()
-                            new_cookies["ltoken"] = await client.get_ltoken_by_stoken()
-                            cookie_model.data = new_cookies
-                            cookie_model.status = CookiesStatusEnum.STATUS_SUCCESS
-                    except ValueError:
-                        cookie_model.status = CookiesStatusEnum.INVALID_COOKIES
-                        logger.warning("用户 user_id[%s] Cookies 不完整", cookie_model.user_id)
-                    except InvalidCookies:
-                        cookie_model.status = CookiesStatusEnum.INVALID_COOKIES
-                        logger.info("用户 user_id[%s] Cookies 已经过期", cookie_model.user_id)
-                    except SimnetBadRequest as _exc:
-                        logger.warning(
-                            "用户 user_id[%s] 刷新 Cookies 时出现错误 [%s]%s",
-                            cookie_model.user_id,
-                            _exc.ret_code,
-                            _exc.original or _exc.message,
-                        )
-                        continue
-                    except SimnetTimedOut:
-                        logger.warning("用户 user_id[%s] 刷新 Cookies 时连接超时", cookie_model.user_id)
-                        continue
-                    except SimnetNetworkError:
-                        logger.warning("用户 user_id[%s] 刷新 Cookies 时网络错误", cookie_model.user_id)
-                        continue
-                    except Exception as _exc:
-                        logger.error("用户 user_id[%s] 刷新 Cookies 失败", cookie_model.user_id, exc_info=_exc)
-                        continue
-                    try:
-                        await self.cookies.update(cookie_model)
-                    except StaleDataError as _exc:
-                        if "UPDATE" in str(_exc):
-                            logger.warning("用户 user_id[%s] 刷新 Cookies 失败，数据不存在", cookie_model.user_id)
-                        else:
-                            logger.error("用户 user_id[%s] 更新 Cookies 时出现错误", cookie_model.user_id, exc_info=_exc)
-                    except Exception as _exc:
-                        logger.error("用户 user_id[%s] 更新 Cookies 状态失败", cookie_model.user_id, exc_info=_exc)
-                    else:
-                        logger.debug("用户 user_id[%s] 刷新 Cookies 成功")
-
-        logger.success("执行每日刷新 Cookies 任务完成")
+        stats = RefreshCookiesStats()
+        await asyncio.gather(
+            *(
+                self.refresh_region(database_region, client_region, stats)
+                for database_region, client_region in REGION.items()
+            )
+        )
+        logger.success("执行每日刷新 Cookies 任务完成 %s", stats)
@@ -5,9 +5,6 @@ from simnet import Region
 from simnet.client.routes import Route
 from simnet.errors import BadRequest as SimnetBadRequest, RegionNotSupported, InvalidCookies, TimedOut as SimnetTimedOut
 from simnet.utils.player import recognize_genshin_game_biz, recognize_genshin_server
-from sqlalchemy.orm.exc import StaleDataError
-from telegram.constants import ParseMode
-from telegram.error import BadRequest, Forbidden
 
 from core.plugin import Plugin
 from core.services.task.models import TaskStatusEnum
@@ -15,6 +12,7 @@ from core.services.task.services import TaskCardServices
 from metadata.shortname import roleToId
 from modules.apihelper.client.components.calendar import Calendar
 from plugins.tools.genshin import GenshinHelper, PlayerNotFoundError, CookiesNotFoundError
+from plugins.tools.notice import NoticeItem, NoticeSystem
 from utils.log import logger
 
 if TYPE_CHECKING:
@@ -46,7 +44,9 @@ class BirthdayCardSystem(Plugin):
         self,
         card_service: TaskCardServices,
         genshin_helper: GenshinHelper,
+        notice_system: NoticeSystem,
     ):
+        self.notice_system = notice_system
         self.birthday_list = {}
         self.card_service = card_service
         self.genshin_helper = genshin_helper
@@ -165,22 +165,6 @@ class BirthdayCardSystem(Plugin):
                 text = "自动领取生日画片失败了呜呜呜 ~ 执行自动领取生日画片时发生错误"
             else:
                 task_db.status = TaskStatusEnum.STATUS_SUCCESS
-            if task_db.chat_id < 0:
-                text = f'<a href="tg://user?id={task_db.user_id}">NOTICE {task_db.user_id}</a>\n\n{text}'
-            try:
-                await context.bot.send_message(task_db.chat_id, text, parse_mode=ParseMode.HTML)
-            except BadRequest as exc:
-                logger.error("执行自动领取生日画片时发生错误 user_id[%s] Message[%s]", user_id, exc.message)
-                task_db.status = TaskStatusEnum.BAD_REQUEST
-            except Forbidden as exc:
-                logger.error("执行自动领取生日画片时发生错误 user_id[%s] message[%s]", user_id, exc.message)
-                task_db.status = TaskStatusEnum.FORBIDDEN
-            except Exception as exc:
-                logger.error("执行自动领取生日画片时发生错误 user_id[%s]", user_id, exc_info=exc)
-                continue
-            else:
-                task_db.status = TaskStatusEnum.STATUS_SUCCESS
-            try:
-                await self.card_service.update(task_db)
-            except StaleDataError:
-                logger.warning("用户 user_id[%s] 自动领取生日画片数据过期，跳过更新数据", user_id)
+            await self.notice_system.push(
+                NoticeItem(task_db.chat_id, text, user_id, tasks=[(self.card_service, task_db)], name="自动领取生日画片")
+            )
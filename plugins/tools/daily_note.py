@@ -1,21 +1,24 @@
+import asyncio
 import base64
-from typing import TYPE_CHECKING, List, Optional
+import time
+from datetime import timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
 
 from pydantic import BaseModel, validator
 from simnet import Region
 from simnet.errors import BadRequest as SimnetBadRequest, InvalidCookies, TimedOut as SimnetTimedOut
 from sqlalchemy.orm.exc import StaleDataError
-from telegram.constants import ParseMode
-from telegram.error import BadRequest, Forbidden
 
 from core.plugin import Plugin
 from core.services.task.models import Task as TaskUser, TaskStatusEnum
 from core.services.task.services import TaskResinServices, TaskRealmServices, TaskExpeditionServices
 from plugins.tools.genshin import GenshinHelper, PlayerNotFoundError, CookiesNotFoundError
+from plugins.tools.notice import NoticeItem, NoticeSystem
 from utils.log import logger
 
 if TYPE_CHECKING:
     from simnet import GenshinClient
+    from simnet.models.genshin.chronicle.notes import Notes
     from telegram.ext import ContextTypes
 
 
@@ -68,6 +71,8 @@ class DailyNoteTaskUser:
         self.resin = ResinData(**self.resin_db.data) if self.resin_db else None
         self.realm = RealmData(**self.realm_db.data) if self.realm_db else None
         self.expedition = ExpeditionData(**self.expedition_db.data) if self.expedition_db else None
+        self.ready_in: float = 0
+        """距离下一次可能需要提醒的秒数，由便签数据估算"""
 
     @property
     def status(self) -> TaskStatusEnum:
@@ -120,17 +125,28 @@ class DailyNoteTaskUser:
 
 
 class DailyNoteSystem(Plugin):
+    notes_job_interval: timedelta = timedelta(minutes=20)
+    """自动便签提醒的执行间隔"""
+    notes_job_concurrency: int = 16
+    """自动便签提醒同时请求的用户数量"""
+    notes_job_max_skip: timedelta = timedelta(hours=2)
+    """估算无需提醒时最多跳过请求的时长，避免用户使用脆弱树脂等操作后长时间无法收到提醒"""
+
     def __init__(
         self,
         genshin_helper: GenshinHelper,
         resin_service: TaskResinServices,
         realm_service: TaskRealmServices,
         expedition_service: TaskExpeditionServices,
+        notice_system: NoticeSystem,
     ):
+        self.notice_system = notice_system
         self.genshin_helper = genshin_helper
         self.resin_service = resin_service
         self.realm_service = realm_service
         self.expedition_service = expedition_service
+        self.next_check: Dict[int, float] = {}
+        """user_id -> 下一次需要请求便签的时间戳"""
 
     async def get_single_task_user(self, user_id: int) -> DailyNoteTaskUser:
         resin_db = await self.resin_service.get_by_user_id(user_id)
@@ -143,6 +159,28 @@ class DailyNoteSystem(Plugin):
             expedition_db=expedition_db,
         )
 
+    @staticmethod
+    def estimate_ready_in(notes: "Notes", user: DailyNoteTaskUser) -> float:
+        """根据便签的恢复时间估算最早可能需要提醒的剩余秒数，返回 0 表示下次仍需请求"""
+        waits = []
+        if user.resin_db and notes.max_resin > 0:
+            missing = notes.max_resin - notes.current_resin
+            remaining = notes.remaining_resin_recovery_time.total_seconds()
+            if notes.current_resin >= user.resin.notice_num or missing <= 0 or remaining <= 0:
+                return 0
+            waits.append((user.resin.notice_num - notes.current_resin) * remaining / missing)
+        if user.realm_db and notes.max_realm_currency > 0:
+            missing = notes.max_realm_currency - notes.current_realm_currency
+            remaining = notes.remaining_realm_currency_recovery_time.total_seconds()
+            if notes.current_realm_currency >= user.realm.notice_num or missing <= 0 or remaining <= 0:
+                return 0
+            waits.append((user.realm.notice_num - notes.current_realm_currency) * remaining / missing)
+        if user.expedition_db and len(notes.expeditions) > 0:
+            if all(i.status == "Finished" for i in notes.expeditions):
+                return 0
+            waits.append(max(i.remaining_time.total_seconds() for i in notes.expeditions))
+        return min(waits, default=0)
+
     @staticmethod
     async def start_get_notes(
         client: "GenshinClient",
@@ -189,6 +227,7 @@ class DailyNoteSystem(Plugin):
             else:
                 user.expedition.noticed = False
         notices.append(notice)
+        user.ready_in = DailyNoteSystem.estimate_ready_in(notes, user)
         user.save()
         return notices
 
@@ -196,19 +235,16 @@ class DailyNoteSystem(Plugin):
         resin_list = await self.resin_service.get_all()
         realm_list = await self.realm_service.get_all()
         expedition_list = await self.expedition_service.get_all()
-        user_list = set()
-        for i in resin_list:
-            user_list.add(i.user_id)
-        for i in realm_list:
-            user_list.add(i.user_id)
-        for i in expedition_list:
-            user_list.add(i.user_id)
+        resin_map = {i.user_id: i for i in resin_list}
+        realm_map = {i.user_id: i for i in realm_list}
+        expedition_map = {i.user_id: i for i in expedition_list}
+        user_list = resin_map.keys() | realm_map.keys() | expedition_map.keys()
         return [
             DailyNoteTaskUser(
                 user_id=i,
-                resin_db=next((x for x in resin_list if x.user_id == i), None),
-                realm_db=next((x for x in realm_list if x.user_id == i), None),
-                expedition_db=next((x for x in expedition_list if x.user_id == i), None),
+                resin_db=resin_map.get(i),
+                realm_db=realm_map.get(i),
+                expedition_db=expedition_map.get(i),
             )
             for i in user_list
         ]
@@ -221,18 +257,23 @@ class DailyNoteSystem(Plugin):
         if user.expedition_db:
             await self.expedition_service.remove(user.expedition_db)
 
-    async def update_task_user(self, user: DailyNoteTaskUser):
-        if user.resin_db:
+    async def update_task_user(self, user: DailyNoteTaskUser, exclude: Iterable[TaskUser] = ()):
+        """写回任务数据
+        :param user: 任务数据
+        :param exclude: 已经交给通知系统写回的数据
+        """
+        excluded = {id(i) for i in exclude}
+        if user.resin_db and id(user.resin_db) not in excluded:
             try:
                 await self.resin_service.update(user.resin_db)
             except StaleDataError:
                 logger.warning("用户 user_id[%s] 自动便签提醒 - 树脂数据过期，跳过更新数据", user.user_id)
-        if user.realm_db:
+        if user.realm_db and id(user.realm_db) not in excluded:
             try:
                 await self.realm_service.update(user.realm_db)
             except StaleDataError:
                 logger.warning("用户 user_id[%s] 自动便签提醒 - 洞天宝钱数据过期，跳过更新数据", user.user_id)
-        if user.expedition_db:
+        if user.expedition_db and id(user.expedition_db) not in excluded:
             try:
                 await self.expedition_service.update(user.expedition_db)
             except StaleDataError:
@@ -250,6 +291,7 @@ class DailyNoteSystem(Plugin):
         return need_verify
 
     async def import_web_config(self, user_id: int, web_config: WebAppData):
+        self.next_check.pop(user_id, None)
         user = await self.get_single_task_user(user_id)
         if web_config.resin:
             if web_config.resin.noticed:
@@ -307,64 +349,85 @@ class DailyNoteSystem(Plugin):
         user.save()
         await self.update_task_user(user)
 
+    async def _get_notes_one(self, task_db: DailyNoteTaskUser):
+        user_id = task_db.user_id
+        logger.info("自动便签提醒 - 请求便签信息 user_id[%s]", user_id)
+        try:
+            async with self.genshin_helper.genshin(user_id) as client:
+                text = await self.start_get_notes(client, task_db)
+        except InvalidCookies:
+            text = "自动便签提醒执行失败，Cookie无效"
+            task_db.status = TaskStatusEnum.INVALID_COOKIES
+        except SimnetBadRequest as exc:
+            text = f"自动便签提醒执行失败，API返回信息为 {str(exc)}"
+            task_db.status = TaskStatusEnum.GENSHIN_EXCEPTION
+        except SimnetTimedOut:
+            logger.info("用户 user_id[%s] 请求便签超时", user_id)
+            return
+        except PlayerNotFoundError:
+            logger.info("用户 user_id[%s] 玩家不存在 关闭并移除自动便签提醒", user_id)
+            await self.remove_task_user(task_db)
+            return
+        except CookiesNotFoundError:
+            logger.info("用户 user_id[%s] cookie 不存在 关闭并移除自动便签提醒", user_id)
+            await self.remove_task_user(task_db)
+            return
+        except Exception as exc:
+            logger.error("执行自动便签提醒时发生错误 user_id[%s]", user_id, exc_info=exc)
+            text = "获取便签失败了呜呜呜 ~ 执行自动便签提醒时发生错误"
+        else:
+            task_db.status = TaskStatusEnum.STATUS_SUCCESS
+            ready_in = min(task_db.ready_in, self.notes_job_max_skip.total_seconds())
+            self.next_check[user_id] = time.time() + ready_in
+        handed = []
+        for idx, (service, task_user_db) in enumerate(
+            [
+                (self.resin_service, task_db.resin_db),
+                (self.realm_service, task_db.realm_db),
+                (self.expedition_service, task_db.expedition_db),
+            ]
+        ):
+            if task_user_db is None:
+                continue
+            notice_text = text[idx] if isinstance(text, list) else text
+            if not notice_text:
+                continue
+            await self.notice_system.push(
+                NoticeItem(
+                    task_user_db.chat_id,
+                    notice_text,
+                    task_user_db.user_id,
+                    tasks=[(service, task_user_db)],
+                    name="自动便签提醒",
+                )
+            )
+            handed.append(task_user_db)
+        # 交给通知系统的数据会在发送完成后写回，这里只写回其余的数据
+        await self.update_task_user(task_db, exclude=handed)
+
     async def do_get_notes_job(self, context: "ContextTypes.DEFAULT_TYPE"):
         include_status: List[TaskStatusEnum] = [
             TaskStatusEnum.STATUS_SUCCESS,
             TaskStatusEnum.TIMEOUT_ERROR,
         ]
-        task_list = await self.get_all_task_users()
-        for task_db in task_list:
+        deadline = time.time() + self.notes_job_interval.total_seconds()
+        task_list = []
+        skipped = 0
+        for task_db in await self.get_all_task_users():
             if task_db.status not in include_status:
                 continue
-            user_id = task_db.user_id
-            logger.info("自动便签提醒 - 请求便签信息 user_id[%s]", user_id)
-            try:
-                async with self.genshin_helper.genshin(user_id) as client:
-                    text = await self.start_get_notes(client, task_db)
-            except InvalidCookies:
-                text = "自动便签提醒执行失败，Cookie无效"
-                task_db.status = TaskStatusEnum.INVALID_COOKIES
-            except SimnetBadRequest as exc:
-                text = f"自动便签提醒执行失败，API返回信息为 {str(exc)}"
-                task_db.status = TaskStatusEnum.GENSHIN_EXCEPTION
-            except SimnetTimedOut:
-                logger.info("用户 user_id[%s] 请求便签超时", user_id)
-                continue
-            except PlayerNotFoundError:
-                logger.info("用户 user_id[%s] 玩家不存在 关闭并移除自动便签提醒", user_id)
-                await self.remove_task_user(task_db)
+            if self.next_check.get(task_db.user_id, 0) > deadline:
+                skipped += 1
                 continue
-            except CookiesNotFoundError:
-                logger.info("用户 user_id[%s] cookie 不存在 关闭并移除自动便签提醒", user_id)
-                await self.remove_task_user(task_db)
-                continue
-            except Exception as exc:
-                logger.error("执行自动便签提醒时发生错误 user_id[%s]", user_id, exc_info=exc)
-                text = "获取便签失败了呜呜呜 ~ 执行自动便签提醒时发生错误"
-            else:
-                task_db.status = TaskStatusEnum.STATUS_SUCCESS
-            for idx, task_user_db in enumerate([task_db.resin_db, task_db.realm_db, task_db.expedition_db]):
-                if task_user_db is None:
-                    continue
-                notice_text = text[idx] if isinstance(text, list) else text
-                if not notice_text:
-                    continue
-                if task_user_db.chat_id < 0:
-                    notice_text = (
-                        f'<a href="tg://user?id={task_user_db.user_id}">'
-                        f"NOTICE {task_user_db.user_id}</a>\n\n{notice_text}"
-                    )
+            task_list.append(task_db)
+        logger.info("自动便签提醒 - 需要请求 %s 个用户 跳过 %s 个用户", len(task_list), skipped)
+        semaphore = asyncio.Semaphore(self.notes_job_concurrency)
+
+        async def worker(_task_db: DailyNoteTaskUser):
+            async with semaphore:
                 try:
-                    await context.bot.send_message(task_user_db.chat_id, notice_text, parse_mode=ParseMode.HTML)
-                except BadRequest as exc:
-                    logger.error("执行自动便签提醒时发生错误 user_id[%s] Message[%s]", user_id, exc.message)
-                    task_user_db.status = TaskStatusEnum.BAD_REQUEST
-                except Forbidden as exc:
-                    logger.error("执行自动便签提醒时发生错误 user_id[%s] message[%s]", user_id, exc.message)
-                    task_user_db.status = TaskStatusEnum.FORBIDDEN
+                    await self._get_notes_one(_task_db)
                 except Exception as exc:
-                    logger.error("执行自动便签提醒时发生错误 user_id[%s]", user_id, exc_info=exc)
-                    continue
-                else:
-                    task_user_db.status = TaskStatusEnum.STATUS_SUCCESS
-            await self.update_task_user(task_db)
+                    logger.error("执行自动便签提醒时发生错误 user_id[%s]", _task_db.user_id, exc_info=exc)
+
+        await asyncio.gather(*(worker(task_db) for task_db in task_list))
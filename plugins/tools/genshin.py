@@ -1,17 +1,26 @@
 import asyncio
 import random
+import time as time_
+import weakref
+from collections import OrderedDict
+from copy import deepcopy
 from contextlib import asynccontextmanager
 from datetime import datetime, time, timedelta
-from typing import Optional
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
 from typing import TYPE_CHECKING, Union
 
+from httpx import AsyncBaseTransport, AsyncClient, AsyncHTTPTransport, Limits, Request, Response
 from pydantic import ValidationError
 from simnet import GenshinClient, Region
+from simnet.client.base import BaseClient
 from simnet.errors import BadRequest as SimnetBadRequest, InvalidCookies, NetworkError, CookieException
 from simnet.models.genshin.calculator import CalculatorCharacterDetails
 from simnet.models.genshin.chronicle.characters import Character
 from simnet.utils.player import recognize_game_biz
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import make_transient_to_detached
 from sqlalchemy.orm.exc import StaleDataError
 from sqlmodel import BigInteger, Column, DateTime, Field, Index, Integer, SQLModel, String, delete, func, select
 from telegram.ext import ContextTypes
@@ -21,8 +30,11 @@ from core.dependence.database import Database
 from core.dependence.redisdb import RedisDB
 from core.error import ServiceNotFoundError
 from core.plugin import Plugin
+from core.services.cookies.models import CookiesDataBase as Cookies
 from core.services.cookies.services import CookiesService, PublicCookiesService
 from core.services.devices import DevicesService
+from core.services.devices.models import DevicesDataBase as Devices
+from core.services.players.models import PlayersDataBase as Player
 from core.services.players.services import PlayersService
 from core.services.users.services import UserService
 from core.sqlmodel.session import AsyncSession
@@ -32,7 +44,15 @@ from utils.log import logger
 if TYPE_CHECKING:
     from sqlalchemy import Table
 
-__all__ = ("GenshinHelper", "PlayerNotFoundError", "CookiesNotFoundError", "CharacterDetails")
+__all__ = (
+    "GenshinHelper",
+    "PlayerNotFoundError",
+    "CookiesNotFoundError",
+    "CharacterDetails",
+    "CredentialBundle",
+    "CredentialCache",
+    "TransportPool",
+)
 
 
 class CharacterDetailsSQLModel(SQLModel, table=True):
@@ -49,6 +69,19 @@ class CharacterDetailsSQLModel(SQLModel, table=True):
 
 
 class CharacterDetails(Plugin):
+    """角色详细信息缓存
+
+    依次查询进程内的 LRU 缓存、Redis 与米游社接口，同一角色的并发请求只会请求一次接口。
+    新数据会先写入 Redis，再由定时任务批量写入数据库，以便遇到 Too Many Requests 时使用旧数据。
+    """
+
+    cache_size: int = 2048
+    """进程内缓存的角色详细信息数量"""
+    flush_interval: float = 30
+    """批量写入数据库的间隔（秒）"""
+    flush_batch_size: int = 500
+    """单条语句写入的最大行数"""
+
     def __init__(
         self,
         database: Database,
@@ -57,6 +90,9 @@ class CharacterDetails(Plugin):
         self.database = database
         self.redis = redis.client
         self.expire = 60 * 60
+        self._cache: "OrderedDict[Tuple[int, int], Tuple[float, CalculatorCharacterDetails]]" = OrderedDict()
+        self._inflight: Dict[Tuple[int, int], "asyncio.Task[CalculatorCharacterDetails]"] = {}
+        self._pending: Dict[Tuple[int, int], str] = {}
 
     async def initialize(self) -> None:
         def fetch_and_update_objects(connection):
@@ -69,6 +105,10 @@ class CharacterDetails(Plugin):
         async with self.database.engine.begin() as conn:
             await conn.run_sync(fetch_and_update_objects)
         self.application.job_queue.run_daily(self.del_old_data_job, time(hour=12, minute=0))
+        self.application.job_queue.run_repeating(self.flush_job, self.flush_interval)
+
+    async def shutdown(self) -> None:
+        await self.flush()
 
     async def del_old_data_job(self, _: ContextTypes.DEFAULT_TYPE):
         await self.del_old_data(timedelta(days=7))
@@ -83,6 +123,23 @@ class CharacterDetails(Plugin):
     def get_qname(uid: int, character: int):
         return f"plugins:character_details:{uid}:{character}"
 
+    def _get_cache(self, uid: int, character_id: int) -> Optional["CalculatorCharacterDetails"]:
+        key = (uid, character_id)
+        if (entry := self._cache.get(key)) is None:
+            return None
+        if entry[0] < time_.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry[1]
+
+    def _set_cache(self, uid: int, character_id: int, detail: "CalculatorCharacterDetails", expire: float):
+        key = (uid, character_id)
+        self._cache[key] = (time_.monotonic() + expire, detail)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
     async def get_character_details_for_redis(
         self,
         uid: int,
@@ -95,47 +152,92 @@ class CharacterDetails(Plugin):
         json_data = str(data, encoding="utf-8")
         return CalculatorCharacterDetails.parse_raw(json_data)
 
+    async def get_many_character_details_for_redis(
+        self, uid: int, character_ids: List[int]
+    ) -> Dict[int, "CalculatorCharacterDetails"]:
+        """使用一次 MGET 获取多个角色的详细信息"""
+        if not character_ids:
+            return {}
+        values = await self.redis.mget([self.get_qname(uid, character_id) for character_id in character_ids])
+        result = {}
+        for character_id, data in zip(character_ids, values):
+            if data is not None:
+                result[character_id] = CalculatorCharacterDetails.parse_raw(str(data, encoding="utf-8"))
+        return result
+
     async def set_character_details(self, player_id: int, character_id: int, data: str):
+        """写入 Redis 并加入待写入数据库的队列"""
         randint = random.randint(1, 30)  # nosec
         await self.redis.set(
             self.get_qname(player_id, character_id), data, ex=self.expire + randint * 60
         )  # 使用随机数防止缓存雪崩
-        async with AsyncSession(self.database.engine) as session:
-            statement = (
-                select(CharacterDetailsSQLModel)
-                .where(CharacterDetailsSQLModel.player_id == player_id)
-                .where(CharacterDetailsSQLModel.character_id == character_id)
-            )
-            results = await session.exec(statement)
-            sql_data = results.first()
-        if sql_data is None:
-            sql_data = CharacterDetailsSQLModel(
-                player_id=player_id, character_id=character_id, data=data, time_updated=datetime.now()
-            )
-            async with AsyncSession(self.database.engine) as session:
-                session.add(sql_data)
-                await session.commit()
-        else:
-            sql_data.data = data
-            sql_data.time_updated = datetime.now()
-            async with AsyncSession(self.database.engine) as session:
-                session.add(sql_data)
-                await session.commit()
+        self._pending[(player_id, character_id)] = data
 
     async def set_character_details_task(self, player_id: int, character_id: int, data: str):
         try:
             await self.set_character_details(player_id, character_id, data)
-        except SQLAlchemyError as exc:
-            logger.error("写入到数据库失败 code[%s]", exc.code)
-            logger.debug("写入到数据库失败", exc_info=exc)
         except Exception as exc:
             logger.error("set_character_details 执行失败", exc_info=exc)
 
+    async def upsert_character_details(self, rows: List[Dict[str, Any]]):
+        """批量插入或更新数据库中的角色详细信息"""
+        if self.database.engine.dialect.name == "mysql":
+            statement = mysql_insert(CharacterDetailsSQLModel.__table__).values(rows)
+            statement = statement.on_duplicate_key_update(
+                data=statement.inserted.data, time_updated=statement.inserted.time_updated
+            )
+            async with AsyncSession(self.database.engine) as session:
+                await session.execute(statement)
+                await session.commit()
+            return
+        rows_map = {(row["player_id"], row["character_id"]): row for row in rows}
+        async with AsyncSession(self.database.engine) as session:
+            statement = select(CharacterDetailsSQLModel).where(
+                tuple_(CharacterDetailsSQLModel.player_id, CharacterDetailsSQLModel.character_id).in_(list(rows_map))
+            )
+            for sql_data in (await session.exec(statement)).all():
+                row = rows_map.pop((sql_data.player_id, sql_data.character_id))
+                sql_data.data = row["data"]
+                sql_data.time_updated = row["time_updated"]
+                session.add(sql_data)
+            for row in rows_map.values():
+                session.add(CharacterDetailsSQLModel(**row))
+            await session.commit()
+
+    async def flush(self):
+        """将待写入的数据批量写入数据库"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        now = datetime.now()
+        rows = [
+            {"player_id": player_id, "character_id": character_id, "data": data, "time_updated": now}
+            for (player_id, character_id), data in pending.items()
+        ]
+        for i in range(0, len(rows), self.flush_batch_size):
+            batch = rows[i : i + self.flush_batch_size]
+            try:
+                await self.upsert_character_details(batch)
+                continue
+            except SQLAlchemyError as exc:
+                logger.error("写入到数据库失败 code[%s]", exc.code)
+                logger.debug("写入到数据库失败", exc_info=exc)
+            except Exception as exc:
+                logger.error("批量写入角色详细信息失败", exc_info=exc)
+            # 写入失败的数据放回队列等待下次写入，不覆盖期间产生的新数据
+            for row in batch:
+                self._pending.setdefault((row["player_id"], row["character_id"]), row["data"])
+
+    async def flush_job(self, _: ContextTypes.DEFAULT_TYPE):
+        await self.flush()
+
     async def get_character_details_for_mysql(
         self,
         uid: int,
         character_id: int,
     ) -> Optional["CalculatorCharacterDetails"]:
+        if (data := self._pending.get((uid, character_id))) is not None:
+            return CalculatorCharacterDetails.parse_raw(data)
         async with AsyncSession(self.database.engine) as session:
             statement = (
                 select(CharacterDetailsSQLModel)
@@ -157,6 +259,76 @@ class CharacterDetails(Plugin):
                     await session.commit()
         return None
 
+    async def _fetch_character_details(
+        self, client: "GenshinClient", uid: int, character_id: int
+    ) -> Optional["CalculatorCharacterDetails"]:
+        try:
+            detail = await client.get_character_details(character_id)
+        except SimnetBadRequest as exc:
+            if "Too Many Requests" in exc.message:
+                return await self.get_character_details_for_mysql(uid, character_id)
+            raise exc
+        self._set_cache(uid, character_id, detail, self.expire)
+        await self.set_character_details_task(uid, character_id, detail.json(by_alias=True))
+        return detail
+
+    async def fetch_character_details(
+        self, client: "GenshinClient", uid: int, character_id: int
+    ) -> Optional["CalculatorCharacterDetails"]:
+        """从接口获取角色详细信息，同一角色的并发请求会共享同一次请求
+
+        共享的请求使用发起者的客户端，若其失败（例如发起者的客户端已被关闭），
+        加入的调用者会使用自己的客户端重新请求，不受发起者生命周期的影响
+        """
+        key = (uid, character_id)
+        if (task := self._inflight.get(key)) is not None:
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+            except SimnetBadRequest as exc:
+                # 接口返回的错误对同一角色的所有调用者都相同，无需重新请求
+                raise exc
+            except Exception as exc:  # pylint: disable=W0703
+                logger.debug("共享的角色详细信息请求失败，使用当前客户端重新请求", exc_info=exc)
+            return await self._fetch_character_details(client, uid, character_id)
+        task = self._inflight[key] = asyncio.create_task(self._fetch_character_details(client, uid, character_id))
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def get_many_character_details(
+        self, client: "GenshinClient", characters: "Sequence[Union[int, Character]]", fetch: bool = True
+    ) -> Dict[int, Optional["CalculatorCharacterDetails"]]:
+        """批量获取角色详细信息
+
+        :param client: 用于请求接口的客户端
+        :param characters: 角色或角色ID
+        :param fetch: 为 False 时只查询缓存，未命中的角色不会出现在结果中
+        """
+        uid = client.player_id
+        character_ids = [character.id if isinstance(character, Character) else character for character in characters]
+        if uid is None:
+            if not fetch:
+                return {}
+            details = await asyncio.gather(*(self.get_character_details(client, i) for i in character_ids))
+            return dict(zip(character_ids, details))
+        result = {}
+        misses = []
+        for character_id in character_ids:
+            if (detail := self._get_cache(uid, character_id)) is not None:
+                result[character_id] = detail
+            else:
+                misses.append(character_id)
+        for character_id, detail in (await self.get_many_character_details_for_redis(uid, misses)).items():
+            self._set_cache(uid, character_id, detail, self.expire)
+            result[character_id] = detail
+        if fetch:
+            misses = [character_id for character_id in misses if character_id not in result]
+            details = await asyncio.gather(*(self.fetch_character_details(client, uid, i) for i in misses))
+            result.update(zip(misses, details))
+        return result
+
     async def get_character_details(
         self, client: "GenshinClient", character: "Union[int,Character]"
     ) -> Optional["CalculatorCharacterDetails"]:
@@ -167,17 +339,13 @@ class CharacterDetails(Plugin):
         else:
             character_id = character
         if uid is not None:
+            if (detail := self._get_cache(uid, character_id)) is not None:
+                return detail
             detail = await self.get_character_details_for_redis(uid, character_id)
             if detail is not None:
+                self._set_cache(uid, character_id, detail, self.expire)
                 return detail
-            try:
-                detail = await client.get_character_details(character_id)
-            except SimnetBadRequest as exc:
-                if "Too Many Requests" in exc.message:
-                    return await self.get_character_details_for_mysql(uid, character_id)
-                raise exc
-            asyncio.create_task(self.set_character_details(uid, character_id, detail.json(by_alias=True)))
-            return detail
+            return await self.fetch_character_details(client, uid, character_id)
         try:
             return await client.get_character_details(character_id)
         except SimnetBadRequest as exc:
@@ -200,6 +368,131 @@ class CookiesNotFoundError(Exception):
         super().__init__(f"{user_id} cookies not found")
 
 
+class CredentialBundle(NamedTuple):
+    """创建 GenshinClient 所需的玩家、Cookies 与设备信息"""
+
+    player: Player
+    cookies: Cookies
+    devices: Optional[Devices]
+
+    def copy(self) -> "CredentialBundle":
+        """复制一份与缓存互不影响的凭据，修改后仍可交给对应的 Service 写回数据库"""
+        return CredentialBundle(*(_detached_copy(i) for i in self))
+
+
+def _detached_copy(instance: Optional[SQLModel]) -> Optional[SQLModel]:
+    """复制数据库模型，副本处于 detached 状态，与从已关闭的 Session 中查询得到的对象相同"""
+    if instance is None:
+        return None
+    copied = type(instance)(**deepcopy(instance.dict()))
+    make_transient_to_detached(copied)
+    return copied
+
+
+class CredentialCache:
+    """按用户缓存 CredentialBundle，Cookies 或设备信息更新时需要调用 invalidate"""
+
+    ttl: float = 300
+    """缓存的有效时间（秒）"""
+
+    maxsize: int = 4096
+    """最多缓存的用户数量"""
+
+    def __init__(self):
+        self._data: "OrderedDict[int, Dict[Optional[RegionEnum], Tuple[float, CredentialBundle]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, region: Optional[RegionEnum] = None) -> Optional[CredentialBundle]:
+        entry = self._data.get(user_id, {}).get(region)
+        if entry is None or entry[0] < time_.monotonic():
+            self.misses += 1
+            return None
+        self._data.move_to_end(user_id)
+        self.hits += 1
+        return entry[1].copy()
+
+    def set(self, user_id: int, region: Optional[RegionEnum], bundle: CredentialBundle) -> None:
+        self._data.setdefault(user_id, {})[region] = (time_.monotonic() + self.ttl, bundle.copy())
+        self._data.move_to_end(user_id)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        self._data.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class _BorrowedTransport(AsyncBaseTransport):
+    """借用 TransportPool 中的连接池，客户端关闭时不会关闭连接池"""
+
+    def __init__(self, pool: "TransportPool", transport: AsyncHTTPTransport):
+        self.pool = pool
+        self.transport = transport
+
+    async def handle_async_request(self, request: Request) -> Response:
+        response = await self.transport.handle_async_request(request)
+        self.pool.record(response)
+        return response
+
+    async def aclose(self) -> None:
+        pass
+
+
+class TransportPool:
+    """按服务器区域共享的长连接池，避免每次请求都重新进行 TLS 握手"""
+
+    limits = Limits(max_connections=200, max_keepalive_connections=50, keepalive_expiry=60)
+    """每个区域连接池的连接数限制"""
+
+    def __init__(self):
+        self._transports: Dict[Region, AsyncHTTPTransport] = {}
+        self._connections: "weakref.WeakSet" = weakref.WeakSet()
+        self.requests = 0
+        self.connections = 0
+
+    def get(self, region: Region) -> AsyncBaseTransport:
+        transport = self._transports.get(region)
+        if transport is None:
+            transport = self._transports[region] = AsyncHTTPTransport(limits=self.limits)
+        return _BorrowedTransport(self, transport)
+
+    def bind(self, client: BaseClient) -> BaseClient:
+        """让客户端使用共享的连接池
+
+        simnet 不支持传入 transport，因此使用相同的 Cookies 与超时设置重新创建 AsyncClient，
+        原有的 AsyncClient 尚未发出过请求，直接丢弃即可
+        """
+        origin = client.client
+        client.client = AsyncClient(cookies=origin.cookies, timeout=origin.timeout, transport=self.get(client.region))
+        return client
+
+    def record(self, response: Response) -> None:
+        """根据响应所使用的网络连接统计连接复用情况"""
+        self.requests += 1
+        stream = response.extensions.get("network_stream")
+        if stream is not None and stream not in self._connections:
+            self._connections.add(stream)
+            self.connections += 1
+
+    @property
+    def reuse_rate(self) -> float:
+        """复用已有连接的请求所占的比例"""
+        return 1 - self.connections / self.requests if self.requests else 0.0
+
+    async def aclose(self) -> None:
+        transports, self._transports = self._transports, {}
+        for transport in transports.values():
+            await transport.aclose()
+
+
 class GenshinHelper(Plugin):
     def __init__(
         self,
@@ -214,22 +507,50 @@ class GenshinHelper(Plugin):
         self.user_service = user
         self.players_service = player
         self.devices_service = devices
+        self.credentials = CredentialCache()
+        self.transports = TransportPool()
         if None in (temp := [self.user_service, self.cookies_service, self.players_service]):
             raise ServiceNotFoundError(*filter(lambda x: x is None, temp))
 
-    @asynccontextmanager
-    async def genshin(self, user_id: int, region: Optional[RegionEnum] = None) -> GenshinClient:  # skipcq: PY-R1000 #
+    async def shutdown(self) -> None:
+        logger.info("凭据缓存命中率 %.2f%%，连接复用率 %.2f%%", self.credentials.hit_rate * 100, self.transports.reuse_rate * 100)
+        await self.transports.aclose()
+
+    def get_metrics(self) -> Dict[str, float]:
+        return {
+            "credential_hits": self.credentials.hits,
+            "credential_misses": self.credentials.misses,
+            "credential_hit_rate": self.credentials.hit_rate,
+            "transport_requests": self.transports.requests,
+            "transport_connections": self.transports.connections,
+            "transport_reuse_rate": self.transports.reuse_rate,
+        }
+
+    def invalidate_credentials(self, user_id: int) -> None:
+        """用户的玩家、Cookies 或设备信息发生变化后需要调用"""
+        self.credentials.invalidate(user_id)
+
+    async def get_credentials(self, user_id: int, region: Optional[RegionEnum] = None) -> CredentialBundle:
+        if (bundle := self.credentials.get(user_id, region)) is not None:
+            return bundle
         player = await self.players_service.get_player(user_id, region)
         if player is None:
             raise PlayerNotFoundError(user_id)
 
         if player.account_id is None:
             raise CookiesNotFoundError(user_id, player.region)
-        cookie_model = await self.cookies_service.get(player.user_id, player.account_id, player.region)
+        cookie_model, devices = await asyncio.gather(
+            self.cookies_service.get(player.user_id, player.account_id, player.region),
+            self.devices_service.get(player.account_id),
+        )
         if cookie_model is None:
             raise CookiesNotFoundError(user_id, player.region)
-        cookies = cookie_model.data
+        bundle = CredentialBundle(player, cookie_model, devices)
+        self.credentials.set(user_id, region, bundle)
+        return bundle
 
+    def create_client(self, bundle: CredentialBundle) -> GenshinClient:
+        player, cookie_model, devices = bundle
         if player.region == RegionEnum.HYPERION:  # 国服
             region = Region.CHINESE
         elif player.region == RegionEnum.HOYOLAB:  # 国际服
@@ -239,28 +560,36 @@ class GenshinHelper(Plugin):
 
         device_id: Optional[str] = None
         device_fp: Optional[str] = None
-        devices = await self.devices_service.get(player.account_id)
         if devices:
             device_id = devices.device_id
             device_fp = devices.device_fp
 
-        async with GenshinClient(
-            cookies,
+        client = GenshinClient(
+            cookie_model.data,
             region=region,
             account_id=player.account_id,
             player_id=player.player_id,
             lang="zh-cn",
             device_id=device_id,
             device_fp=device_fp,
-        ) as client:
+        )
+        return self.transports.bind(client)
+
+    @asynccontextmanager
+    async def genshin(self, user_id: int, region: Optional[RegionEnum] = None) -> GenshinClient:  # skipcq: PY-R1000 #
+        _, cookie_model, devices = bundle = await self.get_credentials(user_id, region)
+
+        async with self.create_client(bundle) as client:
             try:
                 yield client
             except SimnetBadRequest as exc:
                 if exc.ret_code == 1034 and devices is not None:
                     devices.is_valid = False
+                    self.invalidate_credentials(user_id)
                     await self.devices_service.update(devices)
                 raise exc
             except InvalidCookies as exc:
+                self.invalidate_credentials(user_id)
                 refresh = False
                 cookie_model.status = CookiesStatusEnum.INVALID_COOKIES
                 stoken = client.cookies.get("stoken")
@@ -301,40 +630,7 @@ class GenshinHelper(Plugin):
                 raise exc
 
     async def get_genshin_client(self, user_id: int, region: Optional[RegionEnum] = None) -> GenshinClient:
-        player = await self.players_service.get_player(user_id, region)
-        if player is None:
-            raise PlayerNotFoundError(user_id)
-
-        if player.account_id is None:
-            raise CookiesNotFoundError(user_id, player.region)
-        cookie_model = await self.cookies_service.get(player.user_id, player.account_id, player.region)
-        if cookie_model is None:
-            raise CookiesNotFoundError(user_id, player.region)
-        cookies = cookie_model.data
-
-        if player.region == RegionEnum.HYPERION:
-            region = Region.CHINESE
-        elif player.region == RegionEnum.HOYOLAB:
-            region = Region.OVERSEAS
-        else:
-            raise TypeError("Region is not None")
-
-        device_id: Optional[str] = None
-        device_fp: Optional[str] = None
-        devices = await self.devices_service.get(player.account_id)
-        if devices:
-            device_id = devices.device_id
-            device_fp = devices.device_fp
-
-        return GenshinClient(
-            cookies,
-            region=region,
-            account_id=player.account_id,
-            player_id=player.player_id,
-            lang="zh-cn",
-            device_id=device_id,
-            device_fp=device_fp,
-        )
+        return self.create_client(await self.get_credentials(user_id, region))
 
     @asynccontextmanager
     async def public_genshin(
@@ -362,14 +658,15 @@ class GenshinHelper(Plugin):
             device_id = devices.device_id
             device_fp = devices.device_fp
 
-        async with GenshinClient(
+        client = GenshinClient(
             cookies.data,
             region=region,
             player_id=uid,
             lang="zh-cn",
             device_id=device_id,
             device_fp=device_fp,
-        ) as client:
+        )
+        async with self.transports.bind(client):
             try:
                 yield client
             except SimnetBadRequest as exc:
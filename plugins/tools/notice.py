@@ -0,0 +1,235 @@
+import asyncio
+import time
+from asyncio import QueueEmpty
+from collections import defaultdict
+from typing import Dict, List, Optional, Protocol, Tuple, TYPE_CHECKING
+
+from sqlalchemy.orm.exc import StaleDataError
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+from core.plugin import Plugin
+from core.services.task.models import TaskStatusEnum
+from utils.log import logger
+from utils.models.rate_limit import TokenBucket
+from utils.queues import Queue
+
+if TYPE_CHECKING:
+    from core.services.task.models import Task as TaskUser
+
+__all__ = ("NoticeSystem", "NoticeItem")
+
+
+class TaskUpdater(Protocol):
+    async def update(self, task: "TaskUser"):
+        ...
+
+
+class NoticeItem:
+    """一条待发送的通知
+
+    Args:
+        chat_id: 发送的目标会话
+        text: 通知内容（HTML）
+        user_id: 通知对应的用户，在群组中发送时会附带提醒
+        tasks: 发送完成后需要写回状态的任务数据以及对应的服务
+        name: 任务名称，仅用于日志
+    """
+
+    __slots__ = ("chat_id", "text", "user_id", "tasks", "name")
+
+    def __init__(
+        self,
+        chat_id: int,
+        text: str,
+        user_id: Optional[int] = None,
+        tasks: Optional[List[Tuple[TaskUpdater, "TaskUser"]]] = None,
+        name: str = "通知",
+    ):
+        self.chat_id = chat_id
+        self.text = text
+        self.user_id = user_id
+        self.tasks = tasks or []
+        self.name = name
+
+    @property
+    def html(self) -> str:
+        if self.chat_id < 0 and self.user_id:
+            return f'<a href="tg://user?id={self.user_id}">NOTICE {self.user_id}</a>\n\n{self.text}'
+        return self.text
+
+
+class NoticeStats:
+    """通知发送统计"""
+
+    def __init__(self):
+        self.sent = 0
+        self.merged = 0
+        self.failed = 0
+        self.retried = 0
+
+    def __str__(self) -> str:
+        return f"发送[{self.sent}] 合并[{self.merged}] 失败[{self.failed}] 重试[{self.retried}]"
+
+
+class NoticeSystem(Plugin):
+    """定时任务通知的统一发送队列
+
+    定时任务将通知放入队列后即可继续执行，由后台的发送协程统一发送。
+    发送时遵守 Telegram 的全局与单会话频率限制，同一会话的多条通知会被合并为一条消息，
+    遇到 ``RetryAfter`` 会按照退避时间重试，发送结果对应的任务状态会在每轮发送后批量写回。
+    """
+
+    global_rate: float = 25
+    """全局每秒最多发送的消息数"""
+    private_interval: float = 1
+    """私聊中两条消息的最小间隔（秒）"""
+    group_interval: float = 3
+    """群组中两条消息的最小间隔（秒）"""
+    coalesce_delay: float = 1
+    """收到通知后等待更多通知以便合并的时间（秒）"""
+    max_concurrency: int = 16
+    """同时发送的会话数量"""
+    max_retries: int = 5
+    """发送失败时的最大重试次数"""
+    max_length: int = 4096
+    """单条消息的最大长度"""
+
+    def __init__(self):
+        self.queue: Optional[Queue[NoticeItem]] = None
+        self.stats = NoticeStats()
+        self._bucket = TokenBucket(self.global_rate, self.global_rate)
+        self._last_sent: Dict[int, float] = {}
+        self._paused_until: float = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def initialize(self) -> None:
+        self.queue = Queue()
+        self._task = asyncio.create_task(self._drain())
+
+    async def shutdown(self) -> None:
+        if self.queue is not None and self.queue.async_q.unfinished_tasks:
+            logger.info("正在发送剩余的 %s 条通知", self.queue.async_q.unfinished_tasks)
+            try:
+                await asyncio.wait_for(self.queue.async_q.join(), timeout=30)
+            except asyncio.TimeoutError:
+                logger.warning("发送剩余通知超时")
+        if self._task is not None:
+            self._task.cancel()
+        if self.queue is not None:
+            self.queue.close()
+
+    async def push(self, item: NoticeItem) -> None:
+        """将通知放入发送队列"""
+        await self.queue.async_q.put(item)
+
+    async def join(self) -> None:
+        """等待队列中的通知全部发送完毕"""
+        await self.queue.async_q.join()
+
+    async def _drain(self):
+        while True:
+            items = [await self.queue.async_q.get()]
+            await asyncio.sleep(self.coalesce_delay)
+            while True:
+                try:
+                    items.append(self.queue.async_q.get_nowait())
+                except QueueEmpty:
+                    break
+            try:
+                await self._send_items(items)
+            except Exception as exc:
+                logger.error("发送通知时发生错误", exc_info=exc)
+            finally:
+                for _ in items:
+                    self.queue.async_q.task_done()
+
+    def _coalesce(self, items: List[NoticeItem]) -> Dict[int, List[List[NoticeItem]]]:
+        """按照会话合并通知，合并后的每条消息不超过 max_length"""
+        chats: Dict[int, List[List[NoticeItem]]] = defaultdict(list)
+        lengths: Dict[int, int] = {}
+        for item in items:
+            messages = chats[item.chat_id]
+            length = len(item.html)
+            if messages and lengths[item.chat_id] + length + 2 <= self.max_length:
+                messages[-1].append(item)
+                lengths[item.chat_id] += length + 2
+                self.stats.merged += 1
+            else:
+                messages.append([item])
+                lengths[item.chat_id] = length
+        return chats
+
+    async def _send_items(self, items: List[NoticeItem]):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def send_chat(_chat_id: int, _messages: List[List[NoticeItem]]):
+            async with semaphore:
+                for message in _messages:
+                    await self._send_message(_chat_id, message)
+
+        chats = self._coalesce(items)
+        await asyncio.gather(*(send_chat(chat_id, messages) for chat_id, messages in chats.items()))
+        await self._update_tasks(items)
+
+    async def _wait_chat(self, chat_id: int):
+        interval = self.group_interval if chat_id < 0 else self.private_interval
+        now = time.monotonic()
+        wait = max(self._last_sent.get(chat_id, 0) + interval, self._paused_until) - now
+        if wait > 0:
+            await asyncio.sleep(wait)
+        await self._bucket.acquire()
+        self._last_sent[chat_id] = time.monotonic()
+
+    async def _send_message(self, chat_id: int, message: List[NoticeItem]):
+        text = "\n\n".join(item.html for item in message)
+        name = message[0].name
+        status = None
+        for retry in range(self.max_retries + 1):
+            await self._wait_chat(chat_id)
+            try:
+                await self.application.bot.send_message(chat_id, text, parse_mode=ParseMode.HTML)
+            except RetryAfter as exc:
+                delay = exc.retry_after * (retry + 1)
+                logger.warning("发送%s触发限流 chat_id[%s] 将在 %ss 后重试", name, chat_id, delay)
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                self.stats.retried += 1
+                continue
+            except BadRequest as exc:
+                logger.error("发送%s时发生错误 chat_id[%s] Message[%s]", name, chat_id, exc.message)
+                status = TaskStatusEnum.BAD_REQUEST
+                break
+            except (TimedOut, NetworkError):
+                logger.warning("发送%s超时 chat_id[%s] 将进行重试", name, chat_id)
+                self.stats.retried += 1
+                await asyncio.sleep(2**retry)
+                continue
+            except Forbidden as exc:
+                logger.error("发送%s时发生错误 chat_id[%s] message[%s]", name, chat_id, exc.message)
+                status = TaskStatusEnum.FORBIDDEN
+                break
+            except Exception as exc:
+                logger.error("发送%s时发生错误 chat_id[%s]", name, chat_id, exc_info=exc)
+                break
+            else:
+                status = TaskStatusEnum.STATUS_SUCCESS
+                break
+        if status == TaskStatusEnum.STATUS_SUCCESS:
+            self.stats.sent += 1
+        else:
+            self.stats.failed += 1
+        if status is not None:
+            for item in message:
+                for _, task_db in item.tasks:
+                    task_db.status = status
+
+    async def _update_tasks(self, items: List[NoticeItem]):
+        """批量写回任务状态"""
+        for item in items:
+            for service, task_db in item.tasks:
+                try:
+                    await service.update(task_db)
+                except StaleDataError:
+                    logger.warning("用户 user_id[%s] %s数据过期，跳过更新数据", task_db.user_id, item.name)
+                except Exception as exc:
+                    logger.error("用户 user_id[%s] %s数据更新失败", task_db.user_id, item.name, exc_info=exc)
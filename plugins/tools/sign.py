@@ -2,17 +2,15 @@ import asyncio
 import datetime
 import random
 import time
+from collections import deque
 from enum import Enum
-from typing import Optional, Tuple, List, TYPE_CHECKING
+from typing import Dict, Optional, Tuple, List, TYPE_CHECKING
 
 from httpx import TimeoutException
 from simnet import Game
 from simnet.errors import BadRequest as SimnetBadRequest, AlreadyClaimed, InvalidCookies, TimedOut as SimnetTimedOut
 from simnet.utils.player import recognize_genshin_server
-from sqlalchemy.orm.exc import StaleDataError
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.constants import ParseMode
-from telegram.error import Forbidden, BadRequest
 
 from core.config import config
 from core.dependence.redisdb import RedisDB
@@ -23,12 +21,15 @@ from core.services.task.services import SignServices
 from core.services.users.services import UserService
 from modules.apihelper.client.components.verify import Verify
 from plugins.tools.genshin import PlayerNotFoundError, CookiesNotFoundError, GenshinHelper
+from plugins.tools.notice import NoticeItem, NoticeSystem
 from plugins.tools.recognize import RecognizeSystem
 from utils.log import logger
+from utils.models.rate_limit import TokenBucket
 
 if TYPE_CHECKING:
     from simnet import GenshinClient
     from telegram.ext import ContextTypes
+    from core.services.task.models import Task as TaskUser
 
 
 class SignJobType(Enum):
@@ -50,7 +51,55 @@ class NeedChallenge(Exception):
         self.challenge = challenge
 
 
+class SignJobStats:
+    """自动签到任务的进度统计"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.need_challenge = 0
+        self.start_time = time.monotonic()
+
+    def count(self, status: TaskStatusEnum):
+        if status in (TaskStatusEnum.STATUS_SUCCESS, TaskStatusEnum.ALREADY_CLAIMED):
+            self.done += 1
+        elif status == TaskStatusEnum.NEED_CHALLENGE:
+            self.need_challenge += 1
+        else:
+            self.failed += 1
+
+    @property
+    def finished(self) -> int:
+        return self.done + self.failed + self.need_challenge
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start_time
+
+    @property
+    def speed(self) -> float:
+        """每分钟处理的账号数"""
+        elapsed = self.elapsed
+        return self.finished * 60 / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.finished}/{self.total} 成功[{self.done}] 失败[{self.failed}] "
+            f"验证码[{self.need_challenge}] 耗时[{self.elapsed:.0f}s] 速度[{self.speed:.1f}/min]"
+        )
+
+
 class SignSystem(Plugin):
+    sign_job_workers: int = 16
+    """自动签到并发的 worker 数量"""
+    sign_job_window: float = 30 * 60
+    """自动签到开始时间随机分散的窗口大小（秒）"""
+    sign_job_rate: Dict[str, Tuple[float, float]] = {"cn": (1.0, 3.0), "os": (5.0, 10.0)}
+    """自动签到各区域的令牌桶限流参数 (每秒请求数, 桶容量)"""
+    requests_per_sign: int = 3
+    """签到单个账号至少发起的请求数：获取奖励列表、获取签到状态与签到"""
+
     def __init__(
         self,
         redis: RedisDB,
@@ -58,7 +107,9 @@ class SignSystem(Plugin):
         cookies_service: CookiesService,
         sign_service: SignServices,
         genshin_helper: GenshinHelper,
+        notice_system: NoticeSystem,
     ):
+        self.notice_system = notice_system
         self.cookies_service = cookies_service
         self.user_service = user_service
         self.sign_service = sign_service
@@ -66,6 +117,14 @@ class SignSystem(Plugin):
         self.cache = redis.client
         self.qname = "plugin:sign:"
         self.verify = Verify()
+        self.sign_limiters: Dict[str, TokenBucket] = {
+            region: TokenBucket(rate, max(capacity, self.requests_per_sign))
+            for region, (rate, capacity) in self.sign_job_rate.items()
+        }
+
+    def get_sign_limiter(self, player_id: int) -> TokenBucket:
+        region = "cn" if recognize_genshin_server(player_id) in ("cn_gf01", "cn_qd01") else "os"
+        return self.sign_limiters[region]
 
     async def get_challenge(self, uid: int) -> Tuple[Optional[str], Optional[str]]:
         data = await self.cache.get(f"{self.qname}{uid}")
@@ -269,7 +328,71 @@ class SignSystem(Plugin):
         )
         return message
 
-    async def do_sign_job(self, context: "ContextTypes.DEFAULT_TYPE", job_type: SignJobType):
+    async def _sign_one(
+        self,
+        sign_db: "TaskUser",
+        title: str,
+        stats: "SignJobStats",
+    ) -> None:
+        """执行单个用户的自动签到，并将结果放入通知队列"""
+        user_id = sign_db.user_id
+        try:
+            async with self.genshin_helper.genshin(user_id) as client:
+                await self.get_sign_limiter(client.player_id).acquire(self.requests_per_sign)
+                text = await self.start_sign(client, is_raise=True, title=title)
+        except InvalidCookies:
+            text = "自动签到执行失败，Cookie无效"
+            sign_db.status = TaskStatusEnum.INVALID_COOKIES
+        except AlreadyClaimed:
+            text = "今天旅行者已经签到过了~"
+            sign_db.status = TaskStatusEnum.ALREADY_CLAIMED
+        except SimnetBadRequest as exc:
+            text = f"自动签到执行失败，API返回信息为 {str(exc)}"
+            sign_db.status = TaskStatusEnum.GENSHIN_EXCEPTION
+        except SimnetTimedOut:
+            text = "签到失败了呜呜呜 ~ 服务器连接超时 服务器熟啦 ~ "
+            sign_db.status = TaskStatusEnum.TIMEOUT_ERROR
+        except NeedChallenge:
+            text = "签到失败，触发验证码风控"
+            sign_db.status = TaskStatusEnum.NEED_CHALLENGE
+        except PlayerNotFoundError:
+            logger.info("用户 user_id[%s] 玩家不存在 关闭并移除自动签到", user_id)
+            await self.sign_service.remove(sign_db)
+            stats.failed += 1
+            return
+        except CookiesNotFoundError:
+            logger.info("用户 user_id[%s] cookie 不存在 关闭并移除自动签到", user_id)
+            await self.sign_service.remove(sign_db)
+            stats.failed += 1
+            return
+        except Exception as exc:
+            logger.error("执行自动签到时发生错误 user_id[%s]", user_id, exc_info=exc)
+            text = "签到失败了呜呜呜 ~ 执行自动签到时发生错误"
+        else:
+            sign_db.status = TaskStatusEnum.STATUS_SUCCESS
+        stats.count(sign_db.status)
+        await self.notice_system.push(
+            NoticeItem(sign_db.chat_id, text, user_id, tasks=[(self.sign_service, sign_db)], name=title)
+        )
+
+    async def do_sign_job(
+        self,
+        context: "ContextTypes.DEFAULT_TYPE",
+        job_type: SignJobType,
+        window: Optional[float] = None,
+    ) -> "SignJobStats":
+        """执行自动签到任务
+
+        所有用户的开始时间会在 ``window`` 秒的时间窗口内随机分散，
+        由 ``sign_job_workers`` 个 worker 并发执行，并按照服务器区域进行令牌桶限流。
+
+        Args:
+            context: 回调上下文
+            job_type: 签到任务类型
+            window: 开始时间分散的窗口大小（秒），默认为 ``sign_job_window``
+        Returns:
+            本次签到任务的统计信息
+        """
         include_status: List[TaskStatusEnum] = [
             TaskStatusEnum.STATUS_SUCCESS,
             TaskStatusEnum.TIMEOUT_ERROR,
@@ -282,58 +405,37 @@ class SignSystem(Plugin):
             include_status.remove(TaskStatusEnum.STATUS_SUCCESS)
         else:
             raise ValueError
-        sign_list = await self.sign_service.get_all()
-        for sign_db in sign_list:
-            if sign_db.status not in include_status:
-                continue
-            user_id = sign_db.user_id
-            try:
-                async with self.genshin_helper.genshin(user_id) as client:
-                    text = await self.start_sign(client, is_sleep=True, is_raise=True, title=title)
-            except InvalidCookies:
-                text = "自动签到执行失败，Cookie无效"
-                sign_db.status = TaskStatusEnum.INVALID_COOKIES
-            except AlreadyClaimed:
-                text = "今天旅行者已经签到过了~"
-                sign_db.status = TaskStatusEnum.ALREADY_CLAIMED
-            except SimnetBadRequest as exc:
-                text = f"自动签到执行失败，API返回信息为 {str(exc)}"
-                sign_db.status = TaskStatusEnum.GENSHIN_EXCEPTION
-            except SimnetTimedOut:
-                text = "签到失败了呜呜呜 ~ 服务器连接超时 服务器熟啦 ~ "
-                sign_db.status = TaskStatusEnum.TIMEOUT_ERROR
-            except NeedChallenge:
-                text = "签到失败，触发验证码风控"
-                sign_db.status = TaskStatusEnum.NEED_CHALLENGE
-            except PlayerNotFoundError:
-                logger.info("用户 user_id[%s] 玩家不存在 关闭并移除自动签到", user_id)
-                await self.sign_service.remove(sign_db)
-                continue
-            except CookiesNotFoundError:
-                logger.info("用户 user_id[%s] cookie 不存在 关闭并移除自动签到", user_id)
-                await self.sign_service.remove(sign_db)
-                continue
-            except Exception as exc:
-                logger.error("执行自动签到时发生错误 user_id[%s]", user_id, exc_info=exc)
-                text = "签到失败了呜呜呜 ~ 执行自动签到时发生错误"
-            else:
-                sign_db.status = TaskStatusEnum.STATUS_SUCCESS
-            if sign_db.chat_id < 0:
-                text = f'<a href="tg://user?id={sign_db.user_id}">NOTICE {sign_db.user_id}</a>\n\n{text}'
-            try:
-                await context.bot.send_message(sign_db.chat_id, text, parse_mode=ParseMode.HTML)
-            except BadRequest as exc:
-                logger.error("执行自动签到时发生错误 user_id[%s] Message[%s]", user_id, exc.message)
-                sign_db.status = TaskStatusEnum.BAD_REQUEST
-            except Forbidden as exc:
-                logger.error("执行自动签到时发生错误 user_id[%s] message[%s]", user_id, exc.message)
-                sign_db.status = TaskStatusEnum.FORBIDDEN
-            except Exception as exc:
-                logger.error("执行自动签到时发生错误 user_id[%s]", user_id, exc_info=exc)
-                continue
-            else:
-                sign_db.status = TaskStatusEnum.STATUS_SUCCESS
-            try:
-                await self.sign_service.update(sign_db)
-            except StaleDataError:
-                logger.warning("用户 user_id[%s] 自动签到数据过期，跳过更新数据", user_id)
+        sign_list = [sign_db for sign_db in await self.sign_service.get_all() if sign_db.status in include_status]
+        stats = SignJobStats(len(sign_list))
+        if not sign_list:
+            return stats
+        window = self.sign_job_window if window is None else window
+        schedule = deque(sorted(((random.uniform(0, window), i) for i in sign_list), key=lambda x: x[0]))  # nosec
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+
+        async def worker():
+            while schedule:
+                delay, sign_db = schedule.popleft()
+                wait = start_time + delay - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                try:
+                    await self._sign_one(sign_db, title, stats)
+                except Exception as exc:
+                    logger.error("执行自动签到时发生错误 user_id[%s]", sign_db.user_id, exc_info=exc)
+                    stats.failed += 1
+
+        async def reporter():
+            while True:
+                await asyncio.sleep(60)
+                logger.info("%s进度 %s", title, stats)
+
+        reporter_task = asyncio.create_task(reporter())
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.sign_job_workers, len(sign_list)))))
+            await self.notice_system.join()
+        finally:
+            reporter_task.cancel()
+        logger.info("%s完成 %s", title, stats)
+        return stats
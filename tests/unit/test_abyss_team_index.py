@@ -0,0 +1,66 @@
+import logging
+import random
+import time
+
+from modules.apihelper.client.components.abyss import AbyssTeamIndex
+
+LOGGER = logging.getLogger(__name__)
+
+
+def gen_floor(num: int, characters: int = 60, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    return {
+        lane: [
+            {"Item": ",".join(str(10000002 + i) for i in rng.sample(range(characters), 4)), "Rate": rng.random()}
+            for _ in range(num)
+        ]
+        for lane in ("Up", "Down")
+    }
+
+
+def brute_force(data: dict, characters: set, k: int, allow_overlap: bool = False) -> list:
+    teams = {
+        lane: [
+            (tuple(int(i) for i in team["Item"].split(",")), team["Rate"])
+            for team in data[lane]
+            if all(int(i) in characters for i in team["Item"].split(","))
+        ]
+        for lane in ("Up", "Down")
+    }
+    pairs = [
+        (up, down) for up in teams["Up"] for down in teams["Down"] if allow_overlap or not set(up[0]) & set(down[0])
+    ]
+    pairs.sort(key=lambda x: x[0][1] * x[1][1], reverse=True)
+    return [round(up[1] * down[1], 12) for up, down in pairs[:k]]
+
+
+class TestAbyssTeamIndex:
+    @staticmethod
+    def test_top_pairs_matches_brute_force():
+        data = gen_floor(300)
+        index = AbyssTeamIndex(data)
+        characters = set(random.Random(1).sample(range(10000002, 10000062), 45))
+        for allow_overlap in (False, True):
+            pairs = index.top_pairs(characters, 8, allow_overlap)
+            assert [round(up.rate * down.rate, 12) for up, down in pairs] == brute_force(
+                data, characters, 8, allow_overlap
+            )
+            for up, down in pairs:
+                assert set(up.characters) <= characters and set(down.characters) <= characters
+                assert allow_overlap or not set(up.characters) & set(down.characters)
+        assert not index.top_pairs(set(), 4)
+
+    @staticmethod
+    def test_top_pairs_benchmark():
+        index = AbyssTeamIndex(gen_floor(2000))
+        characters = set(range(10000002, 10000062))
+        start = time.perf_counter()
+        for _ in range(100):
+            fast = index.top_pairs(characters, 4, allow_overlap=True)
+        fast_time = (time.perf_counter() - start) / 100
+        start = time.perf_counter()
+        for _ in range(100):
+            default = index.top_pairs(characters, 4)
+        default_time = (time.perf_counter() - start) / 100
+        LOGGER.info("top 4 of 2000x2000 teams: fast %.3fms, default %.3fms", fast_time * 1000, default_time * 1000)
+        assert len(fast) == len(default) == 4
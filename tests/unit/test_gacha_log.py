@@ -0,0 +1,326 @@
+import datetime
+import json
+import logging
+import random
+import time
+from pathlib import Path
+from typing import List
+
+import pytest
+from simnet.models.genshin.wish import BannerType
+
+from metadata.pool.pool import get_pool_by_id, get_pool_index
+from modules.gacha_log import log as gacha_log_module
+from modules.gacha_log.log import GachaLog
+from modules.gacha_log.models import GachaItem, GachaLogInfo, GachaLogSummary
+from modules.gacha_log.storage import BinaryGachaLogStorage, JsonGachaLogStorage
+from utils.record_file import RecordFileError
+
+LOGGER = logging.getLogger(__name__)
+
+GACHA_TYPES = {"301": "角色祈愿", "302": "武器祈愿", "200": "常驻祈愿"}
+FIVE_STAR = [("刻晴", "角色"), ("莫娜", "角色"), ("天空之翼", "武器")]
+FOUR_STAR = [("香菱", "角色"), ("行秋", "角色"), ("西风剑", "武器"), ("祭礼弓", "武器")]
+THREE_STAR = [("弹弓", "武器"), ("黎明神剑", "武器"), ("冷刃", "武器")]
+
+
+def gen_items(num: int, start_id: int = 1600000000000000000, seed: int = 0) -> List[GachaItem]:
+    """生成按时间排序的模拟抽卡记录"""
+    rng = random.Random(seed)
+    start_time = datetime.datetime(2020, 9, 28)
+    items = []
+    for i in range(num):
+        roll = rng.random()
+        if roll < 0.016:
+            name, item_type, rank_type = *rng.choice(FIVE_STAR), "5"
+        elif roll < 0.146:
+            name, item_type, rank_type = *rng.choice(FOUR_STAR), "4"
+        else:
+            name, item_type, rank_type = *rng.choice(THREE_STAR), "3"
+        items.append(
+            GachaItem.construct(
+                id=str(start_id + i),
+                name=name,
+                gacha_type=rng.choice(list(GACHA_TYPES)),
+                item_type=item_type,
+                rank_type=rank_type,
+                time=start_time + datetime.timedelta(minutes=i),
+            )
+        )
+    return items
+
+
+class FakeIconAssets:
+    """只记录批量查询次数的图标资源"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.prefetch_calls = 0
+        self.targets = 0
+
+    async def prefetch(self, targets, icon_types=None):
+        self.prefetch_calls += 1
+        self.targets += len(targets)
+        return {(target, "icon"): self.path / f"{target}.png" for target in targets}
+
+
+class FakeAssets:
+    def __init__(self, path: Path):
+        self.avatar = FakeIconAssets(path / "avatar")
+        self.weapon = FakeIconAssets(path / "weapon")
+
+
+def gen_gacha_log(items: List[GachaItem]) -> GachaLogInfo:
+    gacha_log = GachaLogInfo(user_id="1", uid="100000000", update_time=datetime.datetime.now())
+    gacha_log.item_list = {"角色祈愿": [], "武器祈愿": [], "常驻祈愿": [], "新手祈愿": []}
+    for item in items:
+        gacha_log.item_list[GACHA_TYPES[item.gacha_type]].append(item)
+    return gacha_log
+
+
+class TestGachaLogImport:
+    @staticmethod
+    def test_merge_items_keeps_order():
+        items = gen_items(1000)
+        old, new = items[::2], items[1::2]
+        merged = GachaLog.merge_items(old.copy(), list(reversed(new)))
+        assert [i.id for i in merged] == [i.id for i in items]
+
+    @staticmethod
+    @pytest.mark.parametrize("num", [50000])
+    def test_import_data_backend_benchmark(num: int):
+        history = gen_items(num)
+        gacha_log = gen_gacha_log(history[:-1000])
+        # 新导入的数据与已有数据部分重叠
+        all_items = history[-3000:]
+        temp_id_data = GachaLog.get_temp_id_data(gacha_log)
+        start = time.perf_counter()
+        new_items = GachaLog.import_data_backend(all_items, gacha_log, temp_id_data)
+        LOGGER.info(
+            "import %s items into %s items history: %.3fms", len(all_items), num, (time.perf_counter() - start) * 1000
+        )
+        assert len(new_items) == 1000
+        assert sum(len(i) for i in gacha_log.item_list.values()) == num
+        for pool in gacha_log.item_list.values():
+            assert pool == sorted(pool, key=lambda x: (x.time, x.id))
+
+
+class TestGachaLogSummary:
+    @staticmethod
+    def test_summary_incremental_update():
+        items = gen_items(5000)
+        summary = GachaLogSummary()
+        assert summary.update(gen_gacha_log(items[:4000])) == list(gen_gacha_log([]).item_list)
+        assert summary.update(gen_gacha_log(items)) == []
+        expected = GachaLogSummary()
+        expected.update(gen_gacha_log(items))
+        assert summary == expected
+
+    @staticmethod
+    def test_summary_rebuild_on_insert():
+        items = gen_items(5000)
+        summary = GachaLogSummary()
+        summary.update(gen_gacha_log(items[1000:]))
+        assert set(summary.update(gen_gacha_log(items))) == {"角色祈愿", "武器祈愿", "常驻祈愿"}
+        expected = GachaLogSummary()
+        expected.update(gen_gacha_log(items))
+        assert summary == expected
+
+    @staticmethod
+    @pytest.mark.asyncio
+    async def test_get_summary_follows_version(tmp_path):
+        items = gen_items(2000)
+        gacha_log = GachaLog(tmp_path)
+        await gacha_log.save_gacha_log_info("1", "100000000", gen_gacha_log(items[:1000]))
+        summary = await gacha_log.get_summary("1", "100000000")
+        assert summary.pools["角色祈愿"].total == sum(1 for i in items[:1000] if i.gacha_type == "301")
+        assert await gacha_log.get_summary("1", "100000000") is summary
+        full_log = gen_gacha_log(items)
+        await gacha_log.save_gacha_log_info("1", "100000000", full_log, items[1000:])
+        summary = await gacha_log.get_summary("1", "100000000")
+        assert summary.version == gacha_log.storage.version("1", "100000000")
+        assert summary.pools["角色祈愿"].total == len(full_log.item_list["角色祈愿"])
+
+    @staticmethod
+    @pytest.mark.asyncio
+    async def test_update_summary_keeps_cache_on_failure(tmp_path, monkeypatch):
+        items = gen_items(2000)
+        gacha_log = GachaLog(tmp_path)
+        await gacha_log.save_gacha_log_info("1", "100000000", gen_gacha_log(items[:1000]))
+        summary = await gacha_log.get_summary("1", "100000000")
+        expected = summary.copy(deep=True)
+        full_log = gen_gacha_log(items)
+        await gacha_log.save_gacha_log_info("1", "100000000", full_log, items[1000:])
+
+        async def save_json(*_):
+            raise OSError
+
+        monkeypatch.setattr(gacha_log, "save_json", save_json)
+        with pytest.raises(OSError):
+            await gacha_log.update_summary("1", "100000000", full_log)
+        # 写入失败时内存中的缓存保持不变
+        assert summary == expected
+        monkeypatch.undo()
+        summary = await gacha_log.get_summary("1", "100000000")
+        assert summary.pools["角色祈愿"].total == len(full_log.item_list["角色祈愿"])
+
+
+class TestGachaLogAnalysis:
+    @staticmethod
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("num", [5000])
+    async def test_analysis_benchmark(tmp_path, monkeypatch, num: int):
+        monkeypatch.setattr(GachaLog, "_icon_uris", {})
+        monkeypatch.setattr(gacha_log_module, "roleToId", lambda name: name)
+        monkeypatch.setattr(gacha_log_module, "weaponToId", lambda name: name)
+        gacha_log = GachaLog(tmp_path)
+        full_log = gen_gacha_log(gen_items(num))
+        await gacha_log.save_gacha_log_info("1", "100000000", full_log)
+        await gacha_log.update_summary("1", "100000000", full_log)
+        assets = FakeAssets(tmp_path)
+        start = time.perf_counter()
+        result = await gacha_log.get_analysis(1, 100000000, BannerType.CHARACTER1, assets)
+        cold_time = time.perf_counter() - start
+        pool_summary = (await gacha_log.get_summary("1", "100000000")).pools["角色祈愿"]
+        start = time.perf_counter()
+        for _ in range(10):
+            await gacha_log.get_all_4_star_items(pool_summary, assets)
+        warm_time = (time.perf_counter() - start) / 10
+        LOGGER.info(
+            "analysis of %s items (%s four stars): cold %.3fms, four stars warm %.3fms",
+            num,
+            len(pool_summary.four),
+            cold_time * 1000,
+            warm_time * 1000,
+        )
+        assert result["fiveLog"][0].icon.endswith(".png")
+        # 每种物品只查询一次图标
+        distinct = len(FIVE_STAR) + len(FOUR_STAR)
+        assert assets.avatar.targets + assets.weapon.targets <= distinct
+        assert assets.avatar.prefetch_calls + assets.weapon.prefetch_calls <= 4
+
+
+class TestPoolIndex:
+    @staticmethod
+    @pytest.mark.parametrize("pool_type", [200, 301, 302])
+    def test_find_matches_windows(pool_type: int):
+        pools = [
+            (
+                datetime.datetime.strptime(i["from"], "%Y-%m-%d %H:%M:%S"),
+                datetime.datetime.strptime(i["to"], "%Y-%m-%d %H:%M:%S"),
+            )
+            for i in get_pool_by_id(pool_type)
+        ]
+        index = get_pool_index(pool_type)
+        rng = random.Random(0)
+        times = [t for window in pools for t in window]
+        times += [
+            datetime.datetime(2020, 9, 1) + datetime.timedelta(seconds=rng.randrange(10**8)) for _ in range(5000)
+        ]
+        for gacha_time in times:
+            expected = tuple(idx for idx, (start, end) in enumerate(pools) if start <= gacha_time <= end)
+            assert index.find(gacha_time) == expected
+
+    @staticmethod
+    def test_avatar_up():
+        check_avatar_up = GachaLog.check_avatar_up
+        assert check_avatar_up("刻晴", datetime.datetime(2021, 2, 20))
+        assert not check_avatar_up("刻晴", datetime.datetime(2021, 4, 1))
+        assert check_avatar_up("迪希雅", datetime.datetime(2023, 3, 5))
+        assert not check_avatar_up("迪希雅", datetime.datetime(2023, 5, 1))
+        assert not check_avatar_up("莫娜", datetime.datetime(2023, 3, 5))
+        assert check_avatar_up("胡桃", datetime.datetime(2023, 10, 1))
+
+
+class TestGachaLogStorage:
+    @staticmethod
+    @pytest.mark.asyncio
+    async def test_binary_storage_append(tmp_path):
+        items = gen_items(2000)
+        storage = BinaryGachaLogStorage(tmp_path)
+        await storage.save("1", "100000000", gen_gacha_log(items[:1500]))
+        gacha_log = gen_gacha_log(items)
+        await storage.append("1", "100000000", gacha_log, items[1500:])
+        info = await storage.load("1", "100000000")
+        for pool_name, pool in gacha_log.item_list.items():
+            assert [i.dict() for i in info.item_list[pool_name]] == [i.dict() for i in pool]
+
+    @staticmethod
+    @pytest.mark.asyncio
+    async def test_binary_storage_append_after_broken_block(tmp_path):
+        items = gen_items(2000)
+        storage = BinaryGachaLogStorage(tmp_path)
+        file_path = storage.get_file_path("1", "100000000")
+        await storage.save("1", "100000000", gen_gacha_log(items[:1000]))
+        await storage.append("1", "100000000", gen_gacha_log(items[:1500]), items[1000:1500])
+        # 模拟写入数据块的过程中进程退出
+        with open(file_path, "r+b") as f:
+            f.truncate(file_path.stat().st_size - 7)
+        await storage.append("1", "100000000", gen_gacha_log(items), items[1500:])
+        info = await storage.load("1", "100000000")
+        expected = {i.id for i in items[:1000] + items[1500:]}
+        assert {i.id for pool in info.item_list.values() for i in pool} == expected
+
+    @staticmethod
+    @pytest.mark.asyncio
+    async def test_binary_storage_broken_string(tmp_path):
+        items = gen_items(1001)
+        new_item = items[-1].copy(update={"name": "不存在的角色名称"})
+        storage = BinaryGachaLogStorage(tmp_path)
+        file_path = storage.get_file_path("1", "100000000")
+        await storage.save("1", "100000000", gen_gacha_log(items[:1000]))
+        await storage.append("1", "100000000", gen_gacha_log(items[:1000] + [new_item]), [new_item])
+        # 模拟写入字符串的过程中进程退出，截断位置位于多字节字符的中间
+        data = file_path.read_bytes()
+        file_path.write_bytes(data[: data.index(new_item.name.encode("utf-8")) + 4])
+        info = await storage.load("1", "100000000")
+        assert sum(len(pool) for pool in info.item_list.values()) == 1000
+        await storage.append("1", "100000000", gen_gacha_log(items[:1000] + [new_item]), [new_item])
+        info = await storage.load("1", "100000000")
+        assert new_item.name in {i.name for pool in info.item_list.values() for i in pool}
+
+    @staticmethod
+    @pytest.mark.asyncio
+    async def test_binary_storage_restore_backup(tmp_path):
+        items = gen_items(2000)
+        storage = BinaryGachaLogStorage(tmp_path)
+        file_path = storage.get_file_path("1", "100000000")
+        await storage.save("1", "100000000", gen_gacha_log(items[:1000]))
+        await storage.save("1", "100000000", gen_gacha_log(items))
+        # 文件损坏时使用重写前的备份恢复
+        with open(file_path, "r+b") as f:
+            f.write(b"XXXX")
+        info = await storage.load("1", "100000000")
+        assert sum(len(pool) for pool in info.item_list.values()) == 1000
+        assert file_path.read_bytes() == file_path.with_name(f"{file_path.name}.bak").read_bytes()
+        # 备份也无法使用时不能当作没有记录
+        file_path.with_name(f"{file_path.name}.bak").unlink()
+        with open(file_path, "r+b") as f:
+            f.write(b"XXXX")
+        with pytest.raises(RecordFileError):
+            await storage.load("1", "100000000")
+
+    @staticmethod
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("num", [50000])
+    async def test_storage_benchmark(tmp_path, num: int):
+        gacha_log = gen_gacha_log(gen_items(num))
+        json_storage, bin_storage = JsonGachaLogStorage(tmp_path), BinaryGachaLogStorage(tmp_path)
+        start = time.perf_counter()
+        await json_storage.save("1", "100000000", gacha_log)
+        # 不经过 pydantic 校验，只计算 JSON 解析的耗时
+        json.loads(json_storage.get_file_path("1", "100000000").read_text(encoding="utf-8"))
+        json_time = time.perf_counter() - start
+        start = time.perf_counter()
+        await bin_storage.save("1", "100000000", gacha_log)
+        info = await bin_storage.load("1", "100000000")
+        bin_time = time.perf_counter() - start
+        LOGGER.info(
+            "save and load %s items: json %.3fms %sB, binary %.3fms %sB",
+            num,
+            json_time * 1000,
+            json_storage.get_file_path("1", "100000000").with_suffix(".json.bak").stat().st_size,
+            bin_time * 1000,
+            bin_storage.get_file_path("1", "100000000").stat().st_size,
+        )
+        assert sum(len(i) for i in info.item_list.values()) == num
@@ -0,0 +1,109 @@
+import datetime
+import logging
+import random
+import time
+
+import numpy as np
+import pytest
+
+from modules.gacha.banner import GachaBanner, GenshinBannerType
+from modules.gacha.error import GachaIllegalArgument
+from modules.gacha.player.banner import PlayerGachaBannerInfo
+from modules.gacha.pool import BannerPool
+from modules.gacha.simulator import BannerSimulator
+from modules.gacha.system import BannerSystem
+from modules.gacha_log.models import PoolSummary, SummaryItem
+
+LOGGER = logging.getLogger(__name__)
+
+
+def character_banner() -> GachaBanner:
+    return GachaBanner(
+        banner_type=GenshinBannerType.EVENT,
+        wish_max_progress=1,
+        rate_up_items5=[1046],
+        fallback_items5_pool1=[1003, 1016, 1035, 1041, 1042],
+    )
+
+
+def weapon_banner() -> GachaBanner:
+    return GachaBanner(
+        banner_type=GenshinBannerType.WEAPON,
+        wish_max_progress=2,
+        weight4=((1, 600), (7, 600), (10, 10000)),
+        weight5=((1, 70), (62, 70), (90, 10000)),
+        event_chance5=75,
+        rate_up_items5=[15511, 13509],
+        fallback_items5_pool1=[11501, 12501],
+        fallback_items5_pool2=[14501],
+    )
+
+
+def scalar_pulls(banner: GachaBanner, gacha_info: PlayerGachaBannerInfo, item_id: int, copies: int) -> int:
+    system = BannerSystem()
+    pools = BannerPool(banner)
+    gacha_info = gacha_info.copy()
+    pulls = got = 0
+    while got < copies:
+        pulls += 1
+        got += system.do_pull(banner, gacha_info, pools) == item_id
+    return pulls
+
+
+class TestBannerSimulator:
+    @staticmethod
+    @pytest.mark.parametrize(
+        "banner, gacha_info, item_id, copies, rounds",
+        [
+            (character_banner(), PlayerGachaBannerInfo(), 1046, 1, 2000),
+            (character_banner(), PlayerGachaBannerInfo(pity5=60, failed_featured_item_pulls=1), 1046, 2, 2000),
+            (weapon_banner(), PlayerGachaBannerInfo(wish_item_id=15511), 15511, 1, 2000),
+            (weapon_banner(), PlayerGachaBannerInfo(), 14501, 1, 500),
+        ],
+    )
+    def test_agrees_with_banner_system(banner, gacha_info, item_id, copies, rounds):
+        random.seed(0)
+        scalar = np.array([scalar_pulls(banner, gacha_info, item_id, copies) for _ in range(rounds)])
+        vectorized = BannerSimulator(banner, seed=0).simulate(gacha_info, item_id, copies, 10000, 200000)
+        # 两者均值之差以标准误差衡量，分位数允许少量偏差
+        stderr = np.sqrt(scalar.var() / scalar.size + vectorized.var() / vectorized.size)
+        assert abs(scalar.mean() - vectorized.mean()) < 4 * stderr
+        for q in (25, 50, 75):
+            assert abs(np.percentile(scalar, q) - np.percentile(vectorized, q)) <= 0.15 * np.percentile(vectorized, q)
+
+    @staticmethod
+    def test_forecast_from_pity():
+        simulator = BannerSimulator(character_banner(), seed=0)
+        guaranteed = simulator.forecast(PlayerGachaBannerInfo(pity5=89, failed_featured_item_pulls=1), 1046)
+        assert guaranteed.percentiles[99] == 1
+        forecast = simulator.forecast(PlayerGachaBannerInfo(), 1046, copies=3, max_pulls=200)
+        assert 0 < forecast.success_rate < 1
+        assert forecast.mean is None
+        assert forecast.percentiles[10] <= 200
+        assert forecast.percentiles[99] is None
+        with pytest.raises(GachaIllegalArgument):
+            simulator.forecast(PlayerGachaBannerInfo(), 15511)
+
+    @staticmethod
+    def test_info_from_pool_summary():
+        lost = SummaryItem(name="刻晴", type="角色", count=80, isUp=False, time=datetime.datetime(2023, 1, 1))
+        summary = PoolSummary(total=100, five=[lost], no_five_star=20)
+        assert PlayerGachaBannerInfo.from_pool_summary(summary).failed_featured_item_pulls == 1
+        assert PlayerGachaBannerInfo.from_pool_summary(summary, pool_name="常驻祈愿").failed_featured_item_pulls == 0
+        weapon = SummaryItem(name="天空之翼", type="武器", count=60, time=datetime.datetime(2023, 1, 1))
+        summary = PoolSummary(total=100, five=[weapon], no_five_star=40)
+        # 统计结果中没有武器是否为 UP 的信息
+        with pytest.raises(GachaIllegalArgument):
+            PlayerGachaBannerInfo.from_pool_summary(summary, pool_name="武器祈愿")
+        info = PlayerGachaBannerInfo.from_pool_summary(summary, guaranteed=True, pool_name="武器祈愿")
+        assert (info.pity5, info.failed_featured_item_pulls) == (40, 1)
+
+    @staticmethod
+    @pytest.mark.parametrize("rounds", [1000000])
+    def test_simulate_benchmark(rounds: int):
+        simulator = BannerSimulator(character_banner(), seed=0)
+        start = time.perf_counter()
+        forecast = simulator.forecast(PlayerGachaBannerInfo(pity5=30), 1046, copies=7, max_pulls=1260, rounds=rounds)
+        LOGGER.info("simulate %s rounds of C6: %.3fms", rounds, (time.perf_counter() - start) * 1000)
+        assert forecast.success_rate == 1
+        assert forecast.percentiles[50] < forecast.percentiles[99] <= 1260
@@ -0,0 +1,105 @@
+import logging
+import sys
+import threading
+import time
+
+from utils.log._queue import QueueHandler
+
+
+class SlowHandler(logging.Handler):
+    def __init__(self, level: int = logging.DEBUG, delay: float = 0):
+        super().__init__(level=level)
+        self.delay = delay
+        self.released = threading.Event()
+        self.messages = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.released.wait()
+        time.sleep(self.delay)
+        self.messages.append(record.getMessage())
+
+
+def make_record(msg: str, *args, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord("test", level, __file__, 0, msg, args, None)
+
+
+class TestQueueHandler:
+    @staticmethod
+    def test_dispatch_by_level():
+        debug, error = SlowHandler(), SlowHandler(logging.ERROR)
+        debug.released.set()
+        error.released.set()
+        handler = QueueHandler([debug, error])
+        args = ["a"]
+        handler.handle(make_record("info %s", args))
+        args.append("b")  # 参数在放入队列时已经格式化
+        handler.handle(make_record("error", level=logging.ERROR))
+        handler.flush()
+        handler.close()
+        assert debug.messages == ["info ['a']", "error"]
+        assert error.messages == ["error"]
+        assert handler.stats == {"queued": 2, "dropped": 0, "blocked": 0, "pending": 0}
+
+    @staticmethod
+    def test_drop_policy():
+        target = SlowHandler()
+        handler = QueueHandler([target], maxsize=10, policy="drop")
+        handler.block_timeout = 0.01
+        start = time.perf_counter()
+        for i in range(100):
+            handler.handle(make_record("info %s", i))
+        handler.handle(make_record("error", level=logging.ERROR))
+        emit_time = time.perf_counter() - start
+        target.released.set()
+        handler.flush()
+        handler.close()
+        stats = handler.stats
+        assert stats["queued"] + stats["dropped"] == 101
+        assert stats["blocked"] == 1  # 只有 ERROR 等级的 record 会等待队列空出
+        assert emit_time < 1
+        assert target.messages[-1] == f"日志队列已满，丢弃了 {stats['dropped']} 条日志"
+
+    @staticmethod
+    def test_block_policy():
+        target = SlowHandler(delay=0.001)
+        handler = QueueHandler([target], maxsize=2, policy="block")
+        target.released.set()
+        for i in range(20):
+            handler.handle(make_record("info %s", i))
+        handler.flush()
+        handler.close()
+        assert target.messages == [f"info {i}" for i in range(20)]
+        assert handler.stats["dropped"] == 0
+
+    @staticmethod
+    def test_prepare_exc_info():
+        target = SlowHandler()
+        handler = QueueHandler([target])
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.LogRecord("test", logging.ERROR, __file__, 0, "error", None, sys.exc_info())
+        handler.prepare(record)
+        handler.close()
+        # 异常信息在放入队列前已经渲染，不再持有 traceback
+        assert record.exc_info is None
+        assert "ValueError: boom" in record.exc_text
+
+    @staticmethod
+    def test_prepare_exc_snapshot():
+        target = SlowHandler()
+        target.rich_tracebacks = True
+        target.tracebacks_show_locals = True
+        handler = QueueHandler([target])
+        value = ["a"]
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.LogRecord("test", logging.ERROR, __file__, 0, "error", None, sys.exc_info())
+        handler.prepare(record)
+        handler.close()
+        value.append("b")  # 局部变量在捕获时已经保存为 repr
+        assert record.exc_info is None
+        assert record.exc_text is None
+        assert str(record.exc_snapshot) == "boom"
+        assert record.exc_snapshot.stack[-1].locals["value"] == "['a']"
@@ -0,0 +1,152 @@
+import json
+import logging
+import random
+import time
+
+import pytest
+
+from metadata.scripts.textmap import JsonArrayStream, TextMapExtractor
+from metadata.shortname import roleToId, roleToName, roleToTag, roles, weaponToName, weapons
+
+LOGGER = logging.getLogger(__name__)
+
+
+def linear_role_to_name(shortname: str) -> str:
+    shortname = str.casefold(shortname)
+    return next((value[0] for value in roles.values() for name in value if name == shortname), shortname)
+
+
+def linear_role_to_id(name: str):
+    name = str.casefold(name)
+    return next((key for key, value in roles.items() for n in value if n == name), None)
+
+
+def linear_weapon_to_name(shortname: str) -> str:
+    return next((key for key, value in weapons.items() if shortname == key or shortname in value), shortname)
+
+
+class TestShortname:
+    @staticmethod
+    def test_alias_lookup_matches_linear_scan():
+        role_aliases = [name for value in roles.values() for name in value] + ["不存在的角色", "WRIOTHESLEY"]
+        for name in role_aliases:
+            assert roleToName(name) == linear_role_to_name(name)
+            assert roleToId(name) == linear_role_to_id(name)
+        for value in roles.values():
+            assert roleToTag(value[0]) == value
+        weapon_aliases = list(weapons) + [name for value in weapons.values() for name in value] + ["不存在的武器"]
+        for name in weapon_aliases:
+            assert weaponToName(name) == linear_weapon_to_name(name)
+
+    @staticmethod
+    def test_alias_lookup_benchmark():
+        role_aliases = [name for value in roles.values() for name in value]
+        weapon_aliases = list(weapons) + [name for value in weapons.values() for name in value]
+        start = time.perf_counter()
+        for name in role_aliases:
+            linear_role_to_id(name)
+        for name in weapon_aliases:
+            linear_weapon_to_name(name)
+        linear_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for name in role_aliases:
+            roleToId(name)
+        for name in weapon_aliases:
+            weaponToName(name)
+        index_time = time.perf_counter() - start
+        LOGGER.info(
+            "lookup %s role and %s weapon aliases: linear %.3fms, index %.3fms",
+            len(role_aliases),
+            len(weapon_aliases),
+            linear_time * 1000,
+            index_time * 1000,
+        )
+
+
+def gen_text_map(num: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    text = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同"
+    return {
+        str(rng.getrandbits(32)): "".join(rng.choices(text, k=rng.randint(2, 60))) + rng.choice(["", '\\n"{}",:'])
+        for _ in range(num)
+    }
+
+
+def read_chunks(path, chunk_size: int):
+    with open(path, encoding="utf-8") as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+def linear_extract(path, string_ids: list) -> dict:
+    """旧版按行分割的提取方式"""
+    result = {}
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            splits = line.split(":")
+            string_id = splits[0].strip(' "')
+            if string_id in string_ids:
+                result[string_id] = splits[1].strip('\n ,"')
+                string_ids.remove(string_id)
+            if not string_ids:
+                break
+    return result
+
+
+class TestTextMap:
+    @staticmethod
+    @pytest.mark.parametrize("indent", [None, 2, "\t"])
+    def test_extract_matches_json(indent):
+        text_map = gen_text_map(2000)
+        text = json.dumps(text_map, ensure_ascii=False, indent=indent)
+        keys = list(text_map)
+        groups = {"avatar": keys[:50], "weapon": [int(i) for i in keys[40:100]], "namecard": keys[-10:] + ["1"]}
+        rng = random.Random(1)
+        chunks = []
+        pos = 0
+        while pos < len(text):
+            size = rng.randint(1, 200)
+            chunks.append(text[pos : pos + size])
+            pos += size
+        extractor = TextMapExtractor(groups)
+        result = extractor.extract(chunks)
+        for group, hashes in groups.items():
+            assert result[group] == {str(i): text_map[str(i)] for i in hashes if str(i) in text_map}
+        assert extractor.missing == {"1": ["namecard"]}
+
+    @staticmethod
+    def test_json_array_stream():
+        data = [{"id": i, "materialType": "MATERIAL_NAMECARD", "picPath": ["a]", "{b"]} for i in range(100)] + [1, 23]
+        for indent in (None, 2):
+            text = json.dumps(data, indent=indent)
+            for size in (1, 7, 4096):
+                chunks = [text[i : i + size] for i in range(0, len(text), size)]
+                assert list(JsonArrayStream().iter(chunks)) == data
+
+    @staticmethod
+    @pytest.mark.parametrize("num", [30000])
+    def test_extract_benchmark(num: int, tmp_path):
+        text_map = gen_text_map(num)
+        path = tmp_path / "TextMapCHS.json"
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(text_map, file, ensure_ascii=False, indent=2)
+        # 名片文本位于文件各处，需要读取整个文件
+        keys = list(text_map)[:: num // 600] + [list(text_map)[-1]]
+        start = time.perf_counter()
+        expected = linear_extract(path, keys.copy())
+        linear_time = time.perf_counter() - start
+        start = time.perf_counter()
+        extractor = TextMapExtractor({"namecard": keys})
+        result = extractor.extract(read_chunks(path, 64 * 1024))["namecard"]
+        stream_time = time.perf_counter() - start
+        LOGGER.info(
+            "extract %s hashes from %s entries (%.1fMB): linear %.3fs, stream %.3fs",
+            len(keys),
+            num,
+            path.stat().st_size / 1024 / 1024,
+            linear_time,
+            stream_time,
+        )
+        assert result == {key: text_map[key] for key in keys}
+        # 旧版在文本中含有 ":" 或引号时会截断文本
+        assert len(expected) == len(keys)
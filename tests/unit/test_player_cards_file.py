@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from modules.playercards.file import PlayerCardsFile
+
+
+def avatar(avatar_id: int, level: int = 90) -> dict:
+    return {"avatarId": avatar_id, "propMap": {"4001": {"val": str(level)}}}
+
+
+class TestPlayerCardsFile:
+    @staticmethod
+    @pytest.mark.parametrize("compress", [False, True])
+    async def test_merge_keeps_old_avatars(tmp_path, compress):
+        file = PlayerCardsFile(tmp_path, compress=compress)
+        await file.merge_info(10001, {"avatarInfoList": [avatar(1), avatar(2, 80)]})
+        data = await file.merge_info(10001, {"avatarInfoList": [avatar(2), avatar(3)]})
+        assert [i["avatarId"] for i in data["avatarInfoList"]] == [2, 3, 1]
+        assert data["avatarInfoList"][0]["propMap"]["4001"]["val"] == "90"
+        assert file.get_file_path(10001).exists()
+        # 重新读取文件时结果一致
+        assert await PlayerCardsFile(tmp_path, compress=compress).load_history_info(10001) == data
+
+    @staticmethod
+    async def test_read_legacy_format(tmp_path):
+        await PlayerCardsFile(tmp_path).merge_info(10001, {"avatarInfoList": [avatar(1)]})
+        file = PlayerCardsFile(tmp_path, compress=True)
+        assert (await file.load_history_info(10001))["avatarInfoList"] == [avatar(1)]
+        await file.merge_info(10001, {"avatarInfoList": [avatar(2)]})
+        assert not file.get_file_path(10001, False).exists()
+        assert len((await PlayerCardsFile(tmp_path, compress=True).load_history_info(10001))["avatarInfoList"]) == 2
+
+    @staticmethod
+    async def test_concurrent_merge_same_uid(tmp_path):
+        file = PlayerCardsFile(tmp_path)
+        await asyncio.gather(*(file.merge_info(10001, {"avatarInfoList": [avatar(i)]}) for i in range(20)))
+        data = await PlayerCardsFile(tmp_path).load_history_info(10001)
+        assert sorted(i["avatarId"] for i in data["avatarInfoList"]) == list(range(20))
+
+    @staticmethod
+    async def test_cache_isolated_from_caller(tmp_path):
+        file = PlayerCardsFile(tmp_path)
+        data = await file.merge_info(10001, {"avatarInfoList": [avatar(1)]})
+        data["avatarInfoList"].append(avatar(2))
+        loaded = await file.load_history_info(10001)
+        loaded["avatarInfoList"].clear()
+        assert (await file.load_history_info(10001))["avatarInfoList"] == [avatar(1)]
@@ -0,0 +1,83 @@
+import heapq
+import logging
+import random
+import time
+
+import pytest
+
+from core.services.search.index import SearchIndex
+from core.services.search.models import StrategyEntry, WeaponEntry
+
+LOGGER = logging.getLogger(__name__)
+
+WEAPONS = {
+    "风鹰剑": ["风鹰", "西风之鹰的抗争"],
+    "天空之刃": ["天空剑"],
+    "护摩之杖": ["护摩", "胡桃专武"],
+    "雾切之回光": ["雾切"],
+    "薙草之稻光": ["薙刀", "草薙", "雷神专武"],
+    "终末嗟叹之诗": ["终末", "绿弓"],
+}
+CHARACTERS = {"雷电将军": ["雷神", "将军"], "纳西妲": ["草神", "小草神"], "胡桃": ["胡堂主"], "温迪": ["风神"]}
+QUERIES = ["风鹰剑", "天空", "护摩", "雷神", "雷电将军攻略", "草神", "胡桃", "绿弓", "终末嗟叹之诗", "雾切"]
+TEXT = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经"
+
+
+def gen_entries(num: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    entries = []
+    for name, tags in WEAPONS.items():
+        entries.append(WeaponEntry(key=f"weapon:{name}", title=name, description=f"{name}的故事", tags=tags))
+    for name, tags in CHARACTERS.items():
+        entries.append(StrategyEntry(key=f"strategy:{name}", title=f"{name}攻略", description="", tags=tags))
+    for i in range(num - len(entries)):
+        title = "".join(rng.choices(TEXT, k=4))
+        description = "".join(rng.choices(TEXT, k=80))
+        tags = ["".join(rng.choices(TEXT, k=2)) for _ in range(2)]
+        entry_type = WeaponEntry if i % 2 else StrategyEntry
+        entries.append(entry_type(key=f"entry:{i}", title=title, description=description, tags=tags))
+    return entries
+
+
+def linear_search(entries: list, query: str, amount: int) -> list:
+    return heapq.nlargest(amount, entries, key=lambda entry: entry.compare_to_query(query))
+
+
+class TestSearchIndex:
+    @staticmethod
+    def test_upsert():
+        entries = gen_entries(100)
+        index = SearchIndex.build(entries)
+        new_index = index.upsert(WeaponEntry(key="weapon:风鹰剑", title="风鹰剑", description="", tags=["风剑"]))
+        # 旧的快照不受影响
+        assert "西风之鹰的抗争" in index.entries["weapon:风鹰剑"].tags
+        assert index.search("西风之鹰的抗争", 1)[0].key == "weapon:风鹰剑"
+        assert "weapon:风鹰剑" not in new_index.postings.get("抗争", ())
+        assert new_index.search("风剑", 1)[0].key == "weapon:风鹰剑"
+        assert new_index.postings == SearchIndex.build(new_index.entries.values()).postings
+
+    @staticmethod
+    @pytest.mark.parametrize("num", [5000])
+    def test_search_benchmark(num: int):
+        entries = gen_entries(num)
+        start = time.perf_counter()
+        index = SearchIndex.build(entries)
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        expected = {query: linear_search(entries, query, 3) for query in QUERIES}
+        linear_time = (time.perf_counter() - start) / len(QUERIES)
+        start = time.perf_counter()
+        results = {query: index.search(query, 3) for query in QUERIES}
+        index_time = (time.perf_counter() - start) / len(QUERIES)
+        LOGGER.info(
+            "search %s entries: build %.3fms, linear %.3fms/query, index %.3fms/query",
+            num,
+            build_time * 1000,
+            linear_time * 1000,
+            index_time * 1000,
+        )
+        for query in QUERIES:
+            # 与搜索文本没有相同字词的条目分数为 0，不会出现在索引的结果中，分数相同的条目顺序可能不同
+            assert [i.compare_to_query(query) for i in results[query]] == [
+                score for score in (i.compare_to_query(query) for i in expected[query]) if score > 0
+            ]
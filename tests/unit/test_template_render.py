@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from core.services.template.scheduler import RenderPriority, RenderScheduler
+from utils.patch.aiobrowser import PagePool
+
+
+class FakePage:
+    def __init__(self, viewport: dict):
+        self.viewport_size = dict(viewport)
+        self.closed = False
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+    async def set_viewport_size(self, viewport: dict):
+        self.viewport_size = dict(viewport)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    async def new_page(self, viewport: dict = None, **kwargs):
+        return FakePage(viewport or {"width": 1280, "height": 720})
+
+
+class TestPagePool:
+    @staticmethod
+    @pytest.mark.asyncio
+    async def test_reuse_resets_viewport():
+        pool = PagePool(FakeBrowser())
+        page = await pool.new_page(viewport={"width": 690, "height": 300})
+        origin = page._page  # pylint: disable=W0212
+        assert origin.viewport_size == {"width": 690, "height": 300}
+        await page.close()
+        # 未指定视口的渲染不能沿用上一次渲染的视口
+        page = await pool.new_page()
+        assert page._page is origin  # pylint: disable=W0212
+        assert origin.viewport_size == pool.default_viewport
+        await page.close()
+        assert (pool.created, pool.reused) == (1, 1)
+
+    @staticmethod
+    @pytest.mark.asyncio
+    async def test_prefer_same_viewport():
+        pool = PagePool(FakeBrowser())
+        pages = [await pool.new_page(viewport={"width": 1040, "height": 500}), await pool.new_page()]
+        origins = [i._page for i in pages]  # pylint: disable=W0212
+        for page in pages:
+            await page.close()
+        page = await pool.new_page(viewport={"width": 1040, "height": 500})
+        assert page._page is origins[0]  # pylint: disable=W0212
+
+    @staticmethod
+    @pytest.mark.asyncio
+    async def test_retire():
+        pool = PagePool(FakeBrowser())
+        pool.max_uses = 2
+        pool.max_idle = 1
+        page = await pool.new_page()
+        origin = page._page  # pylint: disable=W0212
+        await page.close()
+        page = await pool.new_page()
+        await page.close()
+        # 达到使用次数上限后关闭
+        assert origin.closed
+        pages = [await pool.new_page(), await pool.new_page()]
+        for page in pages:
+            await page.close()
+        # 超出空闲页面上限的页面被关闭
+        assert sum(not page.is_closed() for page, _ in pool._idle) == 1  # pylint: disable=W0212
+        await pool.close()
+        assert not pool._idle  # pylint: disable=W0212
+
+
+class TestRenderScheduler:
+    @staticmethod
+    @pytest.mark.asyncio
+    async def test_priority_order():
+        scheduler = RenderScheduler(max_concurrency=1)
+        order = []
+        release = asyncio.Event()
+
+        async def render(name: str, priority: int):
+            async with scheduler.slot(name, priority):
+                order.append(name)
+                if name == "first":
+                    await release.wait()
+
+        first = asyncio.create_task(render("first", RenderPriority.INTERACTIVE))
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(render(name, priority))
+            for name, priority in (
+                ("background", RenderPriority.BACKGROUND),
+                ("bulk", RenderPriority.BULK),
+                ("interactive-1", RenderPriority.INTERACTIVE),
+                ("interactive-2", RenderPriority.INTERACTIVE),
+            )
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.running == 1 and scheduler.waiting == 4
+        release.set()
+        await asyncio.gather(first, *tasks)
+        assert order == ["first", "interactive-1", "interactive-2", "bulk", "background"]
+        assert scheduler.running == 0
+
+    @staticmethod
+    @pytest.mark.asyncio
+    async def test_cancel_hand_off():
+        scheduler = RenderScheduler(max_concurrency=1)
+        order = []
+
+        async def render(name: str):
+            async with scheduler.slot(name):
+                order.append(name)
+
+        await scheduler._acquire(RenderPriority.INTERACTIVE)  # pylint: disable=W0212
+        waiting, granted, last = (asyncio.create_task(render(name)) for name in ("waiting", "granted", "last"))
+        await asyncio.sleep(0)
+        # 排队中被取消的任务不占用名额
+        waiting.cancel()
+        await asyncio.sleep(0)
+        assert scheduler.waiting == 2
+        # 已经获得名额但还未开始渲染时被取消，名额转交给下一个任务
+        scheduler._release()  # pylint: disable=W0212
+        granted.cancel()
+        await asyncio.gather(waiting, granted, last, return_exceptions=True)
+        assert order == ["last"]
+        assert scheduler.running == 0 and scheduler.waiting == 0
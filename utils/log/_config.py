@@ -2,7 +2,7 @@ from multiprocessing import RLock as Lock
 from pathlib import Path
 from typing import List, Literal, Optional, Union
 
-from pydantic import BaseSettings
+from pydantic import BaseSettings, Field
 
 from utils.const import PROJECT_ROOT
 
@@ -49,3 +49,12 @@ class LoggerConfig(BaseSettings):
     traceback_locals_max_depth: Optional[int] = None
     traceback_locals_max_length: int = 10
     traceback_locals_max_string: int = 80
+
+    queue: bool = Field(False, env="LOGGER_QUEUE")
+    """是否在后台线程中渲染与写入 log"""
+    queue_size: int = Field(10000, env="LOGGER_QUEUE_SIZE")
+    """等待写入的 record 的最大数量"""
+    queue_policy: Literal["drop", "block"] = Field("drop", env="LOGGER_QUEUE_POLICY")
+    """队列已满时的策略：丢弃 ERROR 以下的 record，或阻塞等待"""
+    plain_text_level: int = Field(30, env="LOGGER_PLAIN_TEXT_LEVEL")
+    """启用队列时，低于该等级的 record 以纯文本写入日志文件"""
@@ -1,5 +1,6 @@
 import os
-from datetime import date
+import time
+from datetime import date, datetime, timedelta
 from pathlib import Path
 from types import TracebackType
 from typing import IO, AnyStr, Iterable, Iterator, List, Optional, Type
@@ -13,8 +14,19 @@ class FileIO(IO[str]):
         self.path = path.parent.resolve()
         self.file = path
         self.file_stream: Optional[IO[str]] = None
+        self._rollover_at: float = 0
+        """下一次检查日志是否需要转存的时间戳"""
 
     def _get_file(self) -> IO[str]:
+        # 在下一个零点之前不需要检查日志文件的修改日期
+        if time.time() < self._rollover_at and self.file_stream is not None and not self.file_stream.closed:
+            return self.file_stream
+        tomorrow = date.today() + timedelta(days=1)
+        stream = self._open_file()
+        self._rollover_at = datetime.combine(tomorrow, datetime.min.time()).timestamp()
+        return stream
+
+    def _open_file(self) -> IO[str]:
         today = date.today()
         if self.file.exists():
             if not self.file.is_file():
@@ -5,6 +5,7 @@ from pathlib import Path
 from typing import (
     Any,
     Callable,
+    Dict,
     Iterable,
     List,
     Literal,
@@ -123,8 +124,12 @@ class Handler(DefaultRichHandler):
         color_system: Literal["auto", "standard", "256", "truecolor", "windows"] = "auto",
         project_root: Union[str, Path] = os.getcwd(),
         auto_load_json: bool = False,
+        plain_text_level: int = 0,
         **kwargs,
     ) -> None:
+        """
+        :param plain_text_level: 低于该等级且不带异常信息的 record 直接写入纯文本，不经过 Rich 的渲染
+        """
         super(Handler, self).__init__(*args, rich_tracebacks=rich_tracebacks, **kwargs)
         self._log_render = LogRender(time_format=log_time_format, show_level=True)
         self.console = Console(color_system=color_system, theme=Theme(DEFAULT_STYLE), width=width)
@@ -134,17 +139,16 @@ class Handler(DefaultRichHandler):
         self.locals_max_depth = locals_max_depth
         self.project_root = project_root
         self.auto_load_json = auto_load_json
+        self.plain_text_level = plain_text_level
+        self._paths: Dict[str, str] = {}
+        """record 的文件路径 -> 显示的模块路径"""
 
-    def render(
-        self,
-        *,
-        record: "LogRecord",
-        traceback: Optional[Traceback],
-        message_renderable: Optional["ConsoleRenderable"],
-    ) -> "ConsoleRenderable":
-        if record.pathname != "<input>":
+    def get_path(self, pathname: str) -> str:
+        if (path := self._paths.get(pathname)) is not None:
+            return path
+        if pathname != "<input>":
             try:
-                path = str(Path(record.pathname).relative_to(self.project_root))
+                path = str(Path(pathname).relative_to(self.project_root))
                 path = path.split(".")[0].replace(os.sep, ".")
             except ValueError:
                 import site
@@ -152,7 +156,7 @@ class Handler(DefaultRichHandler):
                 path = None
                 for s in site.getsitepackages():
                     try:
-                        path = str(Path(record.pathname).relative_to(Path(s)))
+                        path = str(Path(pathname).relative_to(Path(s)))
                         break
                     except ValueError:
                         continue
@@ -162,7 +166,17 @@ class Handler(DefaultRichHandler):
                     path = path.split(".")[0].replace(os.sep, ".")
         else:
             path = "<INPUT>"
-        path = path.replace("lib.site-packages.", "")
+        path = self._paths[pathname] = path.replace("lib.site-packages.", "")
+        return path
+
+    def render(
+        self,
+        *,
+        record: "LogRecord",
+        traceback: Optional[Traceback],
+        message_renderable: Optional["ConsoleRenderable"],
+    ) -> "ConsoleRenderable":
+        path = self.get_path(record.pathname)
         _level = self.get_level_text(record)
         time_format = None if self.formatter is None else self.formatter.datefmt
         log_time = datetime.fromtimestamp(record.created)
@@ -212,30 +226,60 @@ class Handler(DefaultRichHandler):
 
         return message_text
 
+    def emit_plain_text(self, record: "LogRecord") -> None:
+        """以纯文本输出 record"""
+        # noinspection PyBroadException
+        try:
+            message = self.format(record)
+            if getattr(record, "markup", self.markup):
+                message = Text.from_markup(message).plain
+            time_format = (None if self.formatter is None else self.formatter.datefmt) or self._log_render.time_format
+            log_time = datetime.fromtimestamp(record.created)
+            log_time_display = time_format(log_time).plain if callable(time_format) else log_time.strftime(time_format)
+            path = self.get_path(record.pathname)
+            self.console.file.write(f"{log_time_display} {record.levelname:<8} {message}  {path}:{record.lineno}\n")
+        except Exception:  # pylint: disable=W0703
+            self.handleError(record)
+
+    def get_traceback(self, record: "LogRecord") -> Optional[Traceback]:
+        """生成 record 所带异常的 Traceback
+
+        经过 QueueHandler 的 record 只带有调用方线程中捕获的 record.exc_snapshot，此时在当前线程中由其生成
+        """
+        if not self.rich_tracebacks:
+            return None
+        options = dict(
+            width=self.tracebacks_width,
+            extra_lines=self.tracebacks_extra_lines,
+            word_wrap=self.tracebacks_word_wrap,
+            show_locals=(getattr(record, "show_locals", None) or self.tracebacks_show_locals),
+            locals_max_length=(getattr(record, "locals_max_length", None) or self.locals_max_length),
+            locals_max_string=(getattr(record, "locals_max_string", None) or self.locals_max_string),
+            locals_max_depth=getattr(record, "locals_max_depth", self.locals_max_depth),
+            suppress=self.tracebacks_suppress,
+            max_frames=self.tracebacks_max_frames,
+        )
+        snapshot = getattr(record, "exc_snapshot", None)
+        if snapshot is not None:
+            return Traceback.from_snapshot(snapshot, **options)
+        if not (record.exc_info and record.exc_info != (None, None, None)):
+            return None
+        exc_type, exc_value, exc_traceback = record.exc_info
+        if exc_type is None or exc_value is None:
+            raise ValueError(record)
+        return Traceback.from_exception(exc_type, exc_value, exc_traceback, **options)
+
     def emit(self, record: "LogRecord") -> None:
-        message = self.format(record)
-        _traceback = None
-        if self.rich_tracebacks and record.exc_info and record.exc_info != (None, None, None):
-            exc_type, exc_value, exc_traceback = record.exc_info
-            if exc_type is None or exc_value is None:
-                raise ValueError(record)
-            try:
-                _traceback = Traceback.from_exception(
-                    exc_type,
-                    exc_value,
-                    exc_traceback,
-                    width=self.tracebacks_width,
-                    extra_lines=self.tracebacks_extra_lines,
-                    word_wrap=self.tracebacks_word_wrap,
-                    show_locals=(getattr(record, "show_locals", None) or self.tracebacks_show_locals),
-                    locals_max_length=(getattr(record, "locals_max_length", None) or self.locals_max_length),
-                    locals_max_string=(getattr(record, "locals_max_string", None) or self.locals_max_string),
-                    locals_max_depth=getattr(record, "locals_max_depth", self.locals_max_depth),
-                    suppress=self.tracebacks_suppress,
-                    max_frames=self.tracebacks_max_frames,
-                )
-            except ImportError:
-                return
+        try:
+            _traceback = self.get_traceback(record)
+        except ImportError:
+            return
+        if _traceback is None and record.levelno < self.plain_text_level and not record.exc_info:
+            self.emit_plain_text(record)
+            return
+        if _traceback is None:
+            message = self.format(record)
+        else:
             message = record.getMessage()
             if self.formatter:
                 record.message = record.getMessage()
@@ -243,7 +287,7 @@ class Handler(DefaultRichHandler):
                 if hasattr(formatter, "usesTime") and formatter.usesTime():
                     record.asctime = formatter.formatTime(record, formatter.datefmt)
                 message = formatter.formatMessage(record)
-            if message == str(exc_value):
+            if message == _traceback.trace.stacks[0].exc_value:
                 message = None
 
         message_renderable = None
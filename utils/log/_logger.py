@@ -11,6 +11,7 @@ from typing import Any, Callable, List, Mapping, Optional, TYPE_CHECKING, Tuple,
 from typing_extensions import Self
 
 from utils.log._handler import FileHandler, Handler
+from utils.log._queue import QueueHandler
 from utils.typedefs import LogFilterType
 
 if TYPE_CHECKING:
@@ -51,7 +52,9 @@ class Logger(logging.Logger):  # skipcq: PY-A6006
             level=level_ if self.config.level is None else self.config.level,
         )
 
+        self.queue_handler: Optional[QueueHandler] = None
         log_path = Path(self.config.project_root).joinpath(self.config.log_path)
+        plain_text_level = self.config.plain_text_level if self.config.queue else 0
         handler_config = {
             "width": self.config.width,
             "keywords": self.config.keywords,
@@ -64,7 +67,13 @@ class Logger(logging.Logger):  # skipcq: PY-A6006
             # 控制台 log 配置
             Handler(color_system=self.config.color_system, **handler_config),
             # debug.log 配置
-            FileHandler(level=10, path=log_path.joinpath("debug/debug.log"), locals_max_depth=1, **handler_config),
+            FileHandler(
+                level=10,
+                path=log_path.joinpath("debug/debug.log"),
+                locals_max_depth=1,
+                plain_text_level=plain_text_level,
+                **handler_config,
+            ),
             # error.log 配置
             FileHandler(
                 level=40,
@@ -73,21 +82,26 @@ class Logger(logging.Logger):  # skipcq: PY-A6006
                 **handler_config,
             ),
         )
-        logging.basicConfig(
-            level=10 if self.config.debug else 20,
-            format="%(message)s",
-            datefmt=self.config.time_format,
-            handlers=[handler, debug_handler, error_handler],
-        )
+        handlers = [handler, debug_handler, error_handler]
+        formatter = logging.Formatter("%(message)s", self.config.time_format)
+        for i in handlers:
+            i.setFormatter(formatter)
+        if self.config.queue:
+            # 渲染与写入都在后台线程中完成，调用方只需要将 record 放入队列
+            self.queue_handler = QueueHandler(handlers, self.config.queue_size, self.config.queue_policy)
+            handlers = [self.queue_handler]
+        logging.basicConfig(level=10 if self.config.debug else 20, handlers=handlers)
         if self.config.capture_warnings:
             logging.captureWarnings(True)
             warnings_logger = logging.getLogger("py.warnings")
-            warnings_logger.addHandler(handler)
-            warnings_logger.addHandler(debug_handler)
-
-        self.addHandler(handler)
-        self.addHandler(debug_handler)
-        self.addHandler(error_handler)
+            if self.queue_handler is not None:
+                warnings_logger.addHandler(self.queue_handler)
+            else:
+                warnings_logger.addHandler(handler)
+                warnings_logger.addHandler(debug_handler)
+
+        for i in handlers:
+            self.addHandler(i)
 
     def success(
         self,
@@ -0,0 +1,160 @@
+import atexit
+import logging
+import queue
+import threading
+import traceback
+from typing import Dict, List, Literal, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from logging import LogRecord
+
+__all__ = ("QueueHandler",)
+
+_STOP = object()
+_formatter = logging.Formatter()
+
+
+class QueueHandler(logging.Handler):
+    """将 record 交给后台线程处理的 Handler
+
+    调用方所在的线程（通常是事件循环）只负责格式化消息并放入队列，
+    Rich 的渲染、traceback 的生成与文件的写入都在后台线程中由实际的 Handler 完成。
+    """
+
+    block_timeout: float = 1
+    """队列已满时阻塞等待的最长时间，超时后丢弃 record"""
+
+    def __init__(
+        self,
+        handlers: List[logging.Handler],
+        maxsize: int = 10000,
+        policy: Literal["drop", "block"] = "drop",
+    ):
+        """
+        :param handlers: 实际处理 record 的 Handler
+        :param maxsize: 队列的最大长度
+        :param policy: 队列已满时的策略：drop 丢弃 ERROR 以下的 record，block 阻塞等待队列空出
+        """
+        super().__init__(level=min(handler.level for handler in handlers))
+        self.handlers = handlers
+        self.policy = policy
+        self.queue: "queue.Queue[object]" = queue.Queue(maxsize)
+        self.queued = 0
+        """放入队列的 record 数量"""
+        self.dropped = 0
+        """因队列已满而丢弃的 record 数量"""
+        self.blocked = 0
+        """因队列已满而阻塞等待的次数"""
+        self._reported = 0
+        self._thread = threading.Thread(target=self._worker, name="LogQueueWorker", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "blocked": self.blocked,
+            "pending": self.queue.qsize(),
+        }
+
+    def prepare(self, record: "LogRecord") -> "LogRecord":
+        """在调用方的线程中格式化消息并捕获异常信息
+
+        避免参数与异常中的局部变量在后台线程处理前被修改，同时不再持有 traceback 引用的栈帧。
+        异常只会被捕获一次：局部变量仅保存为 repr 字符串，保存在 record.exc_snapshot 中，
+        Rich 的 Traceback 由各个 Handler 在后台线程中按照自己的配置生成；
+        不使用 Rich traceback 的 Handler 则使用 exc_text 中的纯文本异常信息。
+        """
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            rich_handlers = [handler for handler in self.handlers if getattr(handler, "rich_tracebacks", False)]
+            if rich_handlers:
+                exc_type, exc_value, exc_traceback = record.exc_info
+                record.exc_snapshot = traceback.TracebackException(
+                    exc_type,
+                    exc_value,
+                    exc_traceback,
+                    lookup_lines=False,
+                    capture_locals=any(
+                        getattr(record, "show_locals", None) or getattr(handler, "tracebacks_show_locals", False)
+                        for handler in rich_handlers
+                    ),
+                )
+            if not record.exc_text and len(rich_handlers) < len(self.handlers):
+                record.exc_text = _formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record: "LogRecord") -> None:
+        try:
+            record = self.prepare(record)
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                if self.policy == "drop" and record.levelno < logging.ERROR:
+                    self.dropped += 1
+                    return
+                self.blocked += 1
+                try:
+                    self.queue.put(record, timeout=self.block_timeout)
+                except queue.Full:
+                    self.dropped += 1
+                    return
+            self.queued += 1
+        except Exception:  # pylint: disable=W0703
+            self.handleError(record)
+
+    def _dispatch(self, record: "LogRecord") -> None:
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _report_dropped(self) -> None:
+        if (dropped := self.dropped) == self._reported:
+            return
+        record = logging.LogRecord(
+            "LogQueue",
+            logging.WARNING,
+            __file__,
+            0,
+            "日志队列已满，丢弃了 %s 条日志",
+            (dropped - self._reported,),
+            None,
+        )
+        self._reported = dropped
+        self._dispatch(self.prepare(record))
+
+    def _worker(self) -> None:
+        while True:
+            record = self.queue.get()
+            try:
+                if record is _STOP:
+                    break
+                self._dispatch(record)
+                if self.queue.empty():
+                    self._report_dropped()
+            except Exception:  # pylint: disable=W0703
+                self.handleError(record)
+            finally:
+                self.queue.task_done()
+
+    def flush(self) -> None:
+        """等待队列中的 record 处理完成"""
+        if self._thread.is_alive():
+            self.queue.join()
+        for handler in self.handlers:
+            handler.flush()
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self.queue.put(_STOP)
+            self._thread.join(timeout=5)
+        self._report_dropped()
+        super().close()
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.stats}>"
@@ -141,6 +141,114 @@ class Traceback(BaseTraceback):
             max_frames=max_frames,
         )
 
+    @classmethod
+    def from_snapshot(
+        cls,
+        snapshot: traceback_.TracebackException,
+        width: Optional[int] = 100,
+        extra_lines: int = 3,
+        word_wrap: bool = False,
+        show_locals: bool = False,
+        indent_guides: bool = True,
+        locals_max_length: int = LOCALS_MAX_LENGTH,
+        locals_max_string: int = LOCALS_MAX_STRING,
+        locals_max_depth: Optional[int] = None,
+        suppress: Iterable[Union[str, ModuleType]] = (),
+        max_frames: int = 100,
+        **kwargs,
+    ) -> "Traceback":
+        """由 TracebackException 生成 Traceback
+
+        snapshot 中的局部变量已经是 repr 字符串，因此只有 locals_max_string 会对其生效
+        """
+        rich_traceback = cls.extract_snapshot(snapshot, show_locals=show_locals, locals_max_string=locals_max_string)
+        return cls(
+            rich_traceback,
+            width=width,
+            extra_lines=extra_lines,
+            theme=PygmentsSyntaxTheme(MonokaiProStyle),
+            word_wrap=word_wrap,
+            show_locals=show_locals,
+            indent_guides=indent_guides,
+            locals_max_length=locals_max_length,
+            locals_max_string=locals_max_string,
+            locals_max_depth=locals_max_depth,
+            suppress=suppress,
+            max_frames=max_frames,
+        )
+
+    @classmethod
+    def extract_snapshot(
+        cls,
+        snapshot: traceback_.TracebackException,
+        show_locals: bool = False,
+        locals_max_string: int = 80,
+        **kwargs,
+    ) -> Trace:
+        # noinspection PyProtectedMember
+        from rich import _IMPORT_CWD
+
+        stacks: List[Stack] = []
+        is_cause = False
+
+        def to_node(value_repr: str) -> pretty.Node:
+            value_repr = Traceback.filter_value(value_repr)
+            if locals_max_string is not None and len(value_repr) > locals_max_string:
+                value_repr = value_repr[:locals_max_string] + "..."
+            return pretty.Node(value_repr=value_repr)
+
+        def is_set(_locals: Optional[Dict[str, str]], key: str) -> bool:
+            return _locals is not None and _locals.get(key, "False") not in ("False", "None", "0")
+
+        while True:
+            stack = Stack(exc_type=snapshot.exc_type.__name__, exc_value=str(snapshot), is_cause=is_cause)
+
+            if issubclass(snapshot.exc_type, SyntaxError):
+                # noinspection PyProtectedMember
+                from rich.traceback import _SyntaxError
+
+                stack.syntax_error = _SyntaxError(
+                    offset=snapshot.offset or 0,
+                    filename=snapshot.filename or "?",
+                    lineno=int(snapshot.lineno or 0),
+                    line=snapshot.text or "",
+                    msg=snapshot.msg,
+                )
+
+            stacks.append(stack)
+            append = stack.frames.append
+
+            for frame_summary in snapshot.stack:
+                filename = frame_summary.filename
+                if filename and not filename.startswith("<") and not os.path.isabs(filename):
+                    filename = os.path.join(_IMPORT_CWD, filename)
+                if is_set(frame_summary.locals, "_rich_traceback_omit"):
+                    continue
+                frame = Frame(
+                    filename=filename or "?",
+                    lineno=frame_summary.lineno,
+                    name=frame_summary.name,
+                    locals={key: to_node(value) for key, value in frame_summary.locals.items()}
+                    if show_locals and frame_summary.locals is not None
+                    else None,
+                )
+                append(frame)
+                if is_set(frame_summary.locals, "_rich_traceback_guard"):
+                    del stack.frames[:]
+
+            if snapshot.__cause__ is not None:
+                snapshot = snapshot.__cause__
+                is_cause = True
+                continue
+
+            if snapshot.__context__ is not None and not snapshot.__suppress_context__:
+                snapshot = snapshot.__context__
+                is_cause = False
+                continue
+            break
+
+        return Trace(stacks=stacks)
+
     @classmethod
     def extract(
         cls,
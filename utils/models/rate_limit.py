@@ -0,0 +1,68 @@
+import asyncio
+import time
+from typing import Optional
+
+__all__ = ("TokenBucket",)
+
+
+class TokenBucket:
+    """异步令牌桶限流器
+
+    每秒向桶中补充 ``rate`` 个令牌，桶中最多存放 ``capacity`` 个令牌。
+    获取令牌的协程按照先来后到的顺序等待，不会出现饥饿。
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate 必须大于 0")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    @property
+    def tokens(self) -> float:
+        """当前桶中可用的令牌数"""
+        self._refill()
+        return self._tokens
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """尝试立即获取令牌，失败时返回 False 而不等待"""
+        if self.lock.locked():
+            return False
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """等待直至获取到指定数量的令牌"""
+        if tokens > self.capacity:
+            raise ValueError("tokens 不能大于桶的容量")
+        async with self.lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    async def __aenter__(self) -> "TokenBucket":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type=None, exc_val=None, exc_tb=None) -> None:
+        return None
@@ -1,3 +1,3 @@
-from utils.patch import simnet
+from utils.patch import aiobrowser, simnet, template
 
-__all__ = ["simnet"]
+__all__ = ["aiobrowser", "simnet", "template"]
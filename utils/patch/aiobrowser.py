@@ -0,0 +1,122 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.dependence.aiobrowser import AioBrowser as _AioBrowser
+from utils.log import logger
+from utils.patch.methods import patch, patchable
+
+ViewportKey = Tuple[int, int]
+
+
+class PooledPage:
+    """从 PagePool 借出的页面，关闭时归还到池中"""
+
+    def __init__(self, pool: "PagePool", page, viewport: ViewportKey):
+        self._pool = pool
+        self._page = page
+        self._viewport = viewport
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._page, item)
+
+    async def close(self, *args, **kwargs):
+        page, self._page = self._page, None
+        if page is not None:
+            await self._pool.release(page, self._viewport, *args, **kwargs)
+
+
+class PagePool:
+    """复用浏览器页面
+
+    渲染时不再为每张图片新建页面，归还的页面保留了已加载的字体与样式，
+    视口不同时会调整页面大小后复用，未指定视口时使用与新页面相同的默认视口。
+    空闲页面与单个页面的使用次数均有上限。
+    """
+
+    max_idle: int = 4
+    """最多保留的空闲页面数量"""
+    max_uses: int = 100
+    """单个页面最多使用的次数，超过后关闭以释放内存"""
+    default_viewport: Dict[str, int] = {"width": 1280, "height": 720}
+    """未指定视口时使用的视口，与 playwright 新页面的默认视口相同"""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self._idle: List[Tuple[Any, ViewportKey]] = []
+        self._uses: Dict[int, int] = {}
+        self.created = 0
+        self.reused = 0
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self.browser, item)
+
+    @staticmethod
+    def _viewport_key(viewport: Dict[str, int]) -> ViewportKey:
+        return viewport["width"], viewport["height"]
+
+    async def warm(self, count: Optional[int] = None):
+        """预先创建空闲页面"""
+        count = self.max_idle if count is None else count
+        viewport = self._viewport_key(self.default_viewport)
+        while len(self._idle) < count:
+            self._idle.append((await self._create(viewport=self.default_viewport), viewport))
+
+    async def _create(self, **kwargs):
+        page = await self.browser.new_page(**kwargs)
+        self.created += 1
+        return page
+
+    def _take(self, viewport: ViewportKey) -> Tuple[Any, ViewportKey]:
+        for index, (page, key) in enumerate(self._idle):
+            if key == viewport:
+                return self._idle.pop(index)
+        return self._idle.pop()
+
+    async def new_page(self, viewport: Optional[Dict[str, int]] = None, **kwargs):
+        if kwargs:
+            return await self.browser.new_page(viewport=viewport, **kwargs)
+        viewport = viewport or self.default_viewport
+        key = self._viewport_key(viewport)
+        while self._idle:
+            page, page_viewport = self._take(key)
+            if page.is_closed():
+                self._uses.pop(id(page), None)
+                continue
+            if page_viewport != key:
+                await page.set_viewport_size(viewport)
+            self.reused += 1
+            return PooledPage(self, page, key)
+        return PooledPage(self, await self._create(viewport=viewport), key)
+
+    async def release(self, page, viewport: ViewportKey, *args, **kwargs):
+        uses = self._uses.pop(id(page), 0) + 1
+        if page.is_closed():
+            return
+        if uses >= self.max_uses or len(self._idle) >= self.max_idle:
+            await page.close(*args, **kwargs)
+            return
+        self._uses[id(page)] = uses
+        self._idle.append((page, viewport))
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        self._uses.clear()
+        for page, _ in idle:
+            if not page.is_closed():
+                await page.close()
+
+
+@patch(_AioBrowser)
+class AioBrowser:
+    @patchable
+    async def get_browser(self, *args, **kwargs):
+        browser = await self.old_get_browser(*args, **kwargs)
+        pool: Optional[PagePool] = self.__dict__.get("_page_pool")
+        if pool is None or pool.browser is not browser:
+            if pool is not None:
+                await pool.close()
+            pool = self._page_pool = PagePool(browser)
+            try:
+                await pool.warm()
+            except Exception as exc:  # pylint: disable=W0703
+                logger.warning("预热浏览器页面失败 %s", str(exc))
+        return pool
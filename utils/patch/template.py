@@ -0,0 +1,122 @@
+import inspect
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from jinja2 import meta
+
+from core.services.template.cache import RenderCache, RenderCacheFileIdAdapter, UncacheableData, template_data_digest
+from core.services.template.models import RenderResult
+from core.services.template.scheduler import RenderPriority, RenderScheduler
+from core.services.template.services import TemplateService as _TemplateService
+from utils.log import logger
+from utils.patch.methods import patch, patchable
+
+_RENDER_OPTIONS = ("viewport", "full_page", "evaluate", "query_selector", "file_type")
+_RESULT_OPTIONS = ("ttl", "caption", "parse_mode", "filename", "reply_markup")
+
+
+@patch(_TemplateService)
+class TemplateService:
+    """在渲染前按模板、模板依赖文件的修改时间、渲染数据与视口计算摘要，数据未变化时直接复用之前的渲染结果"""
+
+    @patchable
+    def get_render_cache(self) -> Optional[RenderCache]:
+        render_cache = self.__dict__.get("_render_cache")
+        if render_cache is None:
+            client = getattr(getattr(self, "html_to_file_id_cache", None), "client", None)
+            if client is None:
+                return None
+            render_cache = self._render_cache = RenderCache(client)
+        return render_cache
+
+    @patchable
+    def get_render_scheduler(self) -> RenderScheduler:
+        scheduler = self.__dict__.get("_render_scheduler")
+        if scheduler is None:
+            scheduler = self._render_scheduler = RenderScheduler()
+        return scheduler
+
+    @patchable
+    async def scheduled_render(self, template_name: str, priority: int, *args, **kwargs) -> RenderResult:
+        """按照优先级排队后使用浏览器渲染"""
+        async with self.get_render_scheduler().slot(template_name, priority):
+            return await self.old_render(*args, **kwargs)
+
+    @patchable
+    def get_template_dependencies(self, template_name: str) -> List[Path]:
+        """模板文件、其引用的模板以及模板目录下的静态文件"""
+        dependencies: Dict[str, List[Path]] = self.__dict__.setdefault("_template_dependencies", {})
+        if (files := dependencies.get(template_name)) is not None:
+            return files
+        files = []
+        names = [template_name]
+        visited = set()
+        while names:
+            name = names.pop()
+            if name in visited:
+                continue
+            visited.add(name)
+            template = self.get_template(name)
+            path = Path(template.filename)
+            files.append(path)
+            with open(path, encoding="utf-8") as file:
+                names.extend(i for i in meta.find_referenced_templates(template.environment.parse(file.read())) if i)
+        root = Path(self.get_template(template_name).filename).parent
+        files.extend(i for i in root.iterdir() if i.is_file() and i not in files)
+        dependencies[template_name] = files
+        return files
+
+    @patchable
+    def get_template_mtimes(self, template_name: str) -> Tuple[int, ...]:
+        return tuple(i.stat().st_mtime_ns if i.exists() else 0 for i in self.get_template_dependencies(template_name))
+
+    @patchable
+    async def render(self, *args, priority: int = RenderPriority.INTERACTIVE, **kwargs) -> RenderResult:
+        bound = inspect.signature(self.old_render).bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = bound.arguments
+        template_name = arguments["template_name"]
+        render_cache = self.get_render_cache()
+        if render_cache is None or getattr(self, "using_preview", False):
+            return await self.scheduled_render(template_name, priority, *args, **kwargs)
+        try:
+            digest = template_data_digest(
+                template_name,
+                self.get_template_mtimes(template_name),
+                arguments["template_data"],
+                {key: arguments.get(key) for key in _RENDER_OPTIONS},
+            )
+        except (UncacheableData, OSError):
+            return await self.scheduled_render(template_name, priority, *args, **kwargs)
+        result_options = {key: arguments[key] for key in _RESULT_OPTIONS if key in arguments}
+        file_type = arguments.get("file_type")
+        try:
+            cached = await render_cache.get(digest)
+        except Exception as exc:  # pylint: disable=W0703
+            logger.warning("读取渲染缓存失败 %s", str(exc))
+            return await self.scheduled_render(template_name, priority, *args, **kwargs)
+        if cached is not None:
+            file_id, image = cached
+            logger.debug("%s 命中渲染缓存 %s", template_name, digest)
+            return RenderResult(
+                html="",
+                photo=file_id or image,
+                file_type=file_type,
+                cache=RenderCacheFileIdAdapter(render_cache, digest, self.html_to_file_id_cache),
+                **result_options,
+            )
+        result = await self.scheduled_render(template_name, priority, *args, **kwargs)
+        try:
+            if isinstance(result.photo, str):
+                await render_cache.set_file_id(digest, result.photo, arguments.get("ttl"))
+            else:
+                await render_cache.set_image(digest, result.photo)
+        except Exception as exc:  # pylint: disable=W0703
+            logger.warning("写入渲染缓存失败 %s", str(exc))
+        return RenderResult(
+            html=result.html,
+            photo=result.photo,
+            file_type=file_type,
+            cache=RenderCacheFileIdAdapter(render_cache, digest, self.html_to_file_id_cache),
+            **result_options,
+        )
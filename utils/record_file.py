@@ -0,0 +1,242 @@
+"""定长记录文件
+
+文件由一个定长的文件头与若干个数据块组成::
+
+    | header | block | block | ... |
+
+每个数据块包含本块新增的字符串（字符串表在所有数据块之间共享并按顺序编号）与若干条定长记录::
+
+    | u32 字符串数量 | u32 记录数量 | (u16 长度 + utf-8 字符串) * n | 记录 * m |
+
+追加数据时先在最后一个完整数据块之后写入新的数据块，写入完成后再更新文件头，不需要重写整个文件；
+读取时使用 mmap 映射文件并直接按照 struct 解析，不经过 JSON 与 pydantic 校验。
+文件末尾不完整的数据块（例如写入过程中进程退出）会在读取时被忽略，并在下一次追加时被截断。
+重写整个文件前会将原文件复制为 ``.bak`` 备份，文件损坏时可以使用 :meth:`RecordFile.restore` 恢复。
+"""
+
+import mmap
+import os
+import shutil
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+__all__ = ("RecordFile", "RecordFileError", "StringTable")
+
+_BLOCK_HEAD = struct.Struct("<II")
+_STRING_HEAD = struct.Struct("<H")
+
+
+class RecordFileError(Exception):
+    """文件格式错误"""
+
+
+class StringTable:
+    """字符串表，将重复的字符串映射为序号"""
+
+    __slots__ = ("strings", "index", "_flushed")
+
+    def __init__(self, strings: Iterable[str] = ()):
+        self.strings: List[str] = []
+        self.index: Dict[str, int] = {}
+        for string in strings:
+            self.intern(string)
+        self._flushed = len(self.strings)
+
+    def intern(self, string: str) -> int:
+        idx = self.index.get(string)
+        if idx is None:
+            idx = self.index[string] = len(self.strings)
+            self.strings.append(string)
+        return idx
+
+    def __getitem__(self, idx: int) -> str:
+        return self.strings[idx]
+
+    def pop_new(self) -> List[str]:
+        """返回上次调用后新增的字符串"""
+        new = self.strings[self._flushed :]
+        self._flushed = len(self.strings)
+        return new
+
+
+class RecordFile:
+    """定长记录文件
+
+    Args:
+        header: 文件头的 struct，第一个字段必须为 4 字节的 magic
+        record: 单条记录的 struct
+        magic: 文件标识
+    """
+
+    def __init__(self, header: struct.Struct, record: struct.Struct, magic: bytes):
+        self.header = header
+        self.record = record
+        self.magic = magic
+
+    @staticmethod
+    def _pack_block(strings: Sequence[str], records: Sequence[bytes]) -> bytes:
+        parts = [_BLOCK_HEAD.pack(len(strings), len(records))]
+        for string in strings:
+            data = string.encode("utf-8")
+            parts.append(_STRING_HEAD.pack(len(data)))
+            parts.append(data)
+        parts.extend(records)
+        return b"".join(parts)
+
+    def _pack_records(self, rows: Iterable[tuple]) -> List[bytes]:
+        pack = self.record.pack
+        return [pack(*row) for row in rows]
+
+    @staticmethod
+    def backup(path: Path) -> None:
+        """将原文件复制为 .bak 备份"""
+        if path.exists():
+            shutil.copyfile(path, path.with_name(f"{path.name}.bak"))
+
+    def write(self, path: Path, header: tuple, table: StringTable, rows: Iterable[tuple]) -> None:
+        """写入完整的文件，会先写入临时文件再替换，避免写入过程中损坏原文件"""
+        records = self._pack_records(rows)
+        temp_path = path.with_name(f"{path.name}.tmp")
+        with open(temp_path, "wb") as f:
+            f.write(self.header.pack(self.magic, *header))
+            f.write(self._pack_block(table.pop_new(), records))
+            f.flush()
+            os.fsync(f.fileno())
+        self.backup(path)
+        os.replace(temp_path, path)
+
+    def append(
+        self, path: Path, header: tuple, table: StringTable, rows: Iterable[tuple], end: Optional[int] = None
+    ) -> None:
+        """在最后一个完整的数据块之后追加一个数据块，写入完成后再更新文件头
+
+        进程在写入数据块的过程中退出时，文件头与已有的数据块都不受影响，
+        未写完的数据块会在下一次追加时被截断，不会导致之后追加的数据块无法读取。
+
+        Args:
+            table: 通过 :meth:`read_strings` 读取的字符串表，新增的字符串会写入新的数据块
+            end: 通过 :meth:`read_strings` 读取的最后一个完整的数据块的结束位置，未给出时重新解析
+        """
+        records = self._pack_records(rows)
+        strings = table.pop_new()
+        with open(path, "r+b") as f:
+            if records or strings:
+                if end is None:
+                    end = self._complete_end(f)
+                f.truncate(end)
+                f.seek(end)
+                f.write(self._pack_block(strings, records))
+                f.flush()
+                os.fsync(f.fileno())
+            f.seek(0)
+            f.write(self.header.pack(self.magic, *header))
+
+    def _complete_end(self, f) -> int:
+        """最后一个完整的数据块的结束位置"""
+        size = os.fstat(f.fileno()).st_size
+        if size < self.header.size:
+            raise RecordFileError("文件长度不足")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                return self._scan(view, size, records=False)[3]
+            finally:
+                view.release()
+
+    def read_strings(self, path: Path) -> Tuple[StringTable, int]:
+        """只读取字符串表，跳过所有记录，用于追加数据
+
+        Returns:
+            字符串表以及最后一个完整的数据块的结束位置
+        """
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self.header.size:
+                raise RecordFileError("文件长度不足")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    _, table, _, end = self._scan(view, size, records=False)
+                finally:
+                    view.release()
+        return table, end
+
+    def restore(self, path: Path) -> bool:
+        """使用 .bak 备份替换损坏的文件
+
+        Returns:
+            备份不存在或同样无法读取时返回 False
+        """
+        backup_path = path.with_name(f"{path.name}.bak")
+        if not backup_path.exists():
+            return False
+        try:
+            self.read(backup_path)
+        except (RecordFileError, UnicodeDecodeError):
+            return False
+        temp_path = path.with_name(f"{path.name}.tmp")
+        shutil.copyfile(backup_path, temp_path)
+        os.replace(temp_path, path)
+        return True
+
+    def read(self, path: Path) -> Tuple[tuple, StringTable, List[List[tuple]]]:
+        """读取文件
+
+        Returns:
+            文件头（不含 magic）、字符串表以及按数据块划分的记录
+        """
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self.header.size:
+                raise RecordFileError("文件长度不足")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    return self._read_view(view, size)
+                finally:
+                    view.release()
+
+    def _read_view(self, view: memoryview, size: int) -> Tuple[tuple, StringTable, List[List[tuple]]]:
+        header, table, blocks, _ = self._scan(view, size)
+        return header, table, blocks
+
+    def _scan(
+        self, view: memoryview, size: int, records: bool = True
+    ) -> Tuple[tuple, StringTable, List[List[tuple]], int]:
+        """解析文件，同时返回最后一个完整的数据块的结束位置
+
+        Args:
+            records: 为 False 时跳过记录，只解析字符串表
+        """
+        header = self.header.unpack_from(view, 0)
+        if header[0] != self.magic:
+            raise RecordFileError("文件标识错误")
+        table = StringTable()
+        blocks: List[List[tuple]] = []
+        offset = self.header.size
+        record_size = self.record.size
+        while offset + _BLOCK_HEAD.size <= size:
+            string_num, record_num = _BLOCK_HEAD.unpack_from(view, offset)
+            pos = offset + _BLOCK_HEAD.size
+            strings = []
+            for _ in range(string_num):
+                if pos + _STRING_HEAD.size > size:
+                    break
+                (length,) = _STRING_HEAD.unpack_from(view, pos)
+                pos += _STRING_HEAD.size
+                if pos + length > size:
+                    break
+                strings.append(bytes(view[pos : pos + length]).decode("utf-8"))
+                pos += length
+            end = pos + record_num * record_size
+            if len(strings) != string_num or end > size:
+                # 不完整的数据块
+                break
+            for string in strings:
+                table.intern(string)
+            if records:
+                blocks.append(list(self.record.iter_unpack(view[pos:end])))
+            offset = end
+        table.pop_new()
+        return header[1:], table, blocks, offset